@@ -0,0 +1,247 @@
+"""Generate case reviews in bulk from a JSONL or CSV file.
+
+    python batch.py cases.jsonl --output reviews.jsonl --concurrency 4
+
+Each input record needs a case_description and its capabilities: a JSON
+list in JSONL, or a semicolon-separated string in CSV. An optional id
+names the record; otherwise one is derived from its content. API keys
+are read from OPENAI_API_KEY or ANTHROPIC_API_KEY.
+
+Results are appended to the output file as they finish, one JSON object
+per line. Rerunning with the same output skips every record that already
+has a successful result, so an interrupted run picks up where it stopped.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+from caseforge import clients, generation
+from caseforge.catalog import get_catalog
+from caseforge.rate_limit import RateLimited
+from caseforge.scheduler import scheduler
+from caseforge.section_parser import parse_sections
+
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+RETRY_ERROR_NAMES = {"APIConnectionError", "APITimeoutError"}
+
+
+def read_cases(path):
+    """Yield case records from a JSONL or CSV file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(f):
+                row["capabilities"] = [
+                    cap.strip() for cap in (row.get("capabilities") or "").split(";") if cap.strip()
+                ]
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def record_id(case):
+    """Return the record's id, or a hash of its description and capabilities."""
+    if case.get("id"):
+        return str(case["id"])
+    payload = json.dumps([case.get("case_description", ""), case.get("capabilities", [])])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_completed(path):
+    """Return the ids that already have a successful result in the output file."""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a partial last line.
+                continue
+            if result.get("status") == "ok":
+                completed.add(result["id"])
+    return completed
+
+
+class BackoffGate:
+    """Shared pause that every worker honours after a rate limit or outage.
+
+    One worker hitting a 429 holds back all of them, so the run slows
+    down as a whole instead of each worker retrying into the limit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def trip(self, delay):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+
+def is_retryable(error):
+    # RateLimited: the shared limiter gave up waiting for capacity, so try again after backing off
+    return (
+        isinstance(error, RateLimited)
+        or getattr(error, "status_code", None) in RETRY_STATUS_CODES
+        or type(error).__name__ in RETRY_ERROR_NAMES
+    )
+
+
+def retry_delay(error, attempt):
+    """Use the provider's retry-after header if sent, else exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        delay = min(config.BATCH_BACKOFF_BASE * 2 ** attempt, config.BATCH_BACKOFF_MAX)
+        return delay * random.uniform(0.5, 1.0)
+
+
+def with_backoff(gate, fn, *args, **kwargs):
+    for attempt in range(config.BATCH_MAX_ATTEMPTS):
+        gate.wait()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e) or attempt == config.BATCH_MAX_ATTEMPTS - 1:
+                raise
+            gate.trip(retry_delay(e, attempt))
+
+
+def generate_title(client, gate, case_description):
+    try:
+        return with_backoff(gate, generation.generate_title, client, case_description)
+    except Exception:
+        return generation.DEFAULT_TITLE
+
+
+def process_case(case, client, gate, capabilities, with_title=True):
+    """Generate, parse and title one case, returning its result record."""
+    result = {
+        "id": record_id(case),
+        "case_description": case.get("case_description", ""),
+        "capabilities": case.get("capabilities", [])
+    }
+    try:
+        if not result["case_description"]:
+            raise ValueError("Missing case_description")
+        if not 1 <= len(result["capabilities"]) <= 3:
+            raise ValueError("Select between one and three capabilities")
+        unknown = [cap for cap in result["capabilities"] if cap not in capabilities]
+        if unknown:
+            raise ValueError(f"Unknown capabilities: {', '.join(unknown)}")
+
+        title_future = None
+        if with_title:
+            title_future = scheduler.submit(
+                ("batch_title", result["case_description"]),
+                generate_title, client, gate, result["case_description"]
+            )
+        _, review = with_backoff(
+            gate, generation.generate_case_review,
+            client, result["case_description"], result["capabilities"]
+        )
+        sections, missing = parse_sections(review, result["capabilities"])
+        result.update({
+            "status": "ok",
+            "title": title_future.result() if title_future else None,
+            "review": review,
+            "sections": sections,
+            "missing_capabilities": missing
+        })
+    except Exception as e:
+        result.update({"status": "error", "error": str(e)})
+    return result
+
+
+def run(input_path, output_path, concurrency=None, provider=None, with_title=True):
+    """Process every pending case, appending results as they complete.
+
+    Returns (succeeded, failed, skipped) counts.
+    """
+    concurrency = concurrency or config.BATCH_CONCURRENCY
+    client = clients.client_from_env(provider)
+    capabilities = get_catalog()
+    completed = load_completed(output_path)
+    gate = BackoffGate()
+    succeeded = failed = skipped = 0
+
+    with open(output_path, "a+", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Start on a fresh line if the previous run died mid-write.
+        if out.tell() > 0:
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")
+        pending = set()
+
+        def drain(return_when):
+            nonlocal succeeded, failed
+            done, still_pending = wait(pending, return_when=return_when)
+            for future in done:
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                if result["status"] == "ok":
+                    succeeded += 1
+                else:
+                    failed += 1
+                print(f"{result['status']:>5} {result['id']}", file=sys.stderr)
+            return still_pending
+
+        for case in read_cases(input_path):
+            if record_id(case) in completed:
+                skipped += 1
+                continue
+            # Keep only a small window of cases in flight so huge inputs
+            # are streamed rather than loaded up front.
+            if len(pending) >= concurrency * 2:
+                pending = drain(FIRST_COMPLETED)
+            pending.add(pool.submit(process_case, case, client, gate, capabilities, with_title))
+        if pending:
+            drain(ALL_COMPLETED)
+
+    return succeeded, failed, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate GP portfolio case reviews in bulk.")
+    parser.add_argument("input", help="JSONL or CSV file of cases")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to append results to")
+    parser.add_argument("-c", "--concurrency", type=int, default=config.BATCH_CONCURRENCY,
+                        help="number of cases generated at once")
+    parser.add_argument("--provider", choices=["openai", "anthropic", "router"],
+                        default=config.LLM_PROVIDER)
+    parser.add_argument("--no-title", action="store_true", help="skip title generation")
+    args = parser.parse_args(argv)
+
+    succeeded, failed, skipped = run(
+        args.input, args.output,
+        concurrency=args.concurrency,
+        provider=args.provider,
+        with_title=not args.no_title
+    )
+    print(f"{succeeded} succeeded, {failed} failed, {skipped} already done", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
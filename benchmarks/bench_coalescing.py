@@ -0,0 +1,83 @@
+"""Measure how much upstream traffic single-flight saves when a cohort submits together.
+
+Run from the repository root:
+
+    python benchmarks/bench_coalescing.py --sessions 20
+
+Every session generates a review and a title for the same template case
+at the same moment, once with single-flight off and once with it on. The
+response cache is off for both runs, so only coalescing can save calls.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from caseforge import clients, generation
+from caseforge.single_flight import SingleFlight
+from mock_llm_server import MockSettings, start_server
+
+
+CAPABILITIES = ["Communication and consultation skills", "Clinical management"]
+
+
+def run(client, sessions, stream, enabled):
+    config.SINGLE_FLIGHT_ENABLED = enabled
+    generation.single_flight = SingleFlight()
+    barrier = threading.Barrier(sessions)
+    streamed = [0] * sessions
+
+    def session(index):
+        def on_text(text):
+            streamed[index] += len(text)
+
+        barrier.wait()
+        generation.generate_case_review(
+            client, config.EXAMPLE_1, CAPABILITIES, stream_to=on_text if stream else None
+        )
+        generation.generate_llm_title(client, config.EXAMPLE_1)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(session, range(sessions)))
+    return time.perf_counter() - started, generation.single_flight.stats(), streamed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Single-flight coalescing of identical requests.")
+    parser.add_argument("--sessions", type=int, default=20, help="sessions submitting the same case")
+    parser.add_argument("--stream", action="store_true", help="stream responses as the app does")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock time to first token in seconds")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="mock tokens per second")
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(latency=args.latency, token_rate=args.token_rate)
+    server = start_server(settings)
+    config.OPENAI_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    config.RESPONSE_CACHE_ENABLED = False
+    config.RATE_LIMIT_ENABLED = False
+    client = clients.get_openai_client("benchmark")
+
+    for enabled in (False, True):
+        before = settings.requests
+        seconds, stats, streamed = run(client, args.sessions, args.stream, enabled)
+        upstream = settings.requests - before
+        print(f"single-flight {'on ' if enabled else 'off'}  {upstream:>4} upstream requests  {seconds:6.2f} s")
+        if enabled:
+            for call_type, counts in stats.items():
+                if isinstance(counts, dict):
+                    print(f"  {call_type:<8} {counts['upstream']} upstream, {counts['coalesced']} coalesced, "
+                          f"ratio {counts['coalescing_ratio']:.2f}")
+            if args.stream:
+                print(f"  every session streamed the same text: {len(set(streamed)) == 1}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
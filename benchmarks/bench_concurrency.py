@@ -0,0 +1,138 @@
+"""Measure how many LLM requests one process can hold in flight, and at what thread cost.
+
+Run from the repository root:
+
+    python benchmarks/bench_concurrency.py --requests 300
+
+The same burst of distinct review requests is sent against the local
+mock server with a thread per request on the blocking clients, and as
+coroutines on the shared event loop with the async clients, taking
+turns for a few rounds. Caching, coalescing and rate limiting are off, so every request
+goes upstream.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from caseforge import clients, event_loop, generation
+from caseforge.conversation import load_tokenizer
+from mock_llm_server import MockSettings, start_server
+
+
+def request(index):
+    return dict(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": f"Case {index}: {config.EXAMPLE_1}"}],
+        max_tokens=400,
+        temperature=0.7
+    )
+
+
+def client_threads():
+    """Count the threads in the process, leaving out the mock server's."""
+    return sum(1 for thread in threading.enumerate() if "process_request" not in thread.name)
+
+
+class ThreadPeak:
+    """Sample the client thread count in the background and keep the highest."""
+
+    def __init__(self):
+        self.peak = client_threads()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, client_threads())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_threads(client, requests, stream):
+    def one(index):
+        generation.complete(client, stream_to=(lambda text: None) if stream else None, **request(index))
+
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        list(pool.map(one, range(requests)))
+
+
+def run_async(client, requests, stream):
+    import asyncio
+
+    async def burst():
+        await asyncio.gather(*(
+            generation.complete_async(client, stream_to=(lambda text: None) if stream else None, **request(index))
+            for index in range(requests)
+        ))
+
+    event_loop.submit(burst()).result()
+
+
+RUNS = (("thread each", run_threads), ("async", run_async))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent LLM requests: a thread each against async.")
+    parser.add_argument("--requests", type=int, default=300, help="requests sent at once")
+    parser.add_argument("--stream", action="store_true", help="stream responses as the app does")
+    parser.add_argument("--latency", type=float, default=1.0, help="mock time to first token in seconds")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="mock tokens per second")
+    parser.add_argument("--rounds", type=int, default=3, help="bursts sent by each")
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(latency=args.latency, token_rate=args.token_rate, review_words=100)
+    server = start_server(settings)
+    config.OPENAI_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    config.RESPONSE_CACHE_ENABLED = False
+    config.SINGLE_FLIGHT_ENABLED = False
+    config.RATE_LIMIT_ENABLED = False
+    # Let both pools hold the whole burst, so only threads differ
+    config.LLM_MAX_CONNECTIONS = max(config.LLM_MAX_CONNECTIONS, args.requests)
+    config.LLM_ASYNC_MAX_CONNECTIONS = max(config.LLM_ASYNC_MAX_CONNECTIONS, args.requests)
+    client = clients.get_openai_client("benchmark")
+    event_loop.get_loop()
+    # The tokenizer's first load can take seconds, which is not what is measured
+    load_tokenizer()
+    # Nor are either client's first requests, which build its connection
+    # pool and the SDK's caches
+    for _, run in RUNS:
+        run(client, 4, args.stream)
+
+    print(f"{args.requests} requests at once, {args.latency:g} s to first token, median of {args.rounds}")
+    seconds = {name: [] for name, _ in RUNS}
+    peaks = dict.fromkeys(seconds, 0)
+    upstream = dict.fromkeys(seconds, 0)
+    # The two alternate, and later rounds start with the connections the
+    # earlier ones left in the pools, as a process that stays up would
+    for _ in range(args.rounds):
+        for name, run in RUNS:
+            before = settings.requests
+            with ThreadPeak() as peak:
+                baseline = peak.peak
+                started = time.perf_counter()
+                run(client, args.requests, args.stream)
+                seconds[name].append(time.perf_counter() - started)
+            peaks[name] = max(peaks[name], peak.peak - baseline)
+            upstream[name] += settings.requests - before
+    for name, _ in RUNS:
+        print(f"{name:<12} {statistics.median(seconds[name]):6.2f} s  "
+              f"{upstream[name] // args.rounds:>4} upstream  peak threads +{peaks[name]}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""End-to-end latency and throughput benchmark against the mock LLM server.
+
+Run from the repository root:
+
+    python benchmarks/bench_e2e.py --sessions 8 --rounds 3 --stream
+    python benchmarks/bench_e2e.py --sessions 8 --save-baseline
+
+Each simulated session follows the app: generate a review and its title
+concurrently, parse it, ask for one improvement, parse again and retitle.
+Everything runs through the real caseforge code paths and SDK clients;
+only the provider is replaced by benchmarks/mock_llm_server.py.
+
+Results are compared against the stored baseline for the same scenario
+in benchmarks/baselines.json. The run fails if any metric is worse than
+the baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from caseforge import clients, event_loop, generation, rate_limit
+from caseforge.conversation import ConversationContext, load_tokenizer
+from caseforge.scheduler import scheduler
+from caseforge.section_parser import parse_sections
+from mock_llm_server import MockSettings, start_server
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+CASES = [
+    (config.EXAMPLE_1, ["Communication and consultation skills", "Clinical management"]),
+    (config.EXAMPLE_2, [
+        "Working with colleagues and in teams",
+        "Clinical examination and procedural skills",
+        "Organisation, management and leadership"
+    ]),
+    ("A 54 year old man attended with two weeks of exertional chest tightness.", [
+        "Making a decision/diagnosis", "Managing medical complexity"
+    ])
+]
+
+# Metrics where a larger value is better; every other metric is a cost.
+HIGHER_IS_BETTER = {"requests_per_second", "sessions_per_second"}
+# Metrics reported for information only.
+UNSCORED = {"injected_errors", "max_queue_depth", "titles_shed"}
+
+
+class Recorder:
+    """Collects timings from all sessions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def generate_title(client, description):
+    """Generate a title, accepting the default when it is shed as the app does."""
+    try:
+        return generation.generate_title(client, description)
+    except rate_limit.RateLimited:
+        return generation.DEFAULT_TITLE
+
+
+def run_session(client, index, recorder, stream):
+    """Run one session and return the state the app would keep for it."""
+    case_description, capabilities = CASES[index % len(CASES)]
+    # Make every session unique so nothing is answered from a cache.
+    case_description = f"{case_description} (session {index})"
+    first_text = {}
+
+    def on_text(text):
+        first_text.setdefault("at", time.perf_counter())
+
+    started = time.perf_counter()
+    title_future = scheduler.submit(
+        ("bench_title", case_description), generate_title, client, case_description
+    )
+    request, review = generation.generate_case_review(
+        client, case_description, capabilities, stream_to=on_text if stream else None
+    )
+    if "at" in first_text:
+        recorder.add("time_to_first_token", first_text["at"] - started)
+
+    parse_started = time.perf_counter()
+    sections, _ = parse_sections(review, capabilities)
+    recorder.add("parse", time.perf_counter() - parse_started)
+    title_future.result()
+    recorder.add("generate_e2e", time.perf_counter() - started)
+
+    conversation = ConversationContext()
+    conversation.set_initial(request, review)
+    started = time.perf_counter()
+    improvement_request, improved = generation.improve_case_review(
+        client, conversation, "Make the reflection more concise", stream_to=on_text if stream else None
+    )
+    parse_started = time.perf_counter()
+    sections, _ = parse_sections(improved, capabilities)
+    recorder.add("parse", time.perf_counter() - parse_started)
+    # The mock's brief description is the same for every session, so it is
+    # made unique too; identical titles in flight would be coalesced.
+    generate_title(client, f"{sections['brief_description']} (session {index})"
+                   if sections["brief_description"] else case_description)
+    conversation.add_improvement(improvement_request, improved, note="Make the reflection more concise")
+    recorder.add("improve_e2e", time.perf_counter() - started)
+
+    return {"review_content": improved, "sections": sections, "conversation": conversation}
+
+
+def run_benchmark(args):
+    settings = MockSettings(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        seed=1
+    )
+    server = start_server(settings)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    config.OPENAI_BASE_URL = base_url + "/v1"
+    config.ANTHROPIC_BASE_URL = base_url
+    config.RESPONSE_CACHE_ENABLED = False
+    # The mock has no limits of its own, so the client-side limiter only
+    # runs when the benchmark is given some.
+    config.RATE_LIMIT_ENABLED = bool(args.rpm or args.tpm)
+    if config.RATE_LIMIT_ENABLED:
+        rate_limit.rate_limiter = generation.rate_limiter = rate_limit.RateLimiter(
+            rpm=args.rpm, tpm=args.tpm
+        )
+    if args.provider == "anthropic":
+        client = clients.get_anthropic_client("benchmark")
+    else:
+        client = clients.get_openai_client("benchmark")
+    # Build what the first request would otherwise build, as for the client
+    event_loop.get_loop()
+    clients.async_client(client)
+    # The app starts loading the tokenizer with the loop, when it starts up
+    load_tokenizer()
+
+    recorder = Recorder()
+    total_sessions = args.sessions * args.rounds
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        list(pool.map(
+            lambda index: run_session(client, index, recorder, args.stream),
+            range(total_sessions)
+        ))
+    wall = time.perf_counter() - started
+    requests = settings.requests
+
+    # Memory is measured in a separate pass because tracing allocations
+    # slows everything down and would distort the timings above.
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        states = list(pool.map(
+            lambda index: run_session(client, total_sessions + index, Recorder(), args.stream),
+            range(args.sessions)
+        ))
+    memory_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    server.shutdown()
+
+    results = {}
+    for name, samples in sorted(recorder.samples.items()):
+        p50, p95, p99 = percentiles(samples)
+        scale = 1000
+        results[f"{name}_p50_ms"] = p50 * scale
+        results[f"{name}_p95_ms"] = p95 * scale
+        results[f"{name}_p99_ms"] = p99 * scale
+    results["requests_per_second"] = requests / wall
+    results["sessions_per_second"] = total_sessions / wall
+    results["memory_per_session_kb"] = (memory_after - memory_before) / len(states) / 1024
+    results["injected_errors"] = settings.errors
+    if config.RATE_LIMIT_ENABLED:
+        limiter = rate_limit.rate_limiter.stats()
+        results["max_queue_depth"] = limiter["max_queue_depth"]
+        results["review_wait_p95_ms"] = limiter["review"]["wait_p95_ms"]
+        results["titles_shed"] = limiter["title"]["shed"]
+    return results
+
+
+def scenario_name(args):
+    mode = "stream" if args.stream else "block"
+    name = f"{args.provider}-{mode}-s{args.sessions}-l{args.latency:g}-t{args.token_rate:g}-e{args.error_rate:g}"
+    if args.rpm or args.tpm:
+        name += f"-rpm{args.rpm}-tpm{args.tpm}"
+    return name
+
+
+def compare(results, baseline, tolerance):
+    """Return a description of every metric that regressed beyond tolerance."""
+    regressions = []
+    for name, expected in baseline.items():
+        if name not in results or name in UNSCORED or not expected:
+            continue
+        actual = results[name]
+        if name in HIGHER_IS_BETTER:
+            worse = actual < expected * (1 - tolerance)
+        else:
+            worse = actual > expected * (1 + tolerance)
+        if worse:
+            regressions.append(f"{name}: {actual:.2f} vs baseline {expected:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against a local mock LLM server.")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--rounds", type=int, default=3, help="sessions run by each worker")
+    parser.add_argument("--provider", choices=["openai", "anthropic"], default="openai")
+    parser.add_argument("--stream", action="store_true", help="stream responses as the app does")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock time to first token in seconds")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="mock tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests that fail")
+    parser.add_argument("--rpm", type=int, default=0, help="client-side requests per minute limit, 0 for none")
+    parser.add_argument("--tpm", type=int, default=0, help="client-side tokens per minute limit, 0 for none")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args)
+    name = scenario_name(args)
+    print(f"scenario {name}")
+    for metric, value in results.items():
+        print(f"  {metric:<32} {value:>12.3f}")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines[name] = results
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if name not in baselines:
+        print("no baseline for this scenario; run with --save-baseline to record one")
+        return 0
+    regressions = compare(results, baselines[name], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
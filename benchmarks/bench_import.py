@@ -0,0 +1,68 @@
+"""Measure the cold import time of the caseforge core.
+
+Run from the repository root:
+
+    python benchmarks/bench_import.py
+
+Each run imports the core in a fresh interpreter. The script fails if the
+median import time exceeds the budget or if importing the core pulls in
+Streamlit or an LLM SDK.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORE_MODULES = [
+    "caseforge.generation",
+    "caseforge.section_parser",
+    "caseforge.streaming",
+    "caseforge.conversation",
+    "caseforge.clients",
+    "caseforge.suggest"
+]
+HEAVY_MODULES = ["streamlit", "openai", "anthropic", "httpx", "tiktoken", "numpy"]
+IMPORT_BUDGET_MS = 50.0
+RUNS = 7
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import {", ".join(CORE_MODULES)}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(elapsed * 1000, ",".join(loaded))
+"""
+
+
+def measure():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout.split()
+    return float(output[0]), output[1].split(",") if len(output) > 1 else []
+
+
+def main():
+    timings = []
+    heavy = set()
+    for _ in range(RUNS):
+        elapsed, loaded = measure()
+        timings.append(elapsed)
+        heavy.update(loaded)
+
+    median = statistics.median(timings)
+    print(f"core import: median {median:.1f} ms, min {min(timings):.1f} ms over {RUNS} runs")
+    failed = False
+    if heavy:
+        print(f"FAIL: importing the core loaded {', '.join(sorted(heavy))}")
+        failed = True
+    if median > IMPORT_BUDGET_MS:
+        print(f"FAIL: median import time is over the {IMPORT_BUDGET_MS:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
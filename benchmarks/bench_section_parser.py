@@ -0,0 +1,93 @@
+"""Compare the single-pass section parser with the old regex cascade.
+
+Run from the repository root:
+
+    python benchmarks/bench_section_parser.py
+
+Each input is first parsed both ways, and the run fails if the two
+parsers' sections differ.
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from caseforge.section_parser import parse_sections
+
+
+def legacy_extract_sections(text, selected_capabilities):
+    """The regex cascade extract_sections used before the single-pass parser."""
+    sections = {
+        "brief_description": "",
+        "capabilities": {},
+        "reflection": "",
+        "learning_needs": ""
+    }
+    summary_match = re.search(r"Brief Description:\s*(.*?)(?=\n\n|$)", text, re.DOTALL)
+    if summary_match:
+        sections["brief_description"] = summary_match.group(1).strip()
+    for cap_name in selected_capabilities:
+        patterns = [
+            f"Capability: {re.escape(cap_name)}.*?Justification.*?:(.*?)(?=Capability:|Reflection:|Learning needs|$)",
+            f"{re.escape(cap_name)}:(.*?)(?=\n\n[A-Za-z]|Reflection:|Learning needs|$)",
+            f"{re.escape(cap_name)}\n(.*?)(?=\n\n[A-Za-z]|Reflection:|Learning needs|$)"
+        ]
+        content = None
+        for pattern in patterns:
+            match = re.search(pattern, text, re.DOTALL)
+            if match:
+                content = match.group(1).strip()
+                break
+        sections["capabilities"][cap_name] = content or ""
+    for pattern in [
+        r"Reflection: What will I maintain, improve or stop\?(.*?)(?=Learning needs|$)",
+        r"Reflection: What will I maintain, improve or stop(.*?)(?=Learning needs|$)",
+        r"Reflection:(.*?)(?=Learning needs|$)"
+    ]:
+        reflection_match = re.search(pattern, text, re.DOTALL)
+        if reflection_match:
+            sections["reflection"] = reflection_match.group(1).strip()
+            break
+    learning_match = re.search(r"Learning needs identified from this event:(.*?)(?=$)", text, re.DOTALL)
+    if learning_match:
+        sections["learning_needs"] = learning_match.group(1).strip()
+    return sections
+
+
+CAPABILITIES = [
+    "Working with colleagues and in teams",
+    "Clinical examination and procedural skills",
+    "Organisation, management and leadership"
+]
+
+
+def long_response(paragraphs):
+    """Stretch the second example response so every section has many paragraphs."""
+    sections = config.EXAMPLE_2_RESPONSE.split("\n\n")
+    out = []
+    for section in sections:
+        header, _, body = section.partition("\n")
+        out.append(header + "\n" + "\n".join([body.strip()] * paragraphs))
+    return "\n\n".join(out)
+
+
+def main():
+    print(f"{'size':>10} {'legacy ms':>10} {'single-pass ms':>15} {'speedup':>8}")
+    for paragraphs in (1, 10, 50, 200):
+        text = long_response(paragraphs)
+        # A faster parser is no use if it reads the review differently
+        if parse_sections(text, CAPABILITIES)[0] != legacy_extract_sections(text, CAPABILITIES):
+            print(f"MISMATCH parsers disagree on the {paragraphs} paragraph input")
+            return 1
+        runs = max(5, 2000 // paragraphs)
+        legacy = timeit.timeit(lambda: legacy_extract_sections(text, CAPABILITIES), number=runs) / runs
+        single = timeit.timeit(lambda: parse_sections(text, CAPABILITIES), number=runs) / runs
+        print(f"{len(text):>10} {legacy * 1000:>10.3f} {single * 1000:>15.3f} {legacy / single:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
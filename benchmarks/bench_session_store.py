@@ -0,0 +1,130 @@
+"""Measure what session state costs to keep in each session store.
+
+Run from the repository root:
+
+    python benchmarks/bench_session_store.py --sessions 50
+
+Each simulated session goes through the reruns the app makes: typing a
+case, picking capabilities, generating, several idle reruns, two
+improvements and a title refresh. Every rerun ends with a save, as the
+app's does. The bytes written are compared with writing every persisted
+field at the end of every rerun, and a second "node" then restores each
+session from the store. The Redis store runs against the local stand-in
+in benchmarks/mock_redis_server.py.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from caseforge.conversation import ConversationContext
+from caseforge.session_store import (
+    MemorySessionStore, RedisSessionStore, SQLiteSessionStore, SessionSync, dump, pack
+)
+from mock_llm_server import canned_reply, MockSettings
+from mock_redis_server import start_server
+# The fields and codecs the app keeps, so the benchmark follows any change to them
+from medhelp_v2 import SESSION_CODECS, SESSION_FIELDS
+
+
+CAPABILITIES = ["Communication and consultation skills", "Clinical management", "Managing medical complexity"]
+
+
+def reruns(index):
+    """Yield the session state after each rerun of one simulated session."""
+    state = {
+        "is_improve_mode": False, "review_content": None, "sections": None, "selected_caps": [],
+        "capabilities_select": [], "case_title": None, "case_description": "", "case_id": None,
+        "history_offset": 0, "conversation": ConversationContext()
+    }
+    yield state
+    state["case_description"] = f"{config.EXAMPLE_1} (session {index})"
+    yield state
+    state["capabilities_select"] = list(CAPABILITIES)
+    yield state
+    request = {"role": "user", "content": f"Generate a structured case review for {state['case_description']}"}
+    review = canned_reply([dict(request, content=request["content"] + "".join(
+        f"\nCapability: {name}" for name in CAPABILITIES))], None, MockSettings())
+    state.update(
+        is_improve_mode=True, review_content=review, selected_caps=list(CAPABILITIES), case_id=index,
+        sections={"brief_description": review[:600], "capabilities": {name: review[600:900] for name in CAPABILITIES},
+                  "reflection": review[900:1300], "learning_needs": review[1300:]},
+        case_title="Telephone Consultation With Hearing Impairment"
+    )
+    state["conversation"].set_initial(request, review)
+    yield state
+    for step in range(2):
+        for _ in range(4):
+            yield state
+        note = f"Make the reflection more concise ({step})"
+        review = review.replace("carefully", "thoroughly", 1) + f"\n{note}"
+        state["review_content"] = review
+        state["sections"] = dict(state["sections"], reflection=state["sections"]["reflection"] + note)
+        state["conversation"].add_improvement({"role": "user", "content": f"Improve the case: {note}"}, review, note)
+        yield state
+    state["case_title"] = "Hearing Impairment in Elderly Man"
+    yield state
+
+
+def full_snapshot_bytes(state):
+    """Bytes written if every persisted field were stored at the end of every rerun."""
+    return sum(
+        len(pack(dump(SESSION_CODECS[name][0](state[name]) if name in SESSION_CODECS else state[name])))
+        for name in SESSION_FIELDS
+    )
+
+
+def run_store(name, store, sessions):
+    save_seconds = []
+    snapshot = 0
+    saves = 0
+    for index in range(sessions):
+        sync = SessionSync(store, f"bench-{name}-{index}", SESSION_FIELDS, SESSION_CODECS)
+        for state in reruns(index):
+            started = time.perf_counter()
+            sync.save(state)
+            save_seconds.append(time.perf_counter() - started)
+            snapshot += full_snapshot_bytes(state)
+            saves += 1
+    stats = store.stats()
+    written = stats["bytes_per_write"] * stats["writes"]
+
+    restore_seconds = []
+    for index in range(sessions):
+        # A fresh SessionSync, as on another node after a load balancer switch
+        restored = {}
+        started = time.perf_counter()
+        SessionSync(store, f"bench-{name}-{index}", SESSION_FIELDS, SESSION_CODECS).restore(restored)
+        restore_seconds.append(time.perf_counter() - started)
+        assert restored["conversation"].latest_response and len(restored["conversation"].improvements) == 2
+    print(f"{name:<8} {stats['writes'] / saves:6.0%} of reruns write  "
+          f"{written / sessions / 1024:7.1f} KB/session vs {snapshot / sessions / 1024:7.1f} KB full  "
+          f"save p50 {statistics.median(save_seconds) * 1000:6.3f} ms  "
+          f"restore p50 {statistics.median(restore_seconds) * 1000:6.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Session store write volume and latency.")
+    parser.add_argument("--sessions", type=int, default=50, help="simulated sessions per store")
+    args = parser.parse_args(argv)
+
+    server = start_server()
+    with tempfile.TemporaryDirectory() as directory:
+        stores = [
+            ("memory", MemorySessionStore()),
+            ("sqlite", SQLiteSessionStore(os.path.join(directory, "sessions.sqlite3"))),
+            ("redis", RedisSessionStore(f"redis://127.0.0.1:{server.server_address[1]}/0"))
+        ]
+        for name, store in stores:
+            run_store(name, store, args.sessions)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Measure capability suggestion: index build time and query latency.
+
+Run from the repository root:
+
+    python benchmarks/bench_suggest.py
+"""
+import os
+import statistics
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from caseforge.catalog import get_catalog
+
+
+DESCRIPTIONS = [
+    config.EXAMPLE_1,
+    config.EXAMPLE_2,
+    "A 54 year old man attended with two weeks of exertional chest tightness. I examined him, "
+    "did an ECG and referred him to the rapid access chest pain clinic.",
+    "I discussed safeguarding concerns with the health visitor about a toddler.",
+    "A 31 year old woman asked for help with low mood; we used an interpreter by telephone.",
+    "I taught the medical students how to examine a knee and audited our antibiotic prescribing."
+]
+
+
+def main():
+    catalog = get_catalog()
+
+    started = time.perf_counter()
+    import numpy  # noqa: F401
+    numpy_ms = (time.perf_counter() - started) * 1000
+
+    from caseforge.suggest import CapabilityIndex
+
+    runs = 50
+    build_ms = timeit.timeit(lambda: CapabilityIndex(catalog), number=runs) / runs * 1000
+    index = CapabilityIndex(catalog)
+    print(f"numpy import {numpy_ms:.1f} ms (once per process)")
+    print(f"index build  {build_ms:.2f} ms for {len(index.names)} capabilities, {len(index.vocabulary)} terms")
+
+    samples = []
+    for description in DESCRIPTIONS:
+        for _ in range(500):
+            started = time.perf_counter()
+            index.rank(description)
+            samples.append(time.perf_counter() - started)
+    cuts = statistics.quantiles(samples, n=100)
+    print(f"query        p50 {cuts[49] * 1e6:.0f} us, p99 {cuts[98] * 1e6:.0f} us")
+    print()
+    for description in DESCRIPTIONS:
+        ranked = ", ".join(f"{name} ({score:.2f})" for name, score in index.rank(description))
+        print(f"{description[:50]:<50}  {ranked}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare local title extraction with asking the LLM for a title.
+
+Run from the repository root:
+
+    python benchmarks/bench_titles.py --latency 0.3
+
+The LLM side goes through the real client against the mock server, so
+its time is the network round trip plus the mock's latency. It is a
+floor for what the real provider would take.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from caseforge import clients, generation
+from caseforge.titles import extract_title
+from mock_llm_server import MockSettings, start_server
+
+
+DESCRIPTIONS = [
+    config.EXAMPLE_1,
+    config.EXAMPLE_2,
+    "A 54 year old man attended with two weeks of exertional chest tightness.",
+    "Home visit to a frail elderly woman with recurrent falls and new confusion.",
+    "Telephone call from a mother about her 3 year old girl with fever and a rash.",
+    "I discussed safeguarding concerns with the health visitor about a toddler.",
+    "A 31 year old woman asked for help with low mood after the birth of her baby.",
+    "Met with the practice manager about rota planning for the winter."
+]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local title extraction against LLM titles.")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock time to first token in seconds")
+    parser.add_argument("--rounds", type=int, default=200, help="local extractions per description")
+    args = parser.parse_args(argv)
+
+    server = start_server(MockSettings(latency=args.latency, token_rate=0))
+    config.OPENAI_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    config.RESPONSE_CACHE_ENABLED = False
+    client = clients.get_openai_client("benchmark")
+
+    local_times = []
+    local_count = 0
+    llm_times = []
+    print(f"{'confidence':>10}  {'local title':<45} description")
+    for index, description in enumerate(DESCRIPTIONS):
+        for round_index in range(args.rounds):
+            # A unique suffix defeats extract_title's cache, as a fresh edit would.
+            seconds, (title, confidence) = timed(extract_title, f"{description} {round_index}")
+            local_times.append(seconds)
+        title, confidence = extract_title(description)
+        if confidence >= config.TITLE_MIN_CONFIDENCE:
+            local_count += 1
+        seconds, _ = timed(generation.generate_llm_title, client, f"{description} ({index})")
+        llm_times.append(seconds)
+        print(f"{confidence:>10.2f}  {title or '-':<45} {description[:40]}")
+    server.shutdown()
+
+    local_ms = statistics.median(local_times) * 1000
+    llm_ms = statistics.median(llm_times) * 1000
+    print()
+    print(f"local extraction median {local_ms:.3f} ms, p99 {statistics.quantiles(local_times, n=100)[98] * 1000:.3f} ms")
+    print(f"LLM title median        {llm_ms:.1f} ms")
+    print(f"titled locally          {local_count} of {len(DESCRIPTIONS)} descriptions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""A local stand-in for the OpenAI and Anthropic APIs.
+
+It serves POST /v1/chat/completions (OpenAI) and POST /v1/messages
+(Anthropic), with or without streaming. Replies are canned case reviews
+with a section for every capability in the request, so the real parser
+has real work to do. Requests for JSON output, as a response_format
+schema or a forced Anthropic tool, get JSON matching the schema. Replies
+longer than max_tokens are cut off and say so, as the real APIs do, and a
+request to continue gets the rest. Latency, token rate and error
+injection can all be configured.
+
+Run it on its own to point the app at it:
+
+    python benchmarks/mock_llm_server.py --port 8089 --latency 0.3 --token-rate 150
+
+then set OPENAI_BASE_URL = "http://127.0.0.1:8089/v1" in config.py.
+"""
+import argparse
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+FILLER = (
+    "I reviewed the patient carefully, took a focused history and explained the plan "
+    "in clear language, checking understanding and agreeing safety netting advice. "
+)
+
+
+class MockSettings:
+    """Behaviour of the stub; shared by all request handlers."""
+
+    def __init__(self, latency=0.2, token_rate=200.0, error_rate=0.0, error_status=429,
+                 review_words=500, seed=None):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.review_words = review_words
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+
+def _text(content):
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content or [])
+
+
+def _capabilities(messages):
+    """Find the capabilities named in the most recent generation request."""
+    for msg in reversed(messages):
+        content = _text(msg.get("content"))
+        if msg.get("role") == "user" and "Generate a structured case review" in content:
+            return re.findall(r"^\s*Capability: (.+?)\s*$", content, re.MULTILINE)
+    return []
+
+
+def _paragraph(words):
+    filler = FILLER.split()
+    return " ".join(filler[i % len(filler)] for i in range(words))
+
+
+def structured_reply(schema, words):
+    """Build a JSON object matching schema, with filler for every string."""
+    def value(node):
+        if node.get("type") == "object":
+            return {name: value(child) for name, child in node.get("properties", {}).items()}
+        return _paragraph(words)
+    return json.dumps(value(schema))
+
+
+def requested_schema(body):
+    """Return the JSON schema the request asks the reply to follow, if any."""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return response_format["json_schema"]["schema"]
+    for tool in body.get("tools") or []:
+        if (body.get("tool_choice") or {}).get("name") == tool["name"]:
+            return tool["input_schema"]
+    return None
+
+
+def canned_reply(messages, max_tokens, settings):
+    """Build a reply shaped like the request: a title, one section, a full review or the rest of one."""
+    if len(messages) > 2 and _text(messages[-1].get("content")).startswith("Your reply was cut off"):
+        # The earlier reply was the start of what the earlier messages get
+        return canned_reply(messages[:-2], None, settings)[len(_text(messages[-2].get("content"))):]
+    if max_tokens is not None and max_tokens <= 100:
+        return "Telephone Consultation With Hearing Impairment"
+    capabilities = _capabilities(messages)
+    words = max(settings.review_words // (len(capabilities) + 3), 10)
+    if messages and "Change requested:" in _text(messages[-1].get("content")):
+        return _paragraph(words)
+    parts = ["Brief Description:", _paragraph(words), ""]
+    for cap_name in capabilities:
+        parts.extend([f"Capability: {cap_name}", _paragraph(words), ""])
+    parts.extend(["Reflection: What will I maintain, improve or stop?", _paragraph(words), ""])
+    parts.extend(["Learning needs identified from this event:", _paragraph(words)])
+    return "\n".join(parts)
+
+
+def tokens_of(text):
+    """Split text into word-sized pieces that stand in for tokens."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def prompt_tokens(messages, system=None):
+    text = _text(system) if system else ""
+    text += "".join(_text(msg.get("content")) for msg in messages)
+    return len(text) // 4 + 1
+
+
+def _anthropic_stop_reason(tool, truncated):
+    if truncated:
+        return "max_tokens"
+    return "tool_use" if tool is not None else "end_turn"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = MockSettings()
+
+    def setup(self):
+        super().setup()
+        # Tokens go out as many tiny writes; without this Nagle's algorithm
+        # holds each one back waiting for the client's delayed ACK.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = self.path.split("?")[0]
+        if path.endswith("/chat/completions"):
+            provider = "openai"
+        elif path.endswith("/messages"):
+            provider = "anthropic"
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        if self.settings.should_fail():
+            self._send_error(provider)
+            return
+
+        time.sleep(self.settings.latency)
+        messages = body.get("messages", [])
+        schema = requested_schema(body)
+        if schema is not None:
+            reply = structured_reply(schema, max(self.settings.review_words // 6, 10))
+        else:
+            reply = canned_reply(messages, body.get("max_tokens"), self.settings)
+        pieces = tokens_of(reply)
+        truncated = body.get("max_tokens") is not None and len(pieces) > body["max_tokens"]
+        if truncated:
+            reply = "".join(pieces[:body["max_tokens"]])
+        usage = {
+            "prompt": prompt_tokens(messages, body.get("system")),
+            "completion": len(tokens_of(reply))
+        }
+        if provider == "openai":
+            if body.get("stream"):
+                include_usage = (body.get("stream_options") or {}).get("include_usage")
+                self._stream(self._openai_events(body, reply, usage, include_usage, truncated))
+            else:
+                self._send_json(200, self._openai_response(body, reply, usage, truncated))
+        else:
+            tool = body["tool_choice"]["name"] if schema is not None else None
+            if body.get("stream"):
+                self._stream(self._anthropic_events(body, reply, usage, tool, truncated))
+            else:
+                self._send_json(200, self._anthropic_response(body, reply, usage, tool, truncated))
+
+    def _send_error(self, provider):
+        status = self.settings.error_status
+        if provider == "openai":
+            payload = {"error": {"message": "Injected error", "type": "rate_limit_error", "code": None}}
+        else:
+            payload = {"type": "error", "error": {"type": "rate_limit_error", "message": "Injected error"}}
+        self._send_json(status, payload, {"retry-after": "0"})
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for event in events:
+                data = event.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. a hedged request that lost.
+            self.close_connection = True
+
+    def _pace(self, pieces):
+        """Yield pieces no faster than the configured token rate."""
+        started = time.perf_counter()
+        for index, piece in enumerate(pieces):
+            if self.settings.token_rate:
+                delay = started + index / self.settings.token_rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield piece
+
+    def _openai_response(self, body, reply, usage, truncated=False):
+        self._pace_all(reply)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "length" if truncated else "stop"
+            }],
+            "usage": {
+                "prompt_tokens": usage["prompt"],
+                "completion_tokens": usage["completion"],
+                "total_tokens": usage["prompt"] + usage["completion"],
+                "prompt_tokens_details": {"cached_tokens": 0}
+            }
+        }
+
+    def _openai_events(self, body, reply, usage, include_usage, truncated=False):
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model")
+        }
+
+        def event(choices, **extra):
+            return "data: " + json.dumps(dict(base, choices=choices, **extra)) + "\n\n"
+
+        yield event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for piece in self._pace(tokens_of(reply)):
+            yield event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        yield event([{"index": 0, "delta": {}, "finish_reason": "length" if truncated else "stop"}])
+        if include_usage:
+            yield event([], usage={
+                "prompt_tokens": usage["prompt"],
+                "completion_tokens": usage["completion"],
+                "total_tokens": usage["prompt"] + usage["completion"]
+            })
+        yield "data: [DONE]\n\n"
+
+    def _anthropic_usage(self, usage, output_tokens):
+        return {
+            "input_tokens": usage["prompt"],
+            "output_tokens": output_tokens,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0
+        }
+
+    def _anthropic_response(self, body, reply, usage, tool=None, truncated=False):
+        self._pace_all(reply)
+        content = {"type": "text", "text": reply}
+        if tool is not None:
+            # A cut off tool call carries no input, as Anthropic cannot parse it either
+            tool_input = {} if truncated else json.loads(reply)
+            content = {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex}", "name": tool, "input": tool_input}
+        return {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [content],
+            "stop_reason": _anthropic_stop_reason(tool, truncated),
+            "stop_sequence": None,
+            "usage": self._anthropic_usage(usage, usage["completion"])
+        }
+
+    def _anthropic_events(self, body, reply, usage, tool=None, truncated=False):
+        def event(name, payload):
+            return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+
+        yield event("message_start", {"type": "message_start", "message": {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": self._anthropic_usage(usage, 1)
+        }})
+        block = {"type": "text", "text": ""}
+        if tool is not None:
+            block = {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex}", "name": tool, "input": {}}
+        yield event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": block})
+        for piece in self._pace(tokens_of(reply)):
+            delta = {"type": "text_delta", "text": piece}
+            if tool is not None:
+                delta = {"type": "input_json_delta", "partial_json": piece}
+            yield event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta})
+        yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        yield event("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": _anthropic_stop_reason(tool, truncated), "stop_sequence": None},
+            "usage": {"output_tokens": usage["completion"]}
+        })
+        yield event("message_stop", {"type": "message_stop"})
+
+    def _pace_all(self, reply):
+        for _ in self._pace(tokens_of(reply)):
+            pass
+
+
+class MockServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections from a burst of clients,
+    # which then wait seconds to retry
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def start_server(settings, host="127.0.0.1", port=0):
+    """Start the stub on a background thread and return the server.
+
+    The bound port is server.server_address[1]; call server.shutdown()
+    to stop it.
+    """
+    handler = type("ConfiguredHandler", (MockLLMHandler,), {"settings": settings})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI/Anthropic-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="tokens per second, 0 for no limit")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--review-words", type=int, default=500)
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        review_words=args.review_words
+    )
+    server = start_server(settings, args.host, args.port)
+    print(f"Mock LLM server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""A local stand-in for a Redis server, for the session store.
+
+It speaks the Redis protocol (RESP2) and keeps everything in memory. Only
+the commands the session store and a quick manual check need are
+implemented: PING, AUTH, SELECT, HSET, HGETALL, HDEL, DEL, EXPIRE, TTL
+and DBSIZE. Keys expire as Redis expires them.
+
+Run it on its own to point app processes at it:
+
+    python benchmarks/mock_redis_server.py --port 6390
+
+then set SESSION_STORE = "redis" and SESSION_REDIS_URL =
+"redis://127.0.0.1:6390/0" in config.py.
+"""
+import argparse
+import socket
+import socketserver
+import threading
+import time
+
+
+class MockRedis:
+    """Hashes by key and database, with expiry times; shared by all connections."""
+
+    def __init__(self, password=None):
+        self.password = password
+        self.lock = threading.Lock()
+        # (db, key) -> {field: value}
+        self.hashes = {}
+        # (db, key) -> expiry time
+        self.expires = {}
+        self.commands = 0
+
+    def _live(self, key):
+        expiry = self.expires.get(key)
+        if expiry is not None and expiry <= time.time():
+            self.hashes.pop(key, None)
+            del self.expires[key]
+        return self.hashes.get(key)
+
+    def execute(self, connection, args):
+        """Run one command for connection; return its reply value."""
+        name = args[0].upper().decode()
+        with self.lock:
+            self.commands += 1
+            if name == "AUTH":
+                if args[-1].decode() != self.password:
+                    return Error("WRONGPASS invalid username-password pair")
+                connection.authenticated = True
+                return Status("OK")
+            if self.password and not connection.authenticated:
+                return Error("NOAUTH Authentication required.")
+            if name == "PING":
+                return Status("PONG")
+            if name == "SELECT":
+                connection.db = int(args[1])
+                return Status("OK")
+            if name == "DBSIZE":
+                return sum(1 for db, key in list(self.hashes) if db == connection.db and self._live((db, key)))
+            key = (connection.db, args[1]) if len(args) > 1 else None
+            if name == "HSET":
+                if len(args) < 4 or len(args) % 2:
+                    return Error("ERR wrong number of arguments for 'hset' command")
+                fields = self._live(key)
+                if fields is None:
+                    fields = self.hashes[key] = {}
+                added = 0
+                for i in range(2, len(args), 2):
+                    added += args[i] not in fields
+                    fields[args[i]] = args[i + 1]
+                return added
+            if name == "HGETALL":
+                fields = self._live(key) or {}
+                return [item for pair in fields.items() for item in pair]
+            if name == "HDEL":
+                fields = self._live(key) or {}
+                removed = sum(fields.pop(field, None) is not None for field in args[2:])
+                if not fields:
+                    self.hashes.pop(key, None)
+                    self.expires.pop(key, None)
+                return removed
+            if name == "DEL":
+                removed = 0
+                for raw in args[1:]:
+                    key = (connection.db, raw)
+                    removed += self._live(key) is not None
+                    self.hashes.pop(key, None)
+                    self.expires.pop(key, None)
+                return removed
+            if name == "EXPIRE":
+                if self._live(key) is None:
+                    return 0
+                self.expires[key] = time.time() + int(args[2])
+                return 1
+            if name == "TTL":
+                if self._live(key) is None:
+                    return -2
+                expiry = self.expires.get(key)
+                return -1 if expiry is None else int(expiry - time.time() + 0.5)
+            return Error(f"ERR unknown command '{name.lower()}'")
+
+
+class Status(str):
+    pass
+
+
+class Error(str):
+    pass
+
+
+def encode(value):
+    if isinstance(value, Error):
+        return b"-%s\r\n" % value.encode()
+    if isinstance(value, Status):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class MockRedisHandler(socketserver.StreamRequestHandler):
+    redis = MockRedis()
+
+    def setup(self):
+        super().setup()
+        # Replies to a pipeline go out one write each; without this Nagle's
+        # algorithm holds the later ones back for the client's delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.db = 0
+        self.authenticated = False
+
+    def handle(self):
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            self.wfile.write(encode(self.redis.execute(self, args)))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class MockRedisServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def start_server(redis=None, host="127.0.0.1", port=0):
+    """Start the stub on a background thread and return the server."""
+    handler = type("Handler", (MockRedisHandler,), {"redis": redis or MockRedis()})
+    server = MockRedisServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for a Redis server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--password", help="require AUTH with this password")
+    args = parser.parse_args()
+    server = start_server(MockRedis(args.password), args.host, args.port)
+    print(f"Mock Redis listening on redis://{args.host}:{server.server_address[1]}/0")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
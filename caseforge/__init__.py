@@ -0,0 +1,42 @@
+"""Core case review generation, independent of the Streamlit front end.
+
+Submodules are imported on first attribute access, so ``import caseforge``
+costs almost nothing. The LLM SDKs load only when a client is first built.
+"""
+import importlib
+
+
+_EXPORTS = {
+    "generate_case_review": "generation",
+    "generate_case_review_async": "generation",
+    "generate_title": "generation",
+    "generate_title_async": "generation",
+    "improve_case_review": "generation",
+    "improve_case_review_async": "generation",
+    "improve_sections": "generation",
+    "improve_sections_async": "generation",
+    "build_review_messages": "generation",
+    "parse_capabilities": "catalog",
+    "format_capabilities": "generation",
+    "get_catalog": "catalog",
+    "parse_sections": "section_parser",
+    "section_spans": "section_parser",
+    "StreamingSectionParser": "streaming",
+    "ConversationContext": "conversation",
+    "client_from_env": "clients",
+    "get_openai_client": "clients",
+    "get_anthropic_client": "clients",
+    "get_async_openai_client": "clients",
+    "get_async_anthropic_client": "clients"
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,124 @@
+"""The capability catalog, built once per process from config.capability_content.
+
+Streamlit reruns the whole script on every interaction, so the catalog is
+cached and only rebuilt when config.py changes on disk. Each capability's
+prompt fragment is worked out once when it is built.
+"""
+import ast
+import importlib
+import os
+import threading
+from collections import namedtuple
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+JUSTIFICATION_PROMPT = "Justification [describe how your actions and approach link to the capability]:"
+
+Capability = namedtuple("Capability", ["name", "points", "prompt"])
+
+
+def parse_capabilities(content):
+    """Parse capabilities from config content."""
+    capabilities = {}
+    current_capability = None
+    current_points = []
+
+    lines = [line.rstrip() for line in content.split('\n') if line.strip()]
+
+    for line in lines:
+        if not line.startswith('-'):
+            if current_capability and current_points:
+                capabilities[current_capability] = current_points
+            current_capability = line
+            current_points = []
+        else:
+            current_points.append(line)
+
+    if current_capability and current_points:
+        capabilities[current_capability] = current_points
+
+    return capabilities
+
+
+def capability_prompt(name):
+    """Return the generation prompt fragment for one capability."""
+    return f"Capability: {name}\n{JUSTIFICATION_PROMPT}\n\n"
+
+
+class CapabilityCatalog(Mapping):
+    """Read-only mapping of capability name to its points, in config order."""
+
+    def __init__(self, content):
+        records = {
+            name: Capability(name, tuple(points), capability_prompt(name))
+            for name, points in parse_capabilities(content).items()
+        }
+        self._records = MappingProxyType(records)
+        self.names = tuple(records)
+
+    def __getitem__(self, name):
+        return self._records[name].points
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def format(self, selected_capabilities):
+        """Join the prompt fragments of the selected capabilities."""
+        return "".join(
+            self._records[name].prompt if name in self._records else capability_prompt(name)
+            for name in selected_capabilities
+        )
+
+
+_lock = threading.Lock()
+_catalog = None
+_source = None
+
+
+def _stamp(module):
+    try:
+        info = os.stat(module.__file__)
+    except (AttributeError, OSError):
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def _read_capability_content(path):
+    """Return the capability_content string literal assigned in the file at path.
+
+    Only the file's syntax tree is read, so nothing in it runs and the
+    loaded config module keeps its values and any runtime overrides.
+    """
+    with open(path, encoding="utf-8") as source:
+        tree = ast.parse(source.read(), path)
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id == "capability_content"):
+            return ast.literal_eval(node.value)
+    raise ValueError(f"No capability_content string in {path}")
+
+
+def get_catalog():
+    """Return the process-wide catalog, rebuilding it only if config.py has changed.
+
+    The first catalog comes from config.capability_content. When config.py
+    changes on disk, the new capability text is read from the file; the
+    rest of config is left as it is.
+    """
+    global _catalog, _source
+    module = importlib.import_module("config")
+    source = (module, _stamp(module))
+    if _catalog is not None and source == _source:
+        return _catalog
+    with _lock:
+        if _catalog is None or source != _source:
+            content = module.capability_content
+            if _source is not None and _source[0] is module and source[1] is not None:
+                content = _read_capability_content(module.__file__)
+            _catalog = CapabilityCatalog(content)
+            _source = source
+        return _catalog
@@ -0,0 +1,259 @@
+"""Process-wide LLM clients sharing keep-alive connection pools.
+
+The openai, anthropic and httpx packages are imported on first use so
+that importing caseforge stays cheap.
+"""
+import os
+import threading
+from functools import lru_cache
+
+import config
+
+
+class ConnectionStats:
+    """Thread-safe counters for requests and newly opened connections."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "pool_hits": self.requests - self.new_connections
+            }
+
+
+stats = ConnectionStats()
+
+
+@lru_cache(maxsize=None)
+def _counting_transport():
+    import httpx
+
+    class CountingTransport(httpx.HTTPTransport):
+        """HTTP transport that records whether each request reused a pooled connection."""
+
+        def handle_request(self, request):
+            outer_trace = request.extensions.get("trace")
+
+            def trace(event_name, info):
+                if event_name == "connection.connect_tcp.complete":
+                    stats.record_connection()
+                if outer_trace is not None:
+                    outer_trace(event_name, info)
+
+            request.extensions["trace"] = trace
+            stats.record_request()
+            return super().handle_request(request)
+
+    return CountingTransport
+
+
+@lru_cache(maxsize=None)
+def _async_counting_transport():
+    import httpx
+
+    class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+        """Async HTTP transport that records whether each request reused a pooled connection.
+
+        Requests enter the pool one at a time. httpcore gives an idle
+        connection to every request that arrives before the first one
+        starts on it, and the rest retry, each rescanning the pool, so a
+        burst that found idle connections took seconds to get going. The
+        next request enters once this one's first trace event shows it
+        holds a connection.
+        """
+
+        def __init__(self, *args, **kwargs):
+            import asyncio
+
+            super().__init__(*args, **kwargs)
+            self._entry = asyncio.Lock()
+
+        async def handle_async_request(self, request):
+            outer_trace = request.extensions.get("trace")
+            await self._entry.acquire()
+            entering = True
+
+            def entered():
+                nonlocal entering
+                if entering:
+                    entering = False
+                    self._entry.release()
+
+            async def trace(event_name, info):
+                entered()
+                if event_name == "connection.connect_tcp.complete":
+                    stats.record_connection()
+                if outer_trace is not None:
+                    await outer_trace(event_name, info)
+
+            request.extensions["trace"] = trace
+            stats.record_request()
+            try:
+                return await super().handle_async_request(request)
+            finally:
+                entered()
+
+    return AsyncCountingTransport
+
+
+def _http_client():
+    """Build a keep-alive HTTP client using the pool settings from config."""
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY
+    )
+    return httpx.Client(
+        transport=_counting_transport()(limits=limits),
+        timeout=httpx.Timeout(config.LLM_TIMEOUT, connect=config.LLM_CONNECT_TIMEOUT)
+    )
+
+
+def _async_http_client():
+    """Build a keep-alive async HTTP client for the shared event loop.
+
+    A coroutine waiting on a reply holds no thread, so this pool is sized
+    for many more requests in flight than the blocking one.
+    """
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=config.LLM_ASYNC_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_ASYNC_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(
+        transport=_async_counting_transport()(limits=limits),
+        timeout=httpx.Timeout(config.LLM_TIMEOUT, connect=config.LLM_CONNECT_TIMEOUT)
+    )
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared(provider, api_key, factory):
+    with _clients_lock:
+        client = _clients.get((provider, api_key))
+        if client is None:
+            client = factory()
+            _clients[(provider, api_key)] = client
+        return client
+
+
+def get_openai_client(api_key):
+    """Return the process-wide OpenAI client for this API key.
+
+    The SDK retries failed requests with exponential backoff up to
+    LLM_MAX_RETRIES times.
+    """
+    import openai
+
+    base_url = config.OPENAI_BASE_URL
+    return _shared(("openai", base_url), api_key, lambda: openai.OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=_http_client(),
+        max_retries=config.LLM_MAX_RETRIES
+    ))
+
+
+def get_anthropic_client(api_key):
+    """Return the process-wide Anthropic client for this API key."""
+    import anthropic
+
+    base_url = config.ANTHROPIC_BASE_URL
+    return _shared(("anthropic", base_url), api_key, lambda: anthropic.Anthropic(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=_http_client(),
+        max_retries=config.LLM_MAX_RETRIES
+    ))
+
+
+def get_async_openai_client(api_key):
+    """Return the process-wide AsyncOpenAI client for this API key.
+
+    Use it only from the shared event loop, which its connections belong to.
+    """
+    import openai
+
+    base_url = config.OPENAI_BASE_URL
+    return _shared(("async-openai", base_url), api_key, lambda: openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=_async_http_client(),
+        max_retries=config.LLM_MAX_RETRIES
+    ))
+
+
+def get_async_anthropic_client(api_key):
+    """Return the process-wide AsyncAnthropic client for this API key."""
+    import anthropic
+
+    base_url = config.ANTHROPIC_BASE_URL
+    return _shared(("async-anthropic", base_url), api_key, lambda: anthropic.AsyncAnthropic(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=_async_http_client(),
+        max_retries=config.LLM_MAX_RETRIES
+    ))
+
+
+def is_async(client):
+    """Tell whether client is one of the SDKs' async clients."""
+    return type(client).__name__.startswith("Async")
+
+
+def async_client(client):
+    """Return the async client with the same provider, API key and retries as client.
+
+    Async clients and routers are returned as they are.
+    """
+    if is_async(client) or not hasattr(client, "api_key"):
+        return client
+    if is_anthropic(client):
+        twin = get_async_anthropic_client(client.api_key)
+    else:
+        twin = get_async_openai_client(client.api_key)
+    if twin.max_retries != client.max_retries:
+        twin = twin.with_options(max_retries=client.max_retries)
+    return twin
+
+
+def connection_stats():
+    """Return request, new connection and pool hit counts since process start."""
+    return stats.snapshot()
+
+
+def is_anthropic(client):
+    """Tell whether client is an Anthropic client without importing the SDK."""
+    return type(client).__module__.split(".")[0] == "anthropic"
+
+
+def client_from_env(provider=None):
+    """Return the shared client for a provider using the API key from the environment."""
+    provider = provider or config.LLM_PROVIDER
+    if provider == "router":
+        from .router import get_router
+
+        return get_router(os.environ.get("OPENAI_API_KEY"), os.environ.get("ANTHROPIC_API_KEY"))
+    if provider == "anthropic":
+        return get_anthropic_client(os.environ["ANTHROPIC_API_KEY"])
+    return get_openai_client(os.environ["OPENAI_API_KEY"])
@@ -0,0 +1,186 @@
+import threading
+from collections import deque
+from functools import lru_cache
+
+import config
+
+
+# Per-message overhead of the chat format, as documented by OpenAI.
+MESSAGE_OVERHEAD = 4
+
+
+_encoding_lock = threading.Lock()
+# Models whose tokenizer is loading on a thread started by preload_tokenizer()
+_preloading = set()
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken downloads its encoding files on first use, which fails
+        # on hosts without outbound access to its CDN.
+        return None
+
+
+def _encoding(model):
+    # Callers that arrive while the encoding loads wait for it instead of loading it again
+    with _encoding_lock:
+        return _load_encoding(model)
+
+
+def load_tokenizer(model="gpt-4"):
+    """Load the tokenizer for model now, so the first count does not wait for it; return whether it loaded."""
+    return _encoding(model) is not None
+
+
+def _preload(model):
+    try:
+        _encoding(model)
+    finally:
+        _preloading.discard(model)
+
+
+def preload_tokenizer(model="gpt-4"):
+    """Start loading the tokenizer for model on a thread; counts made until it is ready are estimated."""
+    if model in _preloading:
+        return
+    _preloading.add(model)
+    threading.Thread(target=_preload, args=(model,), name="tokenizer-load", daemon=True).start()
+
+
+@lru_cache(maxsize=4096)
+def _count_tokens(text, model):
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def count_tokens(text, model="gpt-4"):
+    """Count tokens locally, estimating four characters per token without tiktoken.
+
+    While preload_tokenizer() is still loading it, the estimate is used
+    instead of waiting, so a count on the event loop never holds it up.
+    """
+    if model in _preloading:
+        return len(text) // 4 + 1
+    return _count_tokens(text, model)
+
+
+def message_tokens(messages, model="gpt-4"):
+    """Return the prompt token count of a message list."""
+    return sum(count_tokens(msg["content"], model) + MESSAGE_OVERHEAD for msg in messages)
+
+
+class Turn:
+    """One request/response pair with its token count worked out once."""
+
+    __slots__ = ("request", "response", "note", "tokens")
+
+    def __init__(self, request, response, note="", model="gpt-4"):
+        self.request = request
+        self.response = response
+        self.note = note
+        self.tokens = message_tokens([request, response], model)
+
+
+class ConversationContext:
+    """Bounded history of the LLM exchanges behind a single case review.
+
+    The initial generation is held directly, and only the most recent
+    improvements are kept. messages() fits the history to a token budget.
+    Improvements that do not fit are reduced to a one-line note of what
+    the user asked for.
+    """
+
+    def __init__(self, budget=None, max_improvements=None, model="gpt-4"):
+        self.budget = config.CONTEXT_TOKEN_BUDGET if budget is None else budget
+        self.model = model
+        self.initial = None
+        self.improvements = deque(
+            maxlen=config.CONTEXT_MAX_IMPROVEMENTS if max_improvements is None else max_improvements
+        )
+
+    def __bool__(self):
+        return self.initial is not None
+
+    def set_initial(self, request, response):
+        """Record the initial generation, starting a fresh conversation."""
+        self.initial = Turn(request, {"role": "assistant", "content": response}, model=self.model)
+        self.improvements.clear()
+
+    def add_improvement(self, request, response, note=""):
+        """Record an improvement exchange; the oldest drops out when full."""
+        self.improvements.append(
+            Turn(request, {"role": "assistant", "content": response}, note, self.model)
+        )
+
+    def to_state(self):
+        """Return the exchanges as plain lists and dicts that JSON can hold."""
+        return {
+            "model": self.model,
+            "initial": [self.initial.request, self.initial.response["content"]] if self.initial else None,
+            "improvements": [[turn.request, turn.response["content"], turn.note] for turn in self.improvements]
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a conversation from to_state(), with the budget and limits now in config."""
+        conversation = cls(model=state["model"])
+        if state["initial"]:
+            conversation.set_initial(*state["initial"])
+        for request, response, note in state["improvements"]:
+            conversation.add_improvement(request, response, note)
+        return conversation
+
+    @property
+    def latest_response(self):
+        """Return the text of the most recent review."""
+        if self.improvements:
+            return self.improvements[-1].response["content"]
+        return self.initial.response["content"] if self.initial else None
+
+    def messages(self, prefix, request):
+        """Build prefix + history + request within the token budget.
+
+        The initial generation is always sent because it carries the case
+        description, and the newest improvement because it holds the
+        current review. Older improvements are added newest first until the
+        budget runs out.
+        """
+        remaining = self.budget - message_tokens(prefix + [request], self.model)
+        history = []
+        if self.initial:
+            history.extend([self.initial.request, self.initial.response])
+            remaining -= self.initial.tokens
+
+        kept = []
+        dropped = []
+        for turn in reversed(self.improvements):
+            # The newest turn holds the current review, so it is always sent.
+            if not kept or (not dropped and turn.tokens <= remaining):
+                kept.append(turn)
+                remaining -= turn.tokens
+            else:
+                dropped.append(turn)
+
+        for turn in reversed(kept):
+            history.extend([turn.request, turn.response])
+
+        notes = [turn.note for turn in reversed(dropped) if turn.note]
+        if notes:
+            request = {
+                "role": request["role"],
+                "content": "Changes already requested earlier: "
+                + "; ".join(notes) + "\n\n" + request["content"]
+            }
+        return prefix + history + [request]
@@ -0,0 +1,87 @@
+"""One asyncio event loop per process for LLM calls, and blocking entry points to it.
+
+Waiting on a provider costs a coroutine on this loop rather than a whole
+thread, so one process can hold hundreds of requests in flight on a
+single loop thread. Code that is not async, such as a Streamlit script,
+calls run(), which blocks only its own thread and hands streamed text
+back to it, so placeholders are still drawn from the script thread.
+"""
+import queue
+import threading
+
+import config
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """Return the shared event loop, starting its thread on first use."""
+    global _loop
+    # asyncio takes longer to import than the rest of caseforge together,
+    # so it is left until a loop is needed.
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            # Blocking calls handed to threads, as with LLM_ASYNC_ENABLED off,
+            # get as many threads as the blocking clients have connections.
+            loop.set_default_executor(
+                ThreadPoolExecutor(max_workers=config.LLM_MAX_CONNECTIONS, thread_name_prefix="llm-blocking")
+            )
+            threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+            # Requests count their tokens on the loop thread, and the
+            # tokenizer's first load can take seconds, which would hold up
+            # every stream on the loop. It is loaded alongside the loop
+            # instead, and counts are estimated until it is ready.
+            from .conversation import preload_tokenizer
+            preload_tokenizer()
+            _loop = loop
+        return _loop
+
+
+def submit(coroutine):
+    """Schedule coroutine on the shared loop and return a concurrent.futures.Future.
+
+    The coroutine runs in a copy of the caller's context, so the current
+    session and span follow it onto the loop.
+    """
+    import asyncio
+
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+
+
+def run(afn, *args, stream_to=None, **kwargs):
+    """Run the coroutine function afn(*args, **kwargs) on the shared loop and return its result.
+
+    When stream_to is given, afn is passed a stream_to of its own, and
+    every call made to it is repeated on this thread, in order. If
+    stream_to raises, for example because Streamlit stopped the script,
+    the coroutine is cancelled.
+    """
+    if stream_to is None:
+        return submit(afn(*args, **kwargs)).result()
+    calls = queue.SimpleQueue()
+    future = submit(afn(*args, stream_to=lambda *call: calls.put(call), **kwargs))
+    future.add_done_callback(lambda _: calls.put(None))
+    try:
+        for call in iter(calls.get, None):
+            stream_to(*call)
+    except BaseException:
+        future.cancel()
+        raise
+    return future.result()
+
+
+def stats():
+    """Return the tasks on the shared loop and the threads in the process."""
+    import asyncio
+
+    return {
+        "running": _loop is not None,
+        "tasks": len(asyncio.all_tasks(_loop)) if _loop is not None else 0,
+        "threads": threading.active_count()
+    }
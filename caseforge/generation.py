@@ -0,0 +1,699 @@
+"""Prompt building and LLM calls for case reviews, titles and improvements.
+
+Each call has a coroutine form, named with an _async suffix, that runs on
+the shared event loop with the async SDK clients. The plain functions are
+blocking wrappers around them for callers that are not async.
+"""
+import json
+import time
+
+import config
+
+from .catalog import get_catalog
+from .clients import async_client, is_anthropic
+from .conversation import count_tokens, message_tokens
+from .event_loop import run
+from .output_budget import (
+    Truncated, continuation_messages, fit_context, grow, length_guidance, review_max_tokens, review_targets,
+    rewrite_max_tokens
+)
+from .prompts import few_shot_messages, to_anthropic
+from .rate_limit import REVIEW, TITLE, rate_limiter
+from .router import Router
+from .section_edit import build_section_messages, section_max_tokens
+from .single_flight import single_flight
+from .section_parser import format_sections, get_section, set_section, section_reply
+from .telemetry import span, telemetry
+from .structured import (
+    StructuredReview, StructuredReviewParser, anthropic_tool, build_repair_messages, response_format
+)
+from .response_cache import cache_key, get_response_cache
+from .titles import ENGINES as title_engines
+from .token_usage import token_usage
+
+
+TITLE_SYSTEM_PROMPT = "You are a medical assistant that generates brief (4-6 words) clinical case titles. Make them professional and medical in nature."
+DEFAULT_TITLE = "Case Review"
+
+
+def format_capabilities(selected_capabilities):
+    """Format selected capabilities into text format."""
+    return get_catalog().format(selected_capabilities)
+
+
+def clean_text(text):
+    """Strip markdown emphasis and carriage returns so every provider's text parses alike."""
+    return text.replace('*', '').replace('#', '').replace('\r', '')
+
+
+def _reply(content, truncated):
+    """Return content, as Truncated if the reply was cut off at max_tokens."""
+    return Truncated(content) if truncated and content else content
+
+
+def complete_openai(client, stream_to=None, **kwargs):
+    """Run a chat completion against OpenAI, streaming it to stream_to if given."""
+    if stream_to is None:
+        response = client.chat.completions.create(**kwargs)
+        token_usage.record_openai(response.usage)
+        if not response.choices:
+            return None
+        choice = response.choices[0]
+        return _reply(clean_text(choice.message.content), choice.finish_reason == "length")
+    
+    parts = []
+    finish_reason = None
+    # The context manager closes the response if the caller stops early.
+    with client.chat.completions.with_streaming_response.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    ) as response:
+        for line in response.iter_lines():
+            chunk = _openai_chunk(line, response)
+            if chunk is not None:
+                finish_reason = _openai_delta(chunk, parts, stream_to) or finish_reason
+    return _reply("".join(parts) or None, finish_reason == "length")
+
+
+def _openai_chunk(line, response):
+    """Return the JSON of one line of an OpenAI event stream, or None if it carries no chunk.
+
+    Streams are read as raw lines because the SDK's stream iterator builds
+    a pydantic model for every chunk. With every stream in the process on
+    one event loop thread, that cost held back other requests' first text.
+    """
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return None
+    chunk = json.loads(data)
+    if chunk.get("error"):
+        # Raised as the SDK's own stream iterator would; the SDK is loaded by now
+        import openai
+
+        error = chunk["error"]
+        message = error.get("message") if isinstance(error, dict) else None
+        raise openai.APIError(message or "An error occurred during streaming", response.http_request, body=error)
+    return chunk
+
+
+def _openai_delta(chunk, parts, stream_to):
+    """Pass the text of one stream chunk to stream_to, record its usage and return its finish_reason."""
+    if chunk.get("usage"):
+        token_usage.record_openai(chunk["usage"])
+    if not chunk.get("choices"):
+        return None
+    choice = chunk["choices"][0]
+    content = (choice.get("delta") or {}).get("content")
+    if content:
+        text = clean_text(content)
+        parts.append(text)
+        stream_to(text)
+    return choice.get("finish_reason")
+
+
+def complete_anthropic(client, stream_to=None, model=None, messages=None, response_format=None, **kwargs):
+    """Run a completion against Anthropic with the few-shot prefix marked for caching.
+    
+    A JSON schema response_format becomes a forced tool call, and the
+    tool's input is returned as JSON text, as OpenAI would return it.
+    """
+    system, anthropic_messages = to_anthropic(messages)
+    request = dict(
+        model=config.ANTHROPIC_MODELS.get(model, model),
+        system=system,
+        messages=anthropic_messages,
+        **kwargs
+    )
+    if response_format is not None:
+        request.update(anthropic_tool(response_format))
+    if stream_to is None:
+        response = client.beta.prompt_caching.messages.create(**request)
+        token_usage.record_anthropic(response.usage)
+        text = "".join(
+            block.text if block.type == "text" else json.dumps(block.input)
+            for block in response.content if block.type in ("text", "tool_use")
+        )
+        return _reply(clean_text(text) or None, response.stop_reason == "max_tokens")
+    
+    parts = []
+    with client.beta.prompt_caching.messages.stream(**request) as stream:
+        for event in stream:
+            if event.type == "text":
+                text = event.text
+            elif event.type == "input_json":
+                text = event.partial_json
+            else:
+                continue
+            text = clean_text(text)
+            parts.append(text)
+            stream_to(text)
+        final = stream.get_final_message()
+        token_usage.record_anthropic(final.usage)
+    return _reply("".join(parts) or None, final.stop_reason == "max_tokens")
+
+
+async def complete_openai_async(client, stream_to=None, **kwargs):
+    """Like complete_openai(), on an AsyncOpenAI client."""
+    if stream_to is None:
+        response = await client.chat.completions.create(**kwargs)
+        token_usage.record_openai(response.usage)
+        if not response.choices:
+            return None
+        choice = response.choices[0]
+        return _reply(clean_text(choice.message.content), choice.finish_reason == "length")
+    
+    parts = []
+    finish_reason = None
+    async with client.chat.completions.with_streaming_response.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    ) as response:
+        async for line in response.iter_lines():
+            chunk = _openai_chunk(line, response)
+            if chunk is not None:
+                finish_reason = _openai_delta(chunk, parts, stream_to) or finish_reason
+    return _reply("".join(parts) or None, finish_reason == "length")
+
+
+async def complete_anthropic_async(client, stream_to=None, model=None, messages=None, response_format=None,
+                                   **kwargs):
+    """Like complete_anthropic(), on an AsyncAnthropic client."""
+    system, anthropic_messages = to_anthropic(messages)
+    request = dict(
+        model=config.ANTHROPIC_MODELS.get(model, model),
+        system=system,
+        messages=anthropic_messages,
+        **kwargs
+    )
+    if response_format is not None:
+        request.update(anthropic_tool(response_format))
+    if stream_to is None:
+        response = await client.beta.prompt_caching.messages.create(**request)
+        token_usage.record_anthropic(response.usage)
+        text = "".join(
+            block.text if block.type == "text" else json.dumps(block.input)
+            for block in response.content if block.type in ("text", "tool_use")
+        )
+        return _reply(clean_text(text) or None, response.stop_reason == "max_tokens")
+    
+    parts = []
+    async with client.beta.prompt_caching.messages.stream(**request) as stream:
+        async for event in stream:
+            if event.type == "text":
+                text = event.text
+            elif event.type == "input_json":
+                text = event.partial_json
+            else:
+                continue
+            text = clean_text(text)
+            parts.append(text)
+            stream_to(text)
+        final = await stream.get_final_message()
+        token_usage.record_anthropic(final.usage)
+    return _reply("".join(parts) or None, final.stop_reason == "max_tokens")
+
+
+# Rate limiter priority of each call type; anything not listed is a review.
+CALL_PRIORITIES = {"title": TITLE}
+
+
+def send(client, stream_to=None, call_type="review", **kwargs):
+    """Send one request to a provider client, admitted by the rate limiter.
+    
+    Returns the reply text, as Truncated when it was cut off at max_tokens.
+    """
+    provider = "anthropic" if is_anthropic(client) else "openai"
+    with span("llm.request", call_type=call_type, provider=provider, model=kwargs.get("model"),
+              stream=stream_to is not None) as request_span:
+        prompt_tokens = message_tokens(kwargs.get("messages", []))
+        request_span.set("prompt_tokens", prompt_tokens)
+        ticket = None
+        if config.RATE_LIMIT_ENABLED:
+            # Providers count max_tokens against the limit until the reply is
+            # done, so reserve it up front and hand back what was not used.
+            with span("rate_limit.wait", call_type=call_type):
+                ticket = rate_limiter.acquire(
+                    prompt_tokens + kwargs.get("max_tokens", 0), CALL_PRIORITIES.get(call_type, REVIEW)
+                )
+        if stream_to is not None:
+            stream_to = _first_text_timer(stream_to, request_span, call_type, provider)
+        content = None
+        try:
+            if is_anthropic(client):
+                content = complete_anthropic(client, stream_to=stream_to, **kwargs)
+            else:
+                content = complete_openai(client, stream_to=stream_to, **kwargs)
+        finally:
+            completion_tokens = count_tokens(content) if content else 0
+            request_span.set("completion_tokens", completion_tokens)
+            if ticket is not None:
+                rate_limiter.settle(ticket, prompt_tokens + completion_tokens)
+        _record_truncation(content, request_span, call_type, provider)
+    return content
+
+
+async def send_async(client, stream_to=None, call_type="review", **kwargs):
+    """Like send(), on an async client, waiting for the rate limiter without blocking the loop."""
+    provider = "anthropic" if is_anthropic(client) else "openai"
+    with span("llm.request", call_type=call_type, provider=provider, model=kwargs.get("model"),
+              stream=stream_to is not None) as request_span:
+        prompt_tokens = message_tokens(kwargs.get("messages", []))
+        request_span.set("prompt_tokens", prompt_tokens)
+        ticket = None
+        if config.RATE_LIMIT_ENABLED:
+            with span("rate_limit.wait", call_type=call_type):
+                ticket = await rate_limiter.acquire_async(
+                    prompt_tokens + kwargs.get("max_tokens", 0), CALL_PRIORITIES.get(call_type, REVIEW)
+                )
+        if stream_to is not None:
+            stream_to = _first_text_timer(stream_to, request_span, call_type, provider)
+        content = None
+        try:
+            if is_anthropic(client):
+                content = await complete_anthropic_async(client, stream_to=stream_to, **kwargs)
+            else:
+                content = await complete_openai_async(client, stream_to=stream_to, **kwargs)
+        finally:
+            completion_tokens = count_tokens(content) if content else 0
+            request_span.set("completion_tokens", completion_tokens)
+            if ticket is not None:
+                rate_limiter.settle(ticket, prompt_tokens + completion_tokens)
+        _record_truncation(content, request_span, call_type, provider)
+    return content
+
+
+def _record_truncation(content, request_span, call_type, provider):
+    if isinstance(content, Truncated):
+        request_span.set("truncated", True)
+        telemetry.count("caseforge_llm_truncated_total", call_type=call_type, provider=provider)
+
+
+def _first_text_timer(stream_to, request_span, call_type, provider):
+    """Wrap stream_to to record the time to the first text of a request."""
+    started = time.perf_counter()
+    timed = False
+
+    def on_text(text):
+        nonlocal timed
+        if not timed:
+            timed = True
+            seconds = time.perf_counter() - started
+            request_span.set("time_to_first_token_s", seconds)
+            telemetry.observe(
+                "caseforge_llm_time_to_first_token_seconds", seconds, call_type=call_type, provider=provider
+            )
+        stream_to(text)
+
+    return on_text
+
+
+def complete(client, stream_to=None, use_cache=False, call_type="review", **kwargs):
+    """Run a chat completion, optionally passing each text delta to stream_to.
+    
+    With use_cache, identical requests are answered from the response cache;
+    a cached answer is passed to stream_to in a single piece. Identical
+    requests already in flight, from any session, share that call. client
+    may be a Router, which picks the provider and model for call_type itself.
+    A reply cut off at max_tokens is returned as Truncated and not cached.
+    """
+    use_cache = use_cache and config.RESPONSE_CACHE_ENABLED
+    with span("llm.complete", call_type=call_type) as complete_span:
+        key = None
+        if use_cache or config.SINGLE_FLIGHT_ENABLED:
+            key = cache_key(client=type(client).__name__, **kwargs)
+        if use_cache:
+            cached = get_response_cache().get(key)
+            complete_span.set("cache_hit", cached is not None)
+            telemetry.count(
+                "caseforge_response_cache_total", result="miss" if cached is None else "hit", call_type=call_type
+            )
+            if cached is not None:
+                if stream_to is not None:
+                    stream_to(cached)
+                return cached
+        
+        def call(on_text):
+            if isinstance(client, Router):
+                def send_routed(routed_client, model, routed_on_text):
+                    return send(
+                        routed_client, stream_to=routed_on_text, call_type=call_type, **dict(kwargs, model=model)
+                    )
+                
+                content = client.complete(call_type, send_routed, stream_to=on_text)
+            else:
+                content = send(client, stream_to=on_text, call_type=call_type, **kwargs)
+            # A reply cut off at max_tokens is not kept, so it is asked for in full next time
+            if use_cache and content and not isinstance(content, Truncated):
+                get_response_cache().set(key, content)
+            return content
+        
+        if config.SINGLE_FLIGHT_ENABLED:
+            return single_flight.do(key, call, stream_to, call_type)
+        return call(stream_to)
+
+
+async def complete_async(client, stream_to=None, use_cache=False, call_type="review", **kwargs):
+    """Like complete(), as a coroutine for the shared event loop.
+    
+    client may be a blocking client; its async twin is used in its place.
+    With LLM_ASYNC_ENABLED off, the blocking complete() runs in a worker
+    thread instead.
+    """
+    import asyncio
+    
+    if not config.LLM_ASYNC_ENABLED:
+        return await asyncio.to_thread(
+            complete, client, stream_to=stream_to, use_cache=use_cache, call_type=call_type, **kwargs
+        )
+    use_cache = use_cache and config.RESPONSE_CACHE_ENABLED
+    with span("llm.complete", call_type=call_type) as complete_span:
+        key = None
+        if use_cache or config.SINGLE_FLIGHT_ENABLED:
+            # Keyed as the blocking client would be, so both share cached and in-flight answers
+            key = cache_key(client=type(client).__name__.removeprefix("Async"), **kwargs)
+        if use_cache:
+            # The cache is SQLite, which blocks, so it is read and written off the loop
+            cached = await asyncio.to_thread(lambda: get_response_cache().get(key))
+            complete_span.set("cache_hit", cached is not None)
+            telemetry.count(
+                "caseforge_response_cache_total", result="miss" if cached is None else "hit", call_type=call_type
+            )
+            if cached is not None:
+                if stream_to is not None:
+                    stream_to(cached)
+                return cached
+        
+        async def call(on_text):
+            if isinstance(client, Router):
+                async def send_routed(routed_client, model, routed_on_text):
+                    return await send_async(
+                        routed_client, stream_to=routed_on_text, call_type=call_type, **dict(kwargs, model=model)
+                    )
+                
+                content = await client.complete_async(call_type, send_routed, stream_to=on_text)
+            else:
+                content = await send_async(async_client(client), stream_to=on_text, call_type=call_type, **kwargs)
+            # A reply cut off at max_tokens is not kept, so it is asked for in full next time
+            if use_cache and content and not isinstance(content, Truncated):
+                await asyncio.to_thread(lambda: get_response_cache().set(key, content))
+            return content
+        
+        if config.SINGLE_FLIGHT_ENABLED:
+            return await single_flight.do_async(key, call, stream_to, call_type)
+        return await call(stream_to)
+
+
+async def complete_in_full_async(client, messages, max_tokens, stream_to=None, call_type="review", **kwargs):
+    """complete_async(), asking for the rest of a reply cut off at max_tokens.
+    
+    Only a truncated reply is followed up, with grow(max_tokens) each time,
+    up to OUTPUT_RETRY_ATTEMPTS times. The follow-up continues the text
+    rather than starting over, so what was streamed already stands. Its
+    budget is cut to what is left of the model's context window, and when
+    nothing is left, or the follow-up fails, the truncated text is returned.
+    """
+    content = await complete_async(
+        client, stream_to=stream_to, call_type=call_type, messages=messages, max_tokens=max_tokens, **kwargs
+    )
+    kwargs.pop("use_cache", None)
+    for _ in range(config.OUTPUT_RETRY_ATTEMPTS):
+        if not isinstance(content, Truncated):
+            break
+        follow_up = continuation_messages(messages, content)
+        max_tokens = fit_context(grow(max_tokens), follow_up, kwargs.get("model"))
+        if not max_tokens:
+            break
+        telemetry.count("caseforge_output_retries_total", call_type=call_type)
+        try:
+            rest = await complete_async(
+                client,
+                stream_to=stream_to,
+                call_type=call_type,
+                messages=follow_up,
+                max_tokens=max_tokens,
+                **kwargs
+            )
+        except Exception:
+            telemetry.count("caseforge_output_retry_failures_total", call_type=call_type)
+            break
+        if not rest:
+            break
+        content = content + rest
+        if isinstance(rest, Truncated):
+            content = Truncated(content)
+    return content
+
+
+def build_review_messages(case_description, selected_capabilities, targets=None):
+    """Build the message list for an initial case review.
+    
+    targets, from output_budget.review_targets(), adds the length to aim
+    for in each section.
+    """
+    formatted_capabilities = format_capabilities(selected_capabilities)
+    messages = few_shot_messages()
+    content = f"""Generate a structured case review with the following:
+            {config.MAIN_PROMPT.format(
+                formatted_capabilities=formatted_capabilities,
+                case_description=case_description
+            )}"""
+    if targets is not None:
+        content += f"\n\n{length_guidance(targets)}"
+    messages.append({"role": "user", "content": content})
+    return messages
+
+
+def generate_case_review(client, case_description, selected_capabilities, stream_to=None):
+    """Generate a case review and return (request message, review text).
+    
+    When stream_to is given the response is streamed and each text delta is
+    passed to it as soon as it arrives. The work runs on the shared event
+    loop; stream_to is still called on this thread.
+    """
+    return run(generate_case_review_async, client, case_description, selected_capabilities, stream_to=stream_to)
+
+
+async def generate_case_review_async(client, case_description, selected_capabilities, stream_to=None):
+    """Coroutine form of generate_case_review()."""
+    if config.REVIEW_OUTPUT == "structured":
+        return await generate_structured_review_async(client, case_description, selected_capabilities, stream_to)
+    targets = review_targets(case_description)
+    messages = build_review_messages(case_description, selected_capabilities, targets)
+    content = await complete_in_full_async(
+        client,
+        messages,
+        review_max_tokens(targets, selected_capabilities),
+        stream_to=stream_to,
+        use_cache=True,
+        model="gpt-4o-mini",
+        temperature=0.7
+    )
+    if not content:
+        raise Exception("No content in LLM response")
+    return messages[-1], content
+
+
+async def generate_structured_review_async(client, case_description, selected_capabilities, stream_to=None):
+    """Generate a review as JSON and return (request message, review text).
+    
+    The JSON is turned back into review text as it streams, so stream_to
+    sees the same text as for a plain review. Sections that are missing
+    or cut short at the end are asked for again on their own, up to
+    STRUCTURED_REPAIR_ATTEMPTS times, instead of regenerating the review.
+    The follow-up's budget is grown only when the reply before it was
+    cut off at max_tokens. The review text is a StructuredReview, whose
+    .sections are the parsed sections, so callers need not parse it.
+    """
+    targets = review_targets(case_description)
+    messages = build_review_messages(case_description, selected_capabilities, targets)
+    parser = StructuredReviewParser(selected_capabilities, stream_to)
+    content = await complete_async(
+        client,
+        stream_to=parser.feed if stream_to is not None else None,
+        use_cache=True,
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=review_max_tokens(targets, selected_capabilities),
+        temperature=0.7,
+        response_format=response_format(selected_capabilities)
+    )
+    if not content:
+        raise Exception("No content in LLM response")
+    if stream_to is None:
+        parser.feed(content)
+    sections = parser.sections()
+    
+    missing = parser.missing()
+    for _ in range(config.STRUCTURED_REPAIR_ATTEMPTS):
+        if not missing:
+            break
+        max_tokens = review_max_tokens(targets, selected_capabilities, missing)
+        if isinstance(content, Truncated):
+            max_tokens = grow(max_tokens)
+        repair_messages = build_repair_messages(case_description, sections, missing, selected_capabilities)
+        max_tokens = fit_context(max_tokens, repair_messages, "gpt-4o-mini")
+        if not max_tokens:
+            break
+        telemetry.count("caseforge_structured_repairs_total")
+        telemetry.count("caseforge_structured_repaired_sections_total", len(missing))
+        if isinstance(content, Truncated):
+            telemetry.count("caseforge_output_retries_total", call_type="review")
+        repair = StructuredReviewParser(selected_capabilities, stream_to, continues=True)
+        content = await complete_async(
+            client,
+            stream_to=repair.feed if stream_to is not None else None,
+            model="gpt-4o-mini",
+            messages=repair_messages,
+            max_tokens=max_tokens,
+            temperature=0.7,
+            response_format=response_format(selected_capabilities, missing)
+        )
+        if stream_to is None and content:
+            repair.feed(content)
+        repaired = repair.sections()
+        for key in missing:
+            if key in repair.complete and get_section(repaired, key):
+                set_section(sections, key, get_section(repaired, key))
+        missing = [key for key in missing if key not in repair.complete or not get_section(repaired, key)]
+    return messages[-1], StructuredReview(format_sections(sections, selected_capabilities), sections)
+
+
+def generate_title(client, case_description):
+    """Generate a brief title from the case description.
+    
+    The title engine named by config.TITLE_ENGINE is tried first. The LLM
+    is only asked when no local engine is selected, or when the local
+    title's confidence is below TITLE_MIN_CONFIDENCE and TITLE_LLM_FALLBACK
+    allows it.
+    """
+    return run(generate_title_async, client, case_description)
+
+
+async def generate_title_async(client, case_description):
+    """Coroutine form of generate_title()."""
+    with span("title", engine=config.TITLE_ENGINE) as title_span:
+        engine = title_engines.get(config.TITLE_ENGINE)
+        if engine is not None:
+            title, confidence = engine(case_description)
+            title_span.set("confidence", confidence)
+            if confidence >= config.TITLE_MIN_CONFIDENCE:
+                return title
+            if not config.TITLE_LLM_FALLBACK:
+                return title or DEFAULT_TITLE
+        title_span.set("llm", True)
+        return await generate_llm_title_async(client, case_description)
+
+
+def generate_llm_title(client, case_description):
+    """Ask the LLM for a brief title for the case description."""
+    return run(generate_llm_title_async, client, case_description)
+
+
+async def generate_llm_title_async(client, case_description):
+    """Coroutine form of generate_llm_title()."""
+    messages = [
+        {
+            "role": "system",
+            "content": TITLE_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"Generate a brief clinical case title from this description:\n{case_description}"
+        }
+    ]
+    
+    title = await complete_async(
+        client,
+        use_cache=True,
+        call_type="title",
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=50,
+        temperature=0.7
+    )
+    
+    if title:
+        return title.strip().replace('"',"")
+    return DEFAULT_TITLE
+
+
+def improve_case_review(client, conversation, improvement_prompt, stream_to=None):
+    """Ask for an improved review and return (request message, review text).
+    
+    conversation supplies the earlier turns; recording the new turn is left
+    to the caller once the result has been accepted.
+    """
+    return run(improve_case_review_async, client, conversation, improvement_prompt, stream_to=stream_to)
+
+
+async def improve_case_review_async(client, conversation, improvement_prompt, stream_to=None):
+    """Coroutine form of improve_case_review()."""
+    improvement_request = {"role": "user", "content": f"Improve the case: {improvement_prompt}"}
+    messages = conversation.messages(few_shot_messages(), improvement_request)
+    content = await complete_in_full_async(
+        client,
+        messages,
+        rewrite_max_tokens(conversation.latest_response),
+        stream_to=stream_to,
+        call_type="improve",
+        model="gpt-4",
+        temperature=0.7
+    )
+    if not content:
+        raise Exception("No content in LLM response")
+    return improvement_request, content
+
+
+async def improve_section_async(client, sections, key, improvement_prompt, selected_capabilities, stream_to=None):
+    """Ask for one improved section and return its new text.
+    
+    Only the section and the brief description are sent, and the reply is
+    capped in proportion to the section, so the cost follows its size.
+    """
+    messages = build_section_messages(sections, key, improvement_prompt)
+    content = await complete_in_full_async(
+        client,
+        messages,
+        section_max_tokens(get_section(sections, key)),
+        stream_to=stream_to,
+        call_type="improve",
+        model="gpt-4",
+        temperature=0.7
+    )
+    if not content:
+        raise Exception("No content in LLM response")
+    return section_reply(content, key, selected_capabilities)
+
+
+def improve_sections(client, sections, keys, improvement_prompt, selected_capabilities, stream_to=None):
+    """Improve each section in keys and return a copy of sections with them replaced.
+    
+    The sections are improved concurrently. When stream_to is given,
+    stream_to(key, text) is called with each text delta, so deltas of
+    different sections arrive interleaved.
+    """
+    return run(
+        improve_sections_async, client, sections, keys, improvement_prompt, selected_capabilities,
+        stream_to=stream_to
+    )
+
+
+async def improve_sections_async(client, sections, keys, improvement_prompt, selected_capabilities, stream_to=None):
+    """Coroutine form of improve_sections()."""
+    import asyncio
+
+    def improve(key):
+        on_text = None
+        if stream_to is not None:
+            on_text = lambda text: stream_to(key, text)
+        return improve_section_async(client, sections, key, improvement_prompt, selected_capabilities, stream_to=on_text)
+
+    replies = await asyncio.gather(*(improve(key) for key in keys))
+    improved = dict(sections, capabilities=dict(sections["capabilities"]))
+    for key, reply in zip(keys, replies):
+        set_section(improved, key, reply)
+    return improved
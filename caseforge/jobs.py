@@ -0,0 +1,158 @@
+"""Background jobs that outlive the Streamlit script run that started them.
+
+A job runs on a shared worker pool, so a rerun, a refresh or a closed
+tab no longer throws away a generation half way through. Each job has an
+idempotency key derived from its inputs. Submitting the same key again,
+from any session, returns the job already running (or recently finished)
+rather than starting another upstream call. Callers follow a job's
+progress with wait(), which returns the text streamed since a given
+offset, so a new script run can pick a job up where the last one left it.
+"""
+import contextvars
+import hashlib
+import inspect
+import json
+import threading
+import time
+import uuid
+
+import config
+
+from .event_loop import submit
+from .single_flight import SharedStream
+from .telemetry import telemetry
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def job_key(kind, case_description, selected_capabilities):
+    """Return the idempotency key of a job from what it works on.
+
+    Whitespace in the description is normalised, so re-pasting the same
+    case does not count as a different one.
+    """
+    payload = json.dumps(
+        [kind, " ".join(case_description.split()), list(selected_capabilities)],
+        ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Job(SharedStream):
+    """One background call, its streamed text so far and its outcome."""
+
+    def __init__(self, key, kind, meta=None):
+        super().__init__()
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.kind = kind
+        self.meta = meta or {}
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.attached = 0
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.finished = time.time()
+        self.finish(result, error)
+
+
+class JobManager:
+    """Table of jobs by id and by idempotency key, run on a shared worker pool."""
+
+    def __init__(self, max_workers=None, retention=None):
+        self.max_workers = config.JOB_WORKERS if max_workers is None else max_workers
+        self.retention = config.JOB_RETENTION if retention is None else retention
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_key = {}
+        self._executor = None
+        self.submitted = 0
+        self.attached = 0
+
+    def submit(self, key, kind, fn, *args, meta=None, **kwargs):
+        """Run fn(*args, stream_to=job.append, **kwargs) as a job unless key already has one.
+
+        A job with the same key that is queued, running, or finished within
+        the retention period is returned instead. Failed jobs are not
+        reused, so submitting again retries. A coroutine function runs on
+        the shared event loop rather than taking a worker thread.
+        """
+        with self._lock:
+            self._expire()
+            job = self._by_key.get(key)
+            if job is not None and job.status != FAILED:
+                job.attached += 1
+                self.attached += 1
+                telemetry.count("caseforge_jobs_total", kind=kind, outcome="attached")
+                return job
+            job = Job(key, kind, meta)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            self.submitted += 1
+            telemetry.count("caseforge_jobs_total", kind=kind, outcome="submitted")
+            if inspect.iscoroutinefunction(fn):
+                submit(self._run_async(job, fn, args, kwargs))
+                return job
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+            # The copied context carries the session id and current span
+            context = contextvars.copy_context()
+            self._executor.submit(context.run, self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            result = fn(*args, stream_to=job.append, **kwargs)
+        except Exception as e:
+            job._finish(FAILED, error=e)
+        else:
+            job._finish(DONE, result=result)
+
+    async def _run_async(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            result = await fn(*args, stream_to=job.append, **kwargs)
+        except Exception as e:
+            job._finish(FAILED, error=e)
+        else:
+            job._finish(DONE, result=result)
+
+    def get(self, job_id):
+        """Return the job with job_id, or None if it is unknown or has expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.retention
+        expired = [job for job in self._jobs.values() if job.done and job.finished < cutoff]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "submitted": self.submitted,
+                "attached": self.attached,
+                "queued": statuses.count(QUEUED),
+                "running": statuses.count(RUNNING),
+                "kept": len(statuses)
+            }
+
+
+# One job table per process, shared by every session
+jobs = JobManager()
@@ -0,0 +1,91 @@
+"""Reply token budgets sized to what a request asks for.
+
+Reviews used to ask for a flat 4000 tokens whatever was selected, and the
+rate limiter holds max_tokens against the token budget until the reply
+ends. Here each section has a length target in words, the brief
+description's growing with the case description, and a review's budget
+is the sum of its sections' with room to run over. The targets also go
+into the prompt, so the model aims for them. A reply that still runs out
+of budget comes back as Truncated, and only then is more asked for.
+"""
+import config
+
+from .conversation import count_tokens, message_tokens
+from .section_parser import section_labels
+
+
+CONTINUE_PROMPT = (
+    "Your reply was cut off. Continue it from exactly where it stopped, "
+    "without repeating anything and without any preamble."
+)
+
+LENGTH_LABELS = {
+    "brief_description": "the Brief Description",
+    "capability": "each capability",
+    "reflection": "the Reflection",
+    "learning_needs": "the Learning needs"
+}
+
+
+class Truncated(str):
+    """Reply text that stopped because it reached max_tokens."""
+
+
+def section_kind(key):
+    """Return the kind of section key: a top-level key, or "capability"."""
+    return key[0] if isinstance(key, tuple) else key
+
+
+def review_targets(case_description):
+    """Return the length target in words of each kind of section."""
+    targets = dict(config.OUTPUT_SECTION_WORDS)
+    case_words = len(case_description.split())
+    targets["brief_description"] = min(
+        targets["brief_description"] + int(case_words * config.OUTPUT_BRIEF_WORDS_PER_CASE_WORD),
+        config.OUTPUT_BRIEF_WORDS_MAX
+    )
+    return targets
+
+
+def review_max_tokens(targets, selected_capabilities, keys=None):
+    """Return the reply budget for a review, or for just the sections in keys."""
+    tokens = sum(
+        targets[section_kind(key)] * config.OUTPUT_TOKENS_PER_WORD + config.OUTPUT_SECTION_OVERHEAD
+        for key, _ in section_labels(selected_capabilities)
+        if keys is None or key in keys
+    )
+    return min(int(tokens), config.OUTPUT_MAX_TOKENS)
+
+
+def rewrite_max_tokens(current_text):
+    """Return the reply budget for rewriting a whole review, in proportion to its length."""
+    if not current_text:
+        return config.OUTPUT_MAX_TOKENS
+    tokens = count_tokens(current_text) * config.OUTPUT_REWRITE_GROWTH + config.OUTPUT_REWRITE_HEADROOM
+    return min(int(tokens), config.OUTPUT_MAX_TOKENS)
+
+
+def grow(max_tokens):
+    """Return the budget for asking again after a reply was cut off at max_tokens."""
+    return min(int(max_tokens * config.OUTPUT_RETRY_GROWTH), config.OUTPUT_MAX_TOKENS)
+
+
+def fit_context(max_tokens, messages, model):
+    """Return max_tokens cut to what messages leave of model's context window, 0 if nothing."""
+    limit = config.MODEL_CONTEXT_TOKENS.get(model, config.MODEL_CONTEXT_DEFAULT)
+    room = limit - message_tokens(messages) - config.OUTPUT_CONTEXT_MARGIN
+    return max(min(max_tokens, room), 0)
+
+
+def length_guidance(targets):
+    """Return a prompt line giving the length to aim for in each section."""
+    parts = [f"about {targets[kind]} words for {label}" for kind, label in LENGTH_LABELS.items()]
+    return f"Aim for {', '.join(parts[:-1])} and {parts[-1]}."
+
+
+def continuation_messages(messages, partial):
+    """Build the message list asking for the rest of a reply that was cut off."""
+    return messages + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT}
+    ]
@@ -0,0 +1,47 @@
+import config
+
+
+# The static opening of every generation and improvement request. It is
+# built once so that each request starts with a byte-identical prefix,
+# which is what both providers' prompt caches key on.
+FEW_SHOT_MESSAGES = (
+    {"role": "system", "content": config.SYSTEM_PROMPT},
+    {"role": "user", "content": config.EXAMPLE_1},
+    {"role": "assistant", "content": config.EXAMPLE_1_RESPONSE},
+    {"role": "user", "content": config.EXAMPLE_2},
+    {"role": "assistant", "content": config.EXAMPLE_2_RESPONSE}
+)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def few_shot_messages():
+    """Return the system prompt and worked examples that open every request."""
+    return list(FEW_SHOT_MESSAGES)
+
+
+def to_anthropic(messages):
+    """Convert OpenAI-style messages to Anthropic's system and message lists.
+
+    A cache_control breakpoint is placed on the last message of the
+    few-shot prefix, so Anthropic caches the system prompt and examples.
+    When the conversation goes further back than that, a second
+    breakpoint on the last history message caches the earlier turns too.
+    """
+    system = []
+    converted = []
+    prefix_end = None
+    for index, msg in enumerate(messages):
+        block = {"type": "text", "text": msg["content"]}
+        if msg["role"] == "system":
+            system.append(block)
+        else:
+            converted.append({"role": msg["role"], "content": [block]})
+        if index < len(FEW_SHOT_MESSAGES) and msg is FEW_SHOT_MESSAGES[index]:
+            prefix_end = len(converted) - 1
+
+    if prefix_end is not None and prefix_end >= 0:
+        converted[prefix_end]["content"][0]["cache_control"] = CACHE_CONTROL
+    if len(converted) - 2 > (prefix_end if prefix_end is not None else -1):
+        converted[-2]["content"][0]["cache_control"] = CACHE_CONTROL
+    return system, converted
@@ -0,0 +1,244 @@
+"""Process-wide admission control for LLM requests.
+
+Every provider call first takes capacity from two token buckets, one for
+requests per minute and one for tokens per minute. Calls that cannot go
+yet wait in a queue. Reviews are served before titles. Within each
+priority, sessions take turns, so one busy user cannot starve the rest.
+Titles are only cosmetic, so they are shed instead of queued when the
+queue is long or when they have waited too long.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+
+import config
+
+
+REVIEW = 0
+TITLE = 1
+PRIORITY_NAMES = {REVIEW: "review", TITLE: "title"}
+
+# Wait times kept per priority for the percentiles in stats()
+WAIT_SAMPLES = 1000
+
+# The session a request is queued under. The app sets this at the start of
+# each run, and the scheduler carries it into its worker threads.
+current_session = contextvars.ContextVar("current_session", default="default")
+
+
+class RateLimited(Exception):
+    """Raised when a request is shed instead of being sent."""
+
+
+class TokenBucket:
+    """Capacity that refills continuously up to one minute's allowance."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount):
+        """Return the seconds until amount is available."""
+        # A request larger than the whole bucket goes once the bucket is
+        # full, and the level goes negative to make up for it.
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class _Ticket:
+    __slots__ = ("priority", "session", "tokens", "enqueued", "admitted")
+
+    def __init__(self, priority, session, tokens):
+        self.priority = priority
+        self.session = session
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.admitted = False
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class RateLimiter:
+    """Admit requests within requests-per-minute and tokens-per-minute limits."""
+
+    def __init__(self, rpm=None, tpm=None, title_shed_depth=None, title_max_wait=None, max_wait=None):
+        self.requests = TokenBucket(rpm or config.RATE_LIMIT_RPM)
+        self.tokens = TokenBucket(tpm or config.RATE_LIMIT_TPM)
+        self.title_shed_depth = (
+            config.RATE_LIMIT_TITLE_SHED_DEPTH if title_shed_depth is None else title_shed_depth
+        )
+        self.max_wait = {
+            REVIEW: config.RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait,
+            TITLE: config.RATE_LIMIT_TITLE_MAX_WAIT if title_max_wait is None else title_max_wait
+        }
+        self._cond = threading.Condition()
+        # For each priority: the waiting tickets of every session, and the
+        # order in which those sessions take turns.
+        self._queues = {priority: {} for priority in PRIORITY_NAMES}
+        self._turns = {priority: deque() for priority in PRIORITY_NAMES}
+        self._waits = {priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITY_NAMES}
+        self.admitted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.shed = {priority: 0 for priority in PRIORITY_NAMES}
+        self.depth = 0
+        self.max_depth = 0
+
+    def _head(self):
+        for priority in sorted(self._turns):
+            turns = self._turns[priority]
+            if turns:
+                return self._queues[priority][turns[0]][0]
+        return None
+
+    def _enqueue(self, ticket):
+        queues = self._queues[ticket.priority]
+        if ticket.session not in queues:
+            queues[ticket.session] = deque()
+            self._turns[ticket.priority].append(ticket.session)
+        queues[ticket.session].append(ticket)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def _remove(self, ticket):
+        queues = self._queues[ticket.priority]
+        turns = self._turns[ticket.priority]
+        queue = queues[ticket.session]
+        was_next = turns[0] == ticket.session and queue[0] is ticket
+        queue.remove(ticket)
+        self.depth -= 1
+        if was_next:
+            # The session has had its turn; it goes to the back of the line.
+            turns.popleft()
+            if queue:
+                turns.append(ticket.session)
+        elif not queue:
+            turns.remove(ticket.session)
+        if not queue:
+            del queues[ticket.session]
+        self._cond.notify_all()
+
+    def acquire(self, tokens, priority=REVIEW, session=None):
+        """Block until a request of this many tokens may be sent and return its ticket.
+
+        Raises RateLimited if the request is shed or waits longer than
+        the limit for its priority.
+        """
+        with self._cond:
+            ticket, deadline = self._join(tokens, priority, session)
+            try:
+                while True:
+                    wait = self._poll(ticket, deadline)
+                    if wait is None:
+                        return ticket
+                    self._cond.wait(wait)
+            except BaseException:
+                if not ticket.admitted:
+                    self._remove(ticket)
+                raise
+
+    async def acquire_async(self, tokens, priority=REVIEW, session=None):
+        """Wait without blocking the event loop until a request may be sent; see acquire().
+
+        Releases from other threads cannot wake a coroutine, so it checks
+        its place in the queue every RATE_LIMIT_ASYNC_POLL seconds.
+        """
+        import asyncio
+
+        with self._cond:
+            ticket, deadline = self._join(tokens, priority, session)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._poll(ticket, deadline)
+                if wait is None:
+                    return ticket
+                await asyncio.sleep(min(wait, config.RATE_LIMIT_ASYNC_POLL))
+        except BaseException:
+            with self._cond:
+                if not ticket.admitted:
+                    self._remove(ticket)
+            raise
+
+    def _join(self, tokens, priority, session):
+        """Queue a new ticket and return it with its deadline, or shed it. Call holding self._cond."""
+        session = current_session.get() if session is None else session
+        ticket = _Ticket(priority, session, tokens)
+        if priority == TITLE and self.depth >= self.title_shed_depth:
+            self.shed[priority] += 1
+            raise RateLimited("Too many requests are waiting; title generation was skipped")
+        self._enqueue(ticket)
+        return ticket, ticket.enqueued + self.max_wait[priority]
+
+    def _poll(self, ticket, deadline):
+        """Admit ticket if it may go now and return None, else return the seconds to wait.
+
+        Call holding self._cond.
+        """
+        now = time.monotonic()
+        delay = None
+        if self._head() is ticket:
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            delay = max(self.requests.delay(1), self.tokens.delay(ticket.tokens))
+            if delay == 0:
+                self.requests.level -= 1
+                self.tokens.level -= ticket.tokens
+                ticket.admitted = True
+                self.admitted[ticket.priority] += 1
+                self._waits[ticket.priority].append(now - ticket.enqueued)
+                self._remove(ticket)
+                return None
+        remaining = deadline - now
+        if remaining <= 0:
+            self.shed[ticket.priority] += 1
+            raise RateLimited(
+                f"Waited {self.max_wait[ticket.priority]:g}s for rate limit capacity"
+            )
+        return remaining if delay is None else min(delay, remaining)
+
+    def settle(self, ticket, used_tokens):
+        """Return the part of a ticket's token reservation that was not used."""
+        unused = ticket.tokens - used_tokens
+        if unused <= 0:
+            return
+        with self._cond:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + unused)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            result = {
+                "queue_depth": self.depth,
+                "max_queue_depth": self.max_depth,
+                "requests_available": int(self.requests.level),
+                "tokens_available": int(self.tokens.level)
+            }
+            for priority, name in PRIORITY_NAMES.items():
+                waits = self._waits[priority]
+                result[name] = {
+                    "waiting": sum(len(queue) for queue in self._queues[priority].values()),
+                    "admitted": self.admitted[priority],
+                    "shed": self.shed[priority],
+                    "wait_p50_ms": _percentile(waits, 0.5) * 1000,
+                    "wait_p95_ms": _percentile(waits, 0.95) * 1000,
+                    "wait_max_ms": max(waits, default=0.0) * 1000
+                }
+            return result
+
+
+# One limiter per process so that all sessions share the provider's limits.
+rate_limiter = RateLimiter()
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import config
+
+
+def cache_key(**request):
+    """Return a content hash of a completion request.
+
+    The model, the full message list and the sampling parameters all go
+    into the key, so any change to the prompts in config produces a miss.
+    """
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier response cache: an in-memory LRU in front of a SQLite file."""
+
+    def __init__(self, path, memory_entries=256, max_bytes=50 * 1024 * 1024, ttl=7 * 24 * 60 * 60):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key):
+        """Return the cached response for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value, created FROM responses WHERE key = ? AND created > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0], row[1])
+        return row[0]
+
+    def set(self, key, value):
+        """Store a response in both tiers and evict anything over the limits."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self._evict(db, now)
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, db, now):
+        db.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self):
+        """Return hit and miss counts and the overall hit rate."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide cache, opening its database on first use."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                config.RESPONSE_CACHE_PATH,
+                memory_entries=config.RESPONSE_CACHE_MEMORY_ENTRIES,
+                max_bytes=config.RESPONSE_CACHE_MAX_BYTES,
+                ttl=config.RESPONSE_CACHE_TTL
+            )
+        return _response_cache
@@ -0,0 +1,255 @@
+"""Local store of cases, their review versions and improvement turns.
+
+Everything lives in one SQLite file in WAL mode, so the app can list a
+page of earlier cases without holding their text in memory, and nothing
+is lost on restart. Review and section text is stored once per distinct
+content, keyed by its hash, so an unchanged section or a regenerated
+identical review costs no extra space.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+from .section_parser import get_section, section_labels
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS texts ("
+    "hash TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS cases ("
+    "id INTEGER PRIMARY KEY, session TEXT NOT NULL, title TEXT, description_hash TEXT NOT NULL, "
+    "capabilities TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS cases_updated ON cases (updated, id)",
+    "CREATE INDEX IF NOT EXISTS cases_session ON cases (session, updated)",
+    "CREATE TABLE IF NOT EXISTS reviews ("
+    "id INTEGER PRIMARY KEY, case_id INTEGER NOT NULL REFERENCES cases (id), "
+    "text_hash TEXT NOT NULL, created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS reviews_case ON reviews (case_id, id)",
+    "CREATE TABLE IF NOT EXISTS sections ("
+    "review_id INTEGER NOT NULL REFERENCES reviews (id), position INTEGER NOT NULL, "
+    "kind TEXT NOT NULL, name TEXT NOT NULL, text_hash TEXT NOT NULL, "
+    "PRIMARY KEY (review_id, position))",
+    "CREATE TABLE IF NOT EXISTS turns ("
+    "id INTEGER PRIMARY KEY, case_id INTEGER NOT NULL REFERENCES cases (id), prompt TEXT NOT NULL, "
+    "before_id INTEGER REFERENCES reviews (id), after_id INTEGER NOT NULL REFERENCES reviews (id), "
+    "created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS turns_case ON turns (case_id, id)"
+)
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ReviewStore:
+    """Cases, review versions and improvement turns in a SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                db.execute(statement)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _put_text(self, db, text):
+        key = text_hash(text)
+        db.execute(
+            "INSERT OR IGNORE INTO texts (hash, content, size) VALUES (?, ?, ?)",
+            (key, text, len(text.encode("utf-8")))
+        )
+        return key
+
+    def _text(self, db, key):
+        row = db.execute("SELECT content FROM texts WHERE hash = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def create_case(self, session, case_description, selected_capabilities, title=None):
+        """Start a new case and return its id."""
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO cases (session, title, description_hash, capabilities, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session, title, self._put_text(db, case_description),
+                 json.dumps(list(selected_capabilities)), now, now)
+            )
+            return cursor.lastrowid
+
+    def set_title(self, case_id, title):
+        with self._connect() as db:
+            db.execute("UPDATE cases SET title = ? WHERE id = ?", (title, case_id))
+
+    def add_review(self, case_id, review_text, sections=None, improvement_prompt=None):
+        """Store a version of a case's review and return its id.
+
+        With improvement_prompt, the version is also recorded as an
+        improvement turn from the case's previous version.
+        """
+        now = time.time()
+        with self._connect() as db:
+            capabilities = json.loads(
+                db.execute("SELECT capabilities FROM cases WHERE id = ?", (case_id,)).fetchone()[0]
+            )
+            previous = db.execute(
+                "SELECT MAX(id) FROM reviews WHERE case_id = ?", (case_id,)
+            ).fetchone()[0]
+            review_id = db.execute(
+                "INSERT INTO reviews (case_id, text_hash, created) VALUES (?, ?, ?)",
+                (case_id, self._put_text(db, review_text), now)
+            ).lastrowid
+            if sections:
+                rows = []
+                for position, (key, _) in enumerate(section_labels(capabilities)):
+                    kind, name = key if isinstance(key, tuple) else (key, "")
+                    rows.append((review_id, position, kind, name, self._put_text(db, get_section(sections, key))))
+                db.executemany(
+                    "INSERT INTO sections (review_id, position, kind, name, text_hash) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+            if improvement_prompt is not None:
+                db.execute(
+                    "INSERT INTO turns (case_id, prompt, before_id, after_id, created) VALUES (?, ?, ?, ?, ?)",
+                    (case_id, improvement_prompt, previous, review_id, now)
+                )
+            db.execute("UPDATE cases SET updated = ? WHERE id = ?", (now, case_id))
+            return review_id
+
+    def list_cases(self, limit=None, offset=0, session=None):
+        """Return one page of cases, most recently updated first, without their text."""
+        limit = config.REVIEW_STORE_PAGE_SIZE if limit is None else limit
+        query = (
+            "SELECT id, title, capabilities, created, updated, "
+            "(SELECT COUNT(*) FROM turns WHERE turns.case_id = cases.id) FROM cases"
+        )
+        params = []
+        if session is not None:
+            query += " WHERE session = ?"
+            params.append(session)
+        query += " ORDER BY updated DESC, id DESC LIMIT ? OFFSET ?"
+        with self._connect() as db:
+            rows = db.execute(query, params + [limit, offset]).fetchall()
+        return [
+            {
+                "id": case_id,
+                "title": title,
+                "capabilities": json.loads(capabilities),
+                "created": created,
+                "updated": updated,
+                "improvements": improvements
+            }
+            for case_id, title, capabilities, created, updated, improvements in rows
+        ]
+
+    def count_cases(self, session=None):
+        with self._connect() as db:
+            if session is None:
+                return db.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+            return db.execute("SELECT COUNT(*) FROM cases WHERE session = ?", (session,)).fetchone()[0]
+
+    def load_case(self, case_id):
+        """Return a case with the text and sections of its latest review."""
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT session, title, description_hash, capabilities FROM cases WHERE id = ?", (case_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            session, title, description_hash, capabilities = row
+            review = db.execute(
+                "SELECT id, text_hash FROM reviews WHERE case_id = ? ORDER BY id DESC LIMIT 1", (case_id,)
+            ).fetchone()
+            case = {
+                "id": case_id,
+                "session": session,
+                "title": title,
+                "case_description": self._text(db, description_hash),
+                "capabilities": json.loads(capabilities),
+                "review_id": review[0] if review else None,
+                "review": self._text(db, review[1]) if review else None,
+                "sections": None
+            }
+            if review:
+                case["sections"] = self._sections(db, review[0])
+        return case
+
+    def _sections(self, db, review_id):
+        rows = db.execute(
+            "SELECT kind, name, content FROM sections JOIN texts ON texts.hash = sections.text_hash "
+            "WHERE review_id = ? ORDER BY position",
+            (review_id,)
+        ).fetchall()
+        if not rows:
+            return None
+        sections = {"brief_description": "", "capabilities": {}, "reflection": "", "learning_needs": ""}
+        for kind, name, content in rows:
+            if kind == "capability":
+                sections["capabilities"][name] = content
+            else:
+                sections[kind] = content
+        return sections
+
+    def review_text(self, review_id):
+        with self._connect() as db:
+            row = db.execute("SELECT text_hash FROM reviews WHERE id = ?", (review_id,)).fetchone()
+            return self._text(db, row[0]) if row else None
+
+    def improvements(self, case_id, limit=None, offset=0):
+        """Return one page of a case's improvement turns, newest first, without review text."""
+        limit = config.REVIEW_STORE_PAGE_SIZE if limit is None else limit
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id, prompt, before_id, after_id, created FROM turns "
+                "WHERE case_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (case_id, limit, offset)
+            ).fetchall()
+        return [
+            {"id": turn_id, "prompt": prompt, "before_id": before_id, "after_id": after_id, "created": created}
+            for turn_id, prompt, before_id, after_id, created in rows
+        ]
+
+    def stats(self):
+        """Return row counts and how much text deduplication saved."""
+        with self._connect() as db:
+            counts = {
+                table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("cases", "reviews", "sections", "turns", "texts")
+            }
+            stored = db.execute("SELECT COALESCE(SUM(size), 0) FROM texts").fetchone()[0]
+            referenced = db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM ("
+                "SELECT text_hash FROM reviews UNION ALL SELECT text_hash FROM sections "
+                "UNION ALL SELECT description_hash FROM cases) JOIN texts ON texts.hash = text_hash"
+            ).fetchone()[0]
+        counts["text_bytes"] = stored
+        counts["dedup_saved_bytes"] = referenced - stored
+        return counts
+
+
+_review_store = None
+_review_store_lock = threading.Lock()
+
+
+def get_review_store():
+    """Return the process-wide review store, opening its database on first use."""
+    global _review_store
+    with _review_store_lock:
+        if _review_store is None:
+            _review_store = ReviewStore(config.REVIEW_STORE_PATH)
+        return _review_store
@@ -0,0 +1,374 @@
+"""Route each kind of LLM call across providers, with failover and hedging.
+
+Each call type ("review", "title", "improve") has an ordered list of
+(provider, model) routes in config.LLM_ROUTES. The first healthy route is
+tried first. If it fails before producing any text, the next route takes
+over. If it is slower than usual to produce its first text, the next route
+is started alongside it as a hedge. Routes without enough samples to say
+what usual is are never hedged. Whichever speaks first wins, and the
+other is abandoned. Streamed text is always passed on from the calling
+thread, so callers such as Streamlit can draw it directly.
+"""
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+
+import config
+
+
+class _Abandoned(Exception):
+    """Raised inside an attempt that lost the race, to stop its stream."""
+
+
+class RouteStats:
+    """Latency and error rate of one route over a rolling time window."""
+
+    def __init__(self, window=None):
+        self.window = config.ROUTER_WINDOW if window is None else window
+        self._lock = threading.Lock()
+        # (time recorded, seconds to first text, or None for a failure)
+        self._samples = deque()
+
+    def _trim(self, now):
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+    def record(self, latency=None):
+        """Record a latency, or a failure when latency is None."""
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, latency))
+            self._trim(now)
+
+    def snapshot(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            latencies = sorted(latency for _, latency in self._samples if latency is not None)
+            calls = len(self._samples)
+        errors = calls - len(latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)]
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "error_rate": errors / calls if calls else 0.0,
+            "p50_s": percentile(0.5),
+            "p95_s": percentile(0.95)
+        }
+
+    def healthy(self):
+        snapshot = self.snapshot()
+        return (
+            snapshot["calls"] < config.ROUTER_MIN_SAMPLES
+            or snapshot["error_rate"] < config.ROUTER_ERROR_THRESHOLD
+        )
+
+    def hedge_delay(self, streamed):
+        """Seconds to wait for first text before starting a hedge, or None to never start one.
+
+        A streamed call is timed to its first text, which says how slow the
+        provider is. A call that is not streamed is timed to its whole
+        reply, which also grows with the reply, so it gets a much longer floor.
+        """
+        snapshot = self.snapshot()
+        if snapshot["calls"] - snapshot["errors"] < config.ROUTER_MIN_SAMPLES:
+            return None
+        return max(snapshot["p95_s"], config.ROUTER_HEDGE_MIN if streamed else config.ROUTER_HEDGE_BLOCKING_MIN)
+
+
+class _Attempt:
+    __slots__ = ("route", "hedge", "started", "spoke", "abandoned", "task")
+
+    def __init__(self, route, hedge=False):
+        self.route = route
+        self.hedge = hedge
+        self.started = time.monotonic()
+        self.spoke = False
+        self.abandoned = False
+        self.task = None
+
+
+class Router:
+    """Send each call to the best available provider for its call type."""
+
+    def __init__(self, provider_clients, routes=None):
+        # Failing over beats retrying a struggling provider, so each client
+        # gets fewer retries of its own here.
+        self.clients = {
+            provider: client.with_options(max_retries=config.ROUTER_MAX_RETRIES)
+            for provider, client in provider_clients.items()
+        }
+        self.routes = config.LLM_ROUTES if routes is None else routes
+        self._async_clients = None
+        self._lock = threading.Lock()
+        self._stats = {}
+        # Imported here because concurrent.futures is slow to import and
+        # most importers of caseforge never build a router.
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.ROUTER_MAX_WORKERS, thread_name_prefix="route"
+        )
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def route_stats(self, call_type, route, streamed):
+        # First text arrives far sooner when streaming, so the two are
+        # tracked separately.
+        key = (call_type, route, streamed)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = RouteStats()
+            return self._stats[key]
+
+    def candidates(self, call_type, streamed=False):
+        """Return the routes to try for call_type, failing routes last."""
+        routes = [tuple(route) for route in self.routes[call_type] if route[0] in self.clients]
+        if not routes:
+            raise Exception(f"No provider is configured for {call_type} calls")
+        return sorted(routes, key=lambda route: not self.route_stats(call_type, route, streamed).healthy())
+
+    def complete(self, call_type, send, stream_to=None):
+        """Run send(client, model, on_text) on the routes for call_type and return its result.
+
+        on_text is None unless stream_to is given. Text from the winning
+        attempt is passed to stream_to in order.
+        """
+        streamed = stream_to is not None
+        routes = self.candidates(call_type, streamed)
+        events = queue.Queue()
+        running = []
+        errors = []
+        winner = None
+
+        def start(hedge=False):
+            attempt = _Attempt(routes.pop(0), hedge)
+            running.append(attempt)
+            context = contextvars.copy_context()
+            self._executor.submit(context.run, self._attempt, attempt, call_type, send, streamed, events)
+            delay = self.route_stats(call_type, attempt.route, streamed).hedge_delay(streamed)
+            return None if delay is None else time.monotonic() + delay
+
+        hedge_at = start()
+        while True:
+            timeout = None
+            if winner is None and routes and config.ROUTER_HEDGING and hedge_at is not None:
+                timeout = max(hedge_at - time.monotonic(), 0)
+            try:
+                kind, attempt, value = events.get(timeout=timeout)
+            except queue.Empty:
+                # Nothing yet from the running attempts; race the next route.
+                with self._lock:
+                    self.hedges += 1
+                hedge_at = start(hedge=True)
+                continue
+
+            if kind == "text":
+                if winner is None:
+                    winner = self._claim(attempt, running, call_type, streamed)
+                if attempt is winner:
+                    stream_to(value)
+                continue
+
+            if kind == "done" and winner in (None, attempt):
+                if winner is None:
+                    self._claim(attempt, running, call_type, streamed)
+                return value
+            running.remove(attempt)
+            if kind == "error" and winner is attempt:
+                # Text has already been passed on, so another route cannot
+                # take over without repeating it.
+                raise value
+            if kind == "error" and winner is None:
+                errors.append(value)
+                if not running:
+                    if not routes:
+                        raise errors[-1]
+                    with self._lock:
+                        self.failovers += 1
+                    hedge_at = start()
+
+    @property
+    def async_clients(self):
+        """The async twin of each provider client, built on first use."""
+        if self._async_clients is None:
+            from .clients import async_client
+
+            self._async_clients = {provider: async_client(client) for provider, client in self.clients.items()}
+        return self._async_clients
+
+    async def complete_async(self, call_type, send, stream_to=None):
+        """Like complete(), with send a coroutine function given the async clients.
+
+        Attempts run as tasks on the current event loop, and attempts that
+        lose the race are cancelled rather than left to run out.
+        """
+        import asyncio
+
+        streamed = stream_to is not None
+        routes = self.candidates(call_type, streamed)
+        events = asyncio.Queue()
+        running = []
+        errors = []
+        winner = None
+
+        def start(hedge=False):
+            attempt = _Attempt(routes.pop(0), hedge)
+            running.append(attempt)
+            attempt.task = asyncio.ensure_future(self._attempt_async(attempt, call_type, send, streamed, events))
+            delay = self.route_stats(call_type, attempt.route, streamed).hedge_delay(streamed)
+            return None if delay is None else time.monotonic() + delay
+
+        hedge_at = start()
+        try:
+            while True:
+                timeout = None
+                if winner is None and routes and config.ROUTER_HEDGING and hedge_at is not None:
+                    timeout = max(hedge_at - time.monotonic(), 0)
+                try:
+                    kind, attempt, value = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self.hedges += 1
+                    hedge_at = start(hedge=True)
+                    continue
+
+                if kind == "text":
+                    if winner is None:
+                        winner = self._claim(attempt, running, call_type, streamed)
+                        for loser in running:
+                            if loser is not winner:
+                                loser.task.cancel()
+                    if attempt is winner:
+                        stream_to(value)
+                    continue
+
+                if kind == "done" and winner in (None, attempt):
+                    if winner is None:
+                        self._claim(attempt, running, call_type, streamed)
+                    return value
+                running.remove(attempt)
+                if kind == "error" and winner is attempt:
+                    raise value
+                if kind == "error" and winner is None:
+                    errors.append(value)
+                    if not running:
+                        if not routes:
+                            raise errors[-1]
+                        with self._lock:
+                            self.failovers += 1
+                        hedge_at = start()
+        finally:
+            for attempt in running:
+                attempt.task.cancel()
+
+    async def _attempt_async(self, attempt, call_type, send, streamed, events):
+        provider, model = attempt.route
+        stats = self.route_stats(call_type, attempt.route, streamed)
+
+        def on_text(text):
+            if attempt.abandoned:
+                raise _Abandoned()
+            if not attempt.spoke:
+                attempt.spoke = True
+                stats.record(time.monotonic() - attempt.started)
+            events.put_nowait(("text", attempt, text))
+
+        try:
+            content = await send(self.async_clients[provider], model, on_text if streamed else None)
+        except _Abandoned:
+            return
+        except Exception as e:
+            if not attempt.abandoned:
+                stats.record(None)
+            events.put_nowait(("error", attempt, e))
+            return
+        if not streamed and not attempt.abandoned:
+            stats.record(time.monotonic() - attempt.started)
+        events.put_nowait(("done", attempt, content))
+
+    def _claim(self, winner, running, call_type, streamed):
+        """Make winner the result and abandon every other running attempt."""
+        now = time.monotonic()
+        for attempt in running:
+            if attempt is winner:
+                continue
+            attempt.abandoned = True
+            if not attempt.spoke:
+                # It has taken at least this long, which the stats should know.
+                self.route_stats(call_type, attempt.route, streamed).record(now - attempt.started)
+        if winner.hedge:
+            with self._lock:
+                self.hedge_wins += 1
+        return winner
+
+    def _attempt(self, attempt, call_type, send, streamed, events):
+        provider, model = attempt.route
+        stats = self.route_stats(call_type, attempt.route, streamed)
+
+        def on_text(text):
+            if attempt.abandoned:
+                raise _Abandoned()
+            if not attempt.spoke:
+                attempt.spoke = True
+                stats.record(time.monotonic() - attempt.started)
+            events.put(("text", attempt, text))
+
+        try:
+            content = send(self.clients[provider], model, on_text if streamed else None)
+        except _Abandoned:
+            events.put(("abandoned", attempt, None))
+            return
+        except Exception as e:
+            if not attempt.abandoned:
+                stats.record(None)
+            events.put(("error", attempt, e))
+            return
+        if not streamed and not attempt.abandoned:
+            stats.record(time.monotonic() - attempt.started)
+        events.put(("done", attempt, content))
+
+    def snapshot(self):
+        """Return rolling stats for every route plus hedge and failover counts."""
+        with self._lock:
+            stats = dict(self._stats)
+            result = {"hedges": self.hedges, "hedge_wins": self.hedge_wins, "failovers": self.failovers}
+        for (call_type, (provider, model), streamed), route_stats in sorted(stats.items()):
+            name = f"{call_type} {provider}/{model}" + (" stream" if streamed else "")
+            result[name] = route_stats.snapshot()
+        return result
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(openai_api_key=None, anthropic_api_key=None):
+    """Return the process-wide router over the providers that have an API key.
+
+    Sharing one router lets every session learn from the same latency and
+    error statistics.
+    """
+    from . import clients
+
+    key = (openai_api_key, anthropic_api_key, config.OPENAI_BASE_URL, config.ANTHROPIC_BASE_URL)
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            provider_clients = {}
+            if openai_api_key:
+                provider_clients["openai"] = clients.get_openai_client(openai_api_key)
+            if anthropic_api_key:
+                provider_clients["anthropic"] = clients.get_anthropic_client(anthropic_api_key)
+            if not provider_clients:
+                raise Exception("No API key is configured for any provider")
+            router = Router(provider_clients)
+            _routers[key] = router
+        return router
@@ -0,0 +1,44 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RequestScheduler:
+    """Run independent LLM calls concurrently on a shared thread pool.
+
+    Calls are submitted under a key describing the request. While a call
+    is in flight, submitting the same key again returns the existing
+    future instead of starting a second identical request.
+    """
+
+    def __init__(self, max_workers=8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.submitted = 0
+        self.deduplicated = 0
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs) unless an identical call is already running."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+            # Run in a copy of the caller's context so that values such as
+            # the current session follow the call into the worker thread.
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, fn, *args, **kwargs)
+            self._in_flight[key] = future
+            self.submitted += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+
+# One scheduler per process so that all sessions share the same pool.
+scheduler = RequestScheduler()
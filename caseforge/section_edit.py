@@ -0,0 +1,103 @@
+"""Improve single sections of a review instead of rewriting all of it.
+
+Most improvement requests are about one part of the review ("make the
+reflection shorter", "add more to the learning needs"). Sending just that
+section, with the brief description for context, keeps both the prompt
+and the reply in proportion to the section being changed.
+"""
+import re
+
+import config
+
+from .catalog import JUSTIFICATION_PROMPT
+from .conversation import count_tokens
+from .section_parser import get_section, section_labels
+from .titles import STOPWORDS, tokenize
+
+
+SECTION_SYSTEM_PROMPT = (
+    "You are a medical assistant revising one section of a GP trainee's portfolio case review. "
+    "Apply the requested change to the section and reply with the revised section text only, "
+    "without its heading. Keep the first person voice and UK medical spelling."
+)
+
+# Requests that change facts or the review as a whole go to the full rewrite
+WHOLE_REVIEW = re.compile(r"\b(whole|entire|everything|all sections|throughout|overall)\b", re.IGNORECASE)
+
+# Full section names only, so "description" or "reflect" alone picks nothing
+SECTION_PATTERNS = (
+    ("brief_description", re.compile(r"\b(brief description|case summary|case details)\b", re.IGNORECASE)),
+    ("reflection", re.compile(r"\breflections?\b", re.IGNORECASE)),
+    ("learning_needs", re.compile(r"\blearning needs?\b|\blearning points?\b", re.IGNORECASE))
+)
+
+ALL_CAPABILITIES = re.compile(r"\b(capabilities|justifications)\b", re.IGNORECASE)
+
+# A request is read a clause at a time
+CLAUSE = re.compile(r"[.,;:!?\n]+|\b(?:and|also|then|plus|but)\b", re.IGNORECASE)
+
+# Words that say how to change a section rather than what to change
+STYLE_WORDS = frozenset("""
+please shorten shorter longer lengthen expand concise briefer brief succinct detailed detail details
+clearer clear clarify simpler simplify formal professional readable tidy tighten improve improved
+rewrite reword rephrase polish better flow flowing wording words sentences sentence paragraph tone
+less much bit little slightly lot keep reduce cut trim fewer bullet points focused structured
+""".split()) | STOPWORDS
+
+
+def _section_mentions(clause, selected_capabilities):
+    mentioned = {key for key, pattern in SECTION_PATTERNS if pattern.search(clause)}
+    lowered = clause.lower()
+    every_capability = bool(ALL_CAPABILITIES.search(clause))
+    for cap_name in selected_capabilities:
+        if every_capability or cap_name.lower() in lowered:
+            mentioned.add(("capability", cap_name))
+    return mentioned
+
+
+def detect_target_sections(improvement_prompt, selected_capabilities):
+    """Return the section keys an improvement request is about, in review order.
+
+    Every clause of the request must name a section or only say how to
+    change one ("and more concise"). Returns None when no section is
+    named, the request is about the whole review, or a clause asks for
+    something outside the named sections ("and change the age to 25"),
+    so the caller rewrites everything and nothing asked for is dropped.
+    """
+    if WHOLE_REVIEW.search(improvement_prompt):
+        return None
+    targets = set()
+    for clause in CLAUSE.split(improvement_prompt):
+        mentioned = _section_mentions(clause, selected_capabilities)
+        if mentioned:
+            targets |= mentioned
+        elif any(word not in STYLE_WORDS for word in tokenize(clause)):
+            return None
+    if not targets:
+        return None
+    return [key for key, _ in section_labels(selected_capabilities) if key in targets]
+
+
+def build_section_messages(sections, key, improvement_prompt):
+    """Build the message list to improve one section."""
+    if isinstance(key, tuple):
+        label = f"Capability: {key[1]}\n{JUSTIFICATION_PROMPT}"
+    else:
+        label = dict(section_labels(()))[key]
+    current = get_section(sections, key)
+    context = ""
+    if key != "brief_description":
+        context = f"Brief description of the case, for context:\n{sections['brief_description']}\n\n"
+    return [
+        {"role": "system", "content": SECTION_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"{context}Section: {label}\n{current}\n\nChange requested: {improvement_prompt}"
+        }
+    ]
+
+
+def section_max_tokens(current_text):
+    """Reply budget for a section, in proportion to its current length."""
+    tokens = count_tokens(current_text or "")
+    return min(tokens * config.SECTION_EDIT_GROWTH + config.SECTION_EDIT_HEADROOM, config.OUTPUT_MAX_TOKENS)
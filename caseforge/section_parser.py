@@ -0,0 +1,188 @@
+import re
+from functools import lru_cache
+
+
+REFLECTION_HEADER = r"Reflection:(?:[ \t]*What will I maintain, improve or stop\??)?"
+LEARNING_HEADER = r"Learning needs(?: identified from this event)?[ \t]*:?"
+JUSTIFICATION = r"(?:[^\n]*?Justification[^\n]*?:|[ \t]*\n[ \t]*Justification[^\n]*?:)"
+
+
+@lru_cache(maxsize=None)
+def capability_header(cap_name):
+    """Return the header pattern source for one capability."""
+    name = re.escape(cap_name)
+    return (
+        # "Capability: <name>", optionally followed by its Justification prompt
+        rf"Capability:[ \t]*{name}(?:{JUSTIFICATION}|[ \t]*:)?"
+        # "<name>:", "<name> Justification ...:" or "<name>" alone on its line
+        rf"|{name}(?:{JUSTIFICATION}|[ \t]*:|[ \t]*(?=\n|$))"
+    )
+
+
+@lru_cache(maxsize=128)
+def header_patterns(selected_capabilities):
+    """Compile the section header patterns for a capability set.
+
+    selected_capabilities must be a tuple so the compiled patterns are
+    cached and shared between calls. Returns (lines, first, inline):
+
+    lines matches a header at the start of any line after the first. It
+    begins with a literal newline, so the regex engine jumps from line
+    break to line break instead of trying every character.
+    first matches a header on the first line.
+    inline maps each section key to a pattern that finds its header
+    anywhere, used only for sections missing from the line scan.
+    """
+    headers = [
+        ("brief_description", "brief_description", r"Brief Description:"),
+        ("reflection", "reflection", REFLECTION_HEADER),
+        ("learning_needs", "learning_needs", LEARNING_HEADER)
+    ]
+    for index, cap_name in enumerate(selected_capabilities):
+        headers.append((f"cap{index}", ("capability", cap_name), capability_header(cap_name)))
+
+    body = "|".join(f"(?P<{group}>{pattern})" for group, _, pattern in headers)
+    lines = re.compile(rf"\n[ \t]*(?:{body})")
+    first = re.compile(rf"[ \t]*(?:{body})")
+    inline = {key: re.compile(pattern) for _, key, pattern in headers}
+    return lines, first, inline
+
+
+def section_key(group_name, selected_capabilities):
+    """Map a regex group name back to a section key."""
+    if group_name.startswith("cap"):
+        return ("capability", selected_capabilities[int(group_name[3:])])
+    return group_name
+
+
+def find_headers(text, selected_capabilities, start=0, end=None, found=None, inline=True):
+    """Scan text once and return {section key: (header start, header end)}.
+
+    start must be the beginning of a line. Only the first occurrence of
+    each header counts. Pass an existing found dict to continue a scan
+    over a later region of the same text. With inline, any header not
+    found at a line start is looked for once more anywhere in the text.
+    """
+    selected_capabilities = tuple(selected_capabilities)
+    found = {} if found is None else found
+    lines, first, inline_patterns = header_patterns(selected_capabilities)
+    end = len(text) if end is None else end
+
+    matches = []
+    if start == 0:
+        match = first.match(text, 0, end)
+        if match:
+            matches.append(match)
+    # Start on the newline that ends the previous line so a header on the
+    # first line of the region is found.
+    matches.extend(lines.finditer(text, max(start - 1, 0), end))
+
+    for match in matches:
+        key = section_key(match.lastgroup, selected_capabilities)
+        if key not in found:
+            found[key] = match.span(match.lastgroup)
+
+    if inline:
+        for key, pattern in inline_patterns.items():
+            if key not in found:
+                match = pattern.search(text, start, end)
+                if match:
+                    found[key] = match.span()
+    return found
+
+
+def _strip_span(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def section_spans(text, selected_capabilities, headers=None):
+    """Return the (start, end) span of each section's content in text.
+
+    A section runs from the end of its header to the start of the next
+    header, with surrounding whitespace excluded. Sections whose header
+    was not found are absent from the result.
+    """
+    if headers is None:
+        headers = find_headers(text, selected_capabilities)
+    ordered = sorted(headers.items(), key=lambda item: item[1][0])
+    spans = {}
+    for index, (key, (_, content_start)) in enumerate(ordered):
+        content_end = ordered[index + 1][1][0] if index + 1 < len(ordered) else len(text)
+        spans[key] = _strip_span(text, content_start, content_end)
+    return spans
+
+
+def parse_sections(text, selected_capabilities):
+    """Split a review into the section dict used by the app.
+
+    Returns the sections and a list of capabilities with no content.
+    """
+    spans = section_spans(text, selected_capabilities)
+    sections = {
+        "brief_description": "",
+        "capabilities": {},
+        "reflection": "",
+        "learning_needs": ""
+    }
+    missing = []
+    for key in ("brief_description", "reflection", "learning_needs"):
+        if key in spans:
+            sections[key] = text[slice(*spans[key])]
+    for cap_name in selected_capabilities:
+        span = spans.get(("capability", cap_name))
+        content = text[slice(*span)] if span else ""
+        sections["capabilities"][cap_name] = content
+        if not content:
+            missing.append(cap_name)
+    return sections, missing
+
+
+def section_labels(selected_capabilities):
+    """Return (section key, heading) pairs in review order."""
+    labels = [("brief_description", "Brief Description")]
+    labels.extend((("capability", cap_name), cap_name) for cap_name in selected_capabilities)
+    labels.append(("reflection", "Reflection: What will I maintain, improve or stop?"))
+    labels.append(("learning_needs", "Learning needs identified from this event"))
+    return labels
+
+
+def get_section(sections, key):
+    if isinstance(key, tuple):
+        return sections["capabilities"].get(key[1], "")
+    return sections[key]
+
+
+def set_section(sections, key, content):
+    if isinstance(key, tuple):
+        sections["capabilities"][key[1]] = content
+    else:
+        sections[key] = content
+
+
+def section_reply(text, key, selected_capabilities):
+    """Return the content of section key from a reply asked to revise only that section.
+
+    Models sometimes repeat the heading, or the whole review; then only
+    the requested section is kept. Other replies are taken as they are.
+    """
+    spans = section_spans(text, selected_capabilities, find_headers(text, selected_capabilities, inline=False))
+    if key in spans:
+        return text[slice(*spans[key])]
+    return text.strip()
+
+
+def section_heading(label):
+    """Return the header line parse_sections recognises for a section label."""
+    return label if label.endswith(("?", ":")) else f"{label}:"
+
+
+def format_sections(sections, selected_capabilities):
+    """Join a sections dict back into review text that parse_sections reads."""
+    return "\n\n".join(
+        f"{section_heading(label)}\n{get_section(sections, key)}"
+        for key, label in section_labels(selected_capabilities)
+    )
@@ -0,0 +1,396 @@
+"""Session state kept outside the app process, so any app node can serve any session.
+
+Streamlit keeps st.session_state in the memory of the process serving the
+page, so a restart, or a load balancer sending a refreshed page to
+another node, loses the user's review. SessionSync copies the fields that
+matter to a session store at the end of each script run, and reads them
+back when a page opens with the session's id in its URL.
+
+Each field is stored as its own entry, as compact JSON that is compressed
+when large. A run writes only the fields whose JSON changed since the
+last write, so a rerun that changes nothing writes nothing. The stores
+are process memory (the default, for a single node), a SQLite file
+(processes on one host) and any server speaking the Redis protocol
+(nodes behind a load balancer).
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from urllib.parse import unquote, urlsplit
+
+import config
+
+
+# Seconds between sweeps for expired sessions in the memory and SQLite stores
+PRUNE_INTERVAL = 60.0
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, updated REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)",
+    "CREATE TABLE IF NOT EXISTS session_fields ("
+    "session TEXT NOT NULL, name TEXT NOT NULL, value BLOB NOT NULL, PRIMARY KEY (session, name))"
+)
+
+
+def dump(value):
+    """Return value as compact JSON bytes."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def pack(data):
+    """Return the stored form of JSON bytes: tagged, and compressed when that pays."""
+    if len(data) >= config.SESSION_COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data)
+        if len(packed) < len(data):
+            return b"z" + packed
+    return b"j" + data
+
+
+def unpack(stored):
+    """Return the value of a stored field."""
+    data = stored[1:]
+    if stored[:1] == b"z":
+        data = zlib.decompress(data)
+    return json.loads(data)
+
+
+class SessionStore:
+    """Fields of each session by session id, with counts of what was read and written.
+
+    Subclasses implement _load(session_id), returning {field: stored bytes},
+    and _write(session_id, changed, removed).
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = config.SESSION_TTL if ttl is None else ttl
+        self._stats_lock = threading.Lock()
+        self.loads = 0
+        self.writes = 0
+        self.fields_written = 0
+        self.bytes_written = 0
+
+    def load(self, session_id):
+        """Return {field: stored bytes} for session_id, empty if unknown or expired."""
+        fields = self._load(session_id)
+        with self._stats_lock:
+            self.loads += 1
+        return fields
+
+    def write(self, session_id, changed, removed=()):
+        """Store the fields in changed, drop the fields named in removed, and renew the session."""
+        self._write(session_id, changed, list(removed))
+        with self._stats_lock:
+            self.writes += 1
+            self.fields_written += len(changed)
+            self.bytes_written += sum(len(value) for value in changed.values())
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "store": type(self).__name__,
+                "loads": self.loads,
+                "writes": self.writes,
+                "fields_written": self.fields_written,
+                "bytes_per_write": self.bytes_written / self.writes if self.writes else 0.0
+            }
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions in this process's memory; they survive a refresh but not a restart."""
+
+    def __init__(self, ttl=None):
+        super().__init__(ttl)
+        self._lock = threading.Lock()
+        # session id -> (last write time, {field: stored bytes})
+        self._sessions = {}
+        self._pruned = time.time()
+
+    def _load(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0] < time.time() - self.ttl:
+                return {}
+            return dict(entry[1])
+
+    def _write(self, session_id, changed, removed):
+        now = time.time()
+        with self._lock:
+            if now - self._pruned > PRUNE_INTERVAL:
+                self._pruned = now
+                cutoff = now - self.ttl
+                for expired in [key for key, (updated, _) in self._sessions.items() if updated < cutoff]:
+                    del self._sessions[expired]
+            _, fields = self._sessions.get(session_id, (now, {}))
+            fields.update(changed)
+            for name in removed:
+                fields.pop(name, None)
+            self._sessions[session_id] = (now, fields)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file in WAL mode, shared by the app processes on one host."""
+
+    def __init__(self, path, ttl=None):
+        super().__init__(ttl)
+        self.path = path
+        self._pruned = 0.0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                db.execute(statement)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _load(self, session_id):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT name, value FROM session_fields JOIN sessions ON session = id "
+                "WHERE id = ? AND updated >= ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchall()
+        return {name: bytes(value) for name, value in rows}
+
+    def _write(self, session_id, changed, removed):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO sessions (id, updated) VALUES (?, ?)", (session_id, now))
+            db.executemany(
+                "INSERT OR REPLACE INTO session_fields (session, name, value) VALUES (?, ?, ?)",
+                [(session_id, name, value) for name, value in changed.items()]
+            )
+            db.executemany(
+                "DELETE FROM session_fields WHERE session = ? AND name = ?",
+                [(session_id, name) for name in removed]
+            )
+            if now - self._pruned > PRUNE_INTERVAL:
+                self._pruned = now
+                cutoff = now - self.ttl
+                db.execute(
+                    "DELETE FROM session_fields WHERE session IN (SELECT id FROM sessions WHERE updated < ?)",
+                    (cutoff,)
+                )
+                db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+
+
+class RedisError(Exception):
+    """An error reply from a Redis protocol server."""
+
+
+def _encode_command(args):
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        elif isinstance(arg, int):
+            arg = b"%d" % arg
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class RedisConnection:
+    """One connection to a server speaking the Redis protocol (RESP2), shared under a lock.
+
+    Only what the session store needs is here: sending a few commands
+    together and reading their replies. url is redis://[:password@]host:port/db.
+    """
+
+    def __init__(self, url, timeout=5.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+
+    def pipeline(self, *commands):
+        """Send commands in one write and return their replies in order.
+
+        A dropped connection is reopened and the commands sent once more,
+        which is safe because the session store only sends idempotent ones.
+        """
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(commands)
+                except OSError:
+                    self._close()
+                    if attempt:
+                        raise
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        try:
+            if setup:
+                self._send(setup)
+        except BaseException:
+            # Never leave a connection behind that is not logged in or on the right db
+            self._close()
+            raise
+
+    def _send(self, commands):
+        self._sock.sendall(b"".join(_encode_command(command) for command in commands))
+        replies = [self._reply() for _ in commands]
+        # Every reply is read before raising, so the connection stays in step
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _reply(self):
+        line = self._file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionResetError("The session store closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            return RedisError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionResetError("The session store closed the connection")
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply from the session store: {line[:40]!r}")
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions as Redis hashes, one field per session field, expiring after ttl."""
+
+    def __init__(self, url, ttl=None, prefix="caseforge:session:"):
+        super().__init__(ttl)
+        self.connection = RedisConnection(url)
+        self.prefix = prefix
+
+    def _load(self, session_id):
+        reply = self.connection.pipeline(("HGETALL", self.prefix + session_id))[0]
+        return {reply[i].decode("utf-8"): reply[i + 1] for i in range(0, len(reply), 2)}
+
+    def _write(self, session_id, changed, removed):
+        key = self.prefix + session_id
+        commands = []
+        if changed:
+            commands.append(("HSET", key) + tuple(item for pair in changed.items() for item in pair))
+        if removed:
+            commands.append(("HDEL", key) + tuple(removed))
+        commands.append(("EXPIRE", key, int(self.ttl)))
+        self.connection.pipeline(*commands)
+
+
+class SessionSync:
+    """Copy chosen session state fields to a store, writing only those that changed.
+
+    codecs maps a field name to (to JSON-ready value, from JSON value) for
+    fields that hold objects rather than plain values.
+    """
+
+    def __init__(self, store, session_id, fields, codecs=None):
+        self.store = store
+        self.session_id = session_id
+        self.fields = tuple(fields)
+        self.codecs = codecs or {}
+        # Digest of the JSON last written or read for each field
+        self._written = {}
+
+    def restore(self, state):
+        """Set the stored fields of this session in state; return whether there were any."""
+        stored = self.store.load(self.session_id)
+        for name, value in stored.items():
+            if name not in self.fields:
+                continue
+            value = unpack(value)
+            self._written[name] = self._digest(dump(value))
+            codec = self.codecs.get(name)
+            state[name] = codec[1](value) if codec else value
+        return bool(stored)
+
+    def save(self, state):
+        """Write the fields that changed since the last save or restore; return how many."""
+        changed = {}
+        digests = {}
+        removed = []
+        for name in self.fields:
+            if name not in state:
+                if name in self._written:
+                    removed.append(name)
+                continue
+            codec = self.codecs.get(name)
+            data = dump(codec[0](state[name]) if codec else state[name])
+            digest = self._digest(data)
+            if self._written.get(name) != digest:
+                changed[name] = pack(data)
+                digests[name] = digest
+        if not changed and not removed:
+            return 0
+        self.store.write(self.session_id, changed, removed)
+        self._written.update(digests)
+        for name in removed:
+            del self._written[name]
+        return len(changed) + len(removed)
+
+    @staticmethod
+    def _digest(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Return the process-wide session store named by config.SESSION_STORE."""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            if config.SESSION_STORE == "sqlite":
+                _session_store = SQLiteSessionStore(config.SESSION_STORE_PATH)
+            elif config.SESSION_STORE == "redis":
+                _session_store = RedisSessionStore(config.SESSION_REDIS_URL)
+            elif config.SESSION_STORE == "memory":
+                _session_store = MemorySessionStore()
+            else:
+                raise ValueError(f"Unknown SESSION_STORE {config.SESSION_STORE!r}")
+        return _session_store
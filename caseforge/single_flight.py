@@ -0,0 +1,256 @@
+"""Share one upstream call between identical requests made at the same time.
+
+When a cohort of trainees submits the same template case together, every
+session would otherwise send the same prompt. The first request for a
+key becomes the leader and makes the call. Requests for the same key that
+arrive while it runs become followers. They wait for the leader's result,
+and while it streams they are passed each piece of text on their own
+thread, from the start. Errors from the call are raised in every follower
+too. A leader that is stopped or cancelled has not failed, though: an
+async call carries on for the followers still waiting, and followers of
+a blocking call make the call again themselves.
+"""
+import threading
+
+from .telemetry import telemetry
+
+
+class SharedStream:
+    """Text streamed by one producer and read by any number of consumers."""
+
+    def __init__(self):
+        self.result = None
+        self.error = None
+        # Callers waiting on this stream besides its producer
+        self.followers = 0
+        self._finished = False
+        self._parts = []
+        self._length = 0
+        self._changed = threading.Condition()
+        # (event loop, future) of each coroutine waiting in wait_async()
+        self._waiters = []
+
+    @property
+    def done(self):
+        return self._finished
+
+    def append(self, text):
+        """Add streamed text; used as the producer's stream_to."""
+        with self._changed:
+            self._parts.append(text)
+            self._length += len(text)
+            self._changed.notify_all()
+            self._wake()
+
+    def _joined(self):
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def text(self):
+        with self._changed:
+            return self._joined()
+
+    def wait(self, offset=0, timeout=None):
+        """Wait until there is text past offset or the stream ends; return (new text, done)."""
+        with self._changed:
+            if self._length <= offset and not self._finished:
+                self._changed.wait(timeout)
+            text = self._joined()[offset:] if self._length > offset else ""
+            return text, self._finished
+
+    def finish(self, result=None, error=None):
+        with self._changed:
+            self.result = result
+            self.error = error
+            self._finished = True
+            self._changed.notify_all()
+            self._wake()
+
+    async def wait_async(self, offset=0):
+        """Like wait(), for a coroutine; the event loop carries on while it waits."""
+        import asyncio
+
+        with self._changed:
+            woken = None
+            if self._length <= offset and not self._finished:
+                loop = asyncio.get_running_loop()
+                woken = loop.create_future()
+                self._waiters.append((loop, woken))
+        if woken is not None:
+            await woken
+        with self._changed:
+            text = self._joined()[offset:] if self._length > offset else ""
+            return text, self._finished
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for loop, woken in waiters:
+            loop.call_soon_threadsafe(_set_done, woken)
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """In-flight calls by request key, with counts of how many were shared."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.leaders = {}
+        self.followers = {}
+
+    def do(self, key, fn, stream_to=None, call_type="review"):
+        """Return fn(on_text), sharing one call among concurrent callers with the same key.
+
+        on_text is None unless stream_to is given, in which case the caller
+        gets every text delta of the shared call, in order. If the leader
+        is stopped before the call ends, a follower makes the call again,
+        and one that already passed on text gets the new call's from the start.
+        """
+        while True:
+            flight, leader = self._join(key, call_type)
+            if leader:
+                return self._lead(key, flight, fn, self._tee(flight, stream_to) if stream_to is not None else None)
+            try:
+                offset = 0
+                done = False
+                while not done:
+                    text, done = flight.wait(offset)
+                    if text and stream_to is not None:
+                        stream_to(text)
+                    offset += len(text)
+            finally:
+                self._unfollow(flight)
+            if not self._stopped(flight):
+                return self._follow_result(flight, offset, stream_to)
+
+    async def do_async(self, key, fn, stream_to=None, call_type="review"):
+        """Like do(), for a coroutine function fn. Async and blocking callers share calls alike.
+
+        The call runs as a task of its own, so when the leader is cancelled
+        the call carries on for the followers still waiting, and is only
+        cancelled when there are none.
+        """
+        import asyncio
+
+        while True:
+            flight, leader = self._join(key, call_type)
+            if leader:
+                listening = [stream_to]
+
+                def on_text(text):
+                    flight.append(text)
+                    if listening[0] is not None:
+                        listening[0](text)
+
+                call = asyncio.ensure_future(
+                    self._lead_async(key, flight, fn, on_text if stream_to is not None else None)
+                )
+                try:
+                    return await asyncio.shield(call)
+                except asyncio.CancelledError:
+                    listening[0] = None
+                    if not flight.followers:
+                        call.cancel()
+                    # Nobody awaits the call now, so its outcome is collected here
+                    call.add_done_callback(lambda call: call.cancelled() or call.exception())
+                    raise
+            try:
+                offset = 0
+                done = False
+                while not done:
+                    text, done = await flight.wait_async(offset)
+                    if text and stream_to is not None:
+                        stream_to(text)
+                    offset += len(text)
+            finally:
+                self._unfollow(flight)
+            if not self._stopped(flight):
+                return self._follow_result(flight, offset, stream_to)
+
+    def _lead(self, key, flight, fn, on_text):
+        try:
+            result = fn(on_text)
+        except BaseException as e:
+            self._end(key, flight, error=e)
+            raise
+        self._end(key, flight, result=result)
+        return result
+
+    async def _lead_async(self, key, flight, fn, on_text):
+        try:
+            result = await fn(on_text)
+        except BaseException as e:
+            self._end(key, flight, error=e)
+            raise
+        self._end(key, flight, result=result)
+        return result
+
+    def _join(self, key, call_type):
+        """Return the flight for key and whether the caller leads it."""
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = SharedStream()
+            else:
+                flight.followers += 1
+            counts = self.leaders if leader else self.followers
+            counts[call_type] = counts.get(call_type, 0) + 1
+        telemetry.count("caseforge_single_flight_total", call_type=call_type, role="leader" if leader else "follower")
+        return flight, leader
+
+    def _end(self, key, flight, result=None, error=None):
+        # The key is freed first, so followers that make the call again start a new flight
+        with self._lock:
+            del self._in_flight[key]
+        flight.finish(result=result, error=error)
+
+    def _unfollow(self, flight):
+        with self._lock:
+            flight.followers -= 1
+
+    @staticmethod
+    def _stopped(flight):
+        # Errors that are not Exceptions, such as a rerun's StopException or
+        # CancelledError, stopped the leader rather than failing the call
+        return flight.error is not None and not isinstance(flight.error, Exception)
+
+    @staticmethod
+    def _follow_result(flight, offset, stream_to):
+        if flight.error is not None:
+            raise flight.error
+        if offset == 0 and stream_to is not None and flight.result:
+            # The leader did not stream, so pass the result on in one piece
+            stream_to(flight.result)
+        return flight.result
+
+    @staticmethod
+    def _tee(flight, stream_to):
+        def on_text(text):
+            flight.append(text)
+            stream_to(text)
+        return on_text
+
+    def stats(self):
+        """Return leader and follower counts and the share of calls coalesced, by call type."""
+        with self._lock:
+            call_types = sorted(set(self.leaders) | set(self.followers))
+            result = {"in_flight": len(self._in_flight)}
+            for call_type in call_types:
+                leaders = self.leaders.get(call_type, 0)
+                followers = self.followers.get(call_type, 0)
+                result[call_type] = {
+                    "upstream": leaders,
+                    "coalesced": followers,
+                    "coalescing_ratio": followers / (leaders + followers)
+                }
+            return result
+
+
+# One table per process, so identical requests from every session meet
+single_flight = SingleFlight()
@@ -0,0 +1,61 @@
+from .section_parser import find_headers, parse_sections
+
+
+class StreamingSectionParser:
+    """Split a review into sections incrementally as tokens arrive.
+
+    Only the newly completed lines of the buffer are scanned for section
+    headers on each feed, so the cost of a chunk is proportional to its
+    size rather than to the length of the whole response.
+    """
+
+    def __init__(self, selected_capabilities):
+        self.selected_capabilities = tuple(selected_capabilities)
+        self.buffer = ""
+        self.headers = {}
+        self._scan_from = 0
+        self._order = []
+
+    def feed(self, chunk):
+        """Append a chunk of text and return the keys of sections that changed."""
+        if not chunk:
+            return set()
+        self.buffer += chunk
+        changed = set()
+
+        # Only scan complete lines; the last line may still be growing.
+        scan_to = self.buffer.rfind("\n") + 1
+        if scan_to > self._scan_from:
+            known = set(self.headers)
+            find_headers(
+                self.buffer, self.selected_capabilities,
+                start=self._scan_from, end=scan_to, found=self.headers, inline=False
+            )
+            self._scan_from = scan_to
+            changed = set(self.headers) - known
+            if changed:
+                self._order = sorted(self.headers, key=lambda key: self.headers[key][0])
+                for key in list(changed):
+                    index = self._order.index(key)
+                    if index > 0:
+                        changed.add(self._order[index - 1])
+
+        if self._order:
+            changed.add(self._order[-1])
+        return changed
+
+    def sections(self):
+        """Return the sections found so far in the same shape as extract_sections."""
+        return parse_sections(self.buffer, self.selected_capabilities)[0]
+
+    def section_text(self, key):
+        """Return the current text of a single section."""
+        if key not in self.headers:
+            return ""
+        index = self._order.index(key)
+        start = self.headers[key][1]
+        if index + 1 < len(self._order):
+            end = self.headers[self._order[index + 1]][0]
+        else:
+            end = len(self.buffer)
+        return self.buffer[start:end].strip()
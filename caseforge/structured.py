@@ -0,0 +1,253 @@
+"""Structured review output: a JSON object with one field per section.
+
+The model is asked for JSON matching a schema built from the selected
+capabilities, so every section arrives under a known key instead of being
+found by its heading afterwards. StructuredReviewParser reads the JSON as
+it streams, passes each section on as ordinary review text so live
+previews work unchanged, and keeps track of which fields have arrived
+complete. Only fields that are missing at the end need asking for again.
+"""
+import re
+
+import config
+
+from .catalog import JUSTIFICATION_PROMPT
+from .section_parser import get_section, section_heading, section_labels, set_section
+
+
+SCHEMA_NAME = "case_review"
+
+# The next character in a string that needs more than copying
+STRING_SPECIAL = re.compile(r'["\\]')
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class StructuredReview(str):
+    """Review text formatted from structured sections, which it carries so they need not be parsed back."""
+
+    def __new__(cls, text, sections):
+        review = super().__new__(cls, text)
+        review.sections = sections
+        return review
+
+
+def empty_sections():
+    return {"brief_description": "", "capabilities": {}, "reflection": "", "learning_needs": ""}
+
+
+def review_schema(selected_capabilities, keys=None):
+    """Return the JSON schema of a review, or of just the sections in keys."""
+    wanted = [key for key, _ in section_labels(selected_capabilities) if keys is None or key in keys]
+    text = {"type": "string"}
+    properties = {}
+    capabilities = [key[1] for key in wanted if isinstance(key, tuple)]
+    for key in wanted:
+        if not isinstance(key, tuple):
+            properties[key] = text
+        elif "capabilities" not in properties:
+            properties["capabilities"] = {
+                "type": "object",
+                "properties": {name: text for name in capabilities},
+                "required": capabilities,
+                "additionalProperties": False
+            }
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+def response_format(selected_capabilities, keys=None):
+    """Return the OpenAI response_format asking for a review as JSON."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": SCHEMA_NAME,
+            "strict": True,
+            "schema": review_schema(selected_capabilities, keys)
+        }
+    }
+
+
+def anthropic_tool(response_format):
+    """Express an OpenAI JSON schema response_format as a forced Anthropic tool call."""
+    schema = response_format["json_schema"]
+    return {
+        "tools": [{
+            "name": schema["name"],
+            "description": "Record the case review, one field per section.",
+            "input_schema": schema["schema"]
+        }],
+        "tool_choice": {"type": "tool", "name": schema["name"]}
+    }
+
+
+def section_for_path(path, selected_capabilities):
+    """Map the keys leading to a JSON string to a section key, or None."""
+    if len(path) == 1 and path[0] in ("brief_description", "reflection", "learning_needs"):
+        return path[0]
+    if len(path) == 2 and path[0] == "capabilities" and path[1] in selected_capabilities:
+        return ("capability", path[1])
+    return None
+
+
+class StructuredReviewParser:
+    """Read a review streamed as JSON and pass it on as review text.
+
+    feed() takes the JSON in chunks of any size. Each character is looked
+    at once, so the cost of a chunk is proportional to its size. Text is
+    passed to stream_to with the same headings a plain review has. Set
+    continues when stream_to has already had text from an earlier reply.
+    """
+
+    def __init__(self, selected_capabilities, stream_to=None, continues=False):
+        self.selected_capabilities = tuple(selected_capabilities)
+        self.stream_to = stream_to
+        self.labels = dict(section_labels(self.selected_capabilities))
+        self.values = {}
+        self.complete = set()
+        # Keys of the enclosing objects, with the current key of each
+        self._path = []
+        self._expect_key = False
+        self._in_string = False
+        self._string_is_key = False
+        self._parts = []
+        self._section = None
+        self._pending = ""
+        self._emitted = continues
+
+    def feed(self, chunk):
+        """Parse the next chunk of JSON text."""
+        if not chunk:
+            return
+        text = self._pending + chunk
+        self._pending = ""
+        i = 0
+        while i < len(text):
+            if self._in_string:
+                i = self._read_string(text, i)
+                if i is None:
+                    return
+                continue
+            char = text[i]
+            i += 1
+            if char == '"':
+                self._start_string()
+            elif char == "{":
+                self._path.append(None)
+                self._expect_key = True
+            elif char == "}":
+                if self._path:
+                    self._path.pop()
+                self._expect_key = False
+            elif char == ",":
+                self._expect_key = bool(self._path)
+            # Colons, whitespace and anything the schema does not allow are skipped
+
+    def _start_string(self):
+        self._in_string = True
+        self._string_is_key = self._expect_key
+        self._parts = []
+        self._section = None
+        if not self._string_is_key and self._path:
+            self._section = section_for_path(tuple(self._path), self.selected_capabilities)
+            if self._section is not None:
+                self.values[self._section] = ""
+                heading = section_heading(self.labels[self._section])
+                self._emit(("\n\n" if self._emitted else "") + heading + "\n")
+
+    def _read_string(self, text, i):
+        """Consume string content from text[i:]; return where to go on, or None to wait for more."""
+        match = STRING_SPECIAL.search(text, i)
+        end = match.start() if match else len(text)
+        if end > i:
+            self._append(text[i:end])
+        if match is None:
+            return len(text)
+        if text[end] == '"':
+            self._end_string()
+            return end + 1
+        # An escape, which may be split across chunks
+        if end + 1 >= len(text):
+            self._pending = text[end:]
+            return None
+        code = text[end + 1]
+        if code != "u":
+            self._append(ESCAPES.get(code, code))
+            return end + 2
+        if end + 6 > len(text):
+            self._pending = text[end:]
+            return None
+        point = int(text[end + 2:end + 6], 16)
+        if 0xD800 <= point < 0xDC00:
+            # A surrogate pair is decoded only once both halves are here
+            if end + 12 > len(text):
+                self._pending = text[end:]
+                return None
+            low = int(text[end + 8:end + 12], 16)
+            self._append(chr(0x10000 + ((point - 0xD800) << 10) + (low - 0xDC00)))
+            return end + 12
+        self._append(chr(point))
+        return end + 6
+
+    def _append(self, text):
+        if self._string_is_key:
+            self._parts.append(text)
+        elif self._section is not None:
+            self.values[self._section] += text
+            self._emit(text)
+
+    def _end_string(self):
+        self._in_string = False
+        if self._string_is_key:
+            self._path[-1] = "".join(self._parts)
+            self._expect_key = False
+        elif self._section is not None:
+            self.complete.add(self._section)
+        self._section = None
+
+    def _emit(self, text):
+        self._emitted = True
+        if self.stream_to is not None:
+            self.stream_to(text)
+
+    def missing(self):
+        """Return the section keys that have not arrived complete and non-empty."""
+        return [
+            key for key in self.labels
+            if key not in self.complete or not self.values.get(key, "").strip()
+        ]
+
+    def sections(self):
+        """Return the sections received so far, partial ones included."""
+        sections = empty_sections()
+        for key in self.labels:
+            set_section(sections, key, self.values.get(key, "").strip())
+        return sections
+
+
+def build_repair_messages(case_description, sections, missing, selected_capabilities):
+    """Build the message list asking for only the missing sections of a review."""
+    labels = dict(section_labels(selected_capabilities))
+    written = "\n\n".join(
+        f"{section_heading(label)}\n{get_section(sections, key)}"
+        for key, label in labels.items()
+        if key not in missing and get_section(sections, key)
+    )
+    wanted = "\n".join(
+        f"Capability: {key[1]}\n{JUSTIFICATION_PROMPT}" if isinstance(key, tuple) else section_heading(labels[key])
+        for key in missing
+    )
+    return [
+        {"role": "system", "content": config.SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"Case description:\n{case_description}\n\n"
+                f"The case review so far:\n{written}\n\n"
+                f"Write only these remaining sections of the review:\n{wanted}"
+            )
+        }
+    ]
@@ -0,0 +1,101 @@
+"""Suggest capabilities for a case description with a local TF-IDF index.
+
+Each capability is a document made of its name, its points from
+config.capability_content and its everyday wording from
+config.CAPABILITY_HINTS. Documents become L2-normalised TF-IDF rows of a
+NumPy matrix, so ranking a description takes one matrix-vector product
+and needs no network. NumPy is imported when the index is first built,
+which keeps importing caseforge cheap.
+"""
+import math
+import threading
+from collections import Counter
+
+import config
+
+from .catalog import get_catalog
+from .titles import STOPWORDS, tokenize
+
+
+SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "ed", "es", "ly", "s", "e")
+
+
+def stem(word):
+    """Strip a common suffix, so "examined" and "examination" share a term."""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def terms(text):
+    return [stem(word) for word in tokenize(text) if word not in STOPWORDS and len(word) > 2]
+
+
+class CapabilityIndex:
+    """TF-IDF vectors of every capability, ready for cosine ranking."""
+
+    def __init__(self, catalog):
+        import numpy as np
+
+        self._np = np
+        self.names = catalog.names
+        documents = []
+        for name in self.names:
+            # The name is repeated so that its words outweigh any one point.
+            text = " ".join([name, name, *catalog[name], config.CAPABILITY_HINTS.get(name, "")])
+            documents.append(Counter(terms(text)))
+
+        vocabulary = sorted(set().union(*documents))
+        self.vocabulary = {term: column for column, term in enumerate(vocabulary)}
+        document_frequency = Counter(term for document in documents for term in document)
+        self.idf = np.array(
+            [math.log((1 + len(documents)) / (1 + document_frequency[term])) + 1 for term in vocabulary],
+            dtype=np.float32
+        )
+        matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+        for row, document in enumerate(documents):
+            for term, count in document.items():
+                # Sublinear term frequency, so long points do not dominate.
+                matrix[row, self.vocabulary[term]] = 1 + math.log(count)
+        matrix *= self.idf
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix
+
+    def rank(self, text, top_k=None, min_score=None):
+        """Return [(capability, score)] best first for a case description."""
+        np = self._np
+        top_k = config.SUGGEST_TOP_K if top_k is None else top_k
+        min_score = config.SUGGEST_MIN_SCORE if min_score is None else min_score
+        counts = Counter(term for term in terms(text or "") if term in self.vocabulary)
+        if not counts:
+            return []
+        query = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term, count in counts.items():
+            query[self.vocabulary[term]] = 1 + math.log(count)
+        query *= self.idf
+        scores = self.matrix @ (query / np.linalg.norm(query))
+        best = np.argsort(-scores)[:top_k]
+        return [(self.names[row], float(scores[row])) for row in best if scores[row] >= min_score]
+
+
+_lock = threading.Lock()
+_index = None
+_index_catalog = None
+
+
+def get_index():
+    """Return the process-wide index, rebuilt whenever the catalog is."""
+    global _index, _index_catalog
+    catalog = get_catalog()
+    if _index_catalog is not catalog:
+        with _lock:
+            if _index_catalog is not catalog:
+                _index = CapabilityIndex(catalog)
+                _index_catalog = catalog
+    return _index
+
+
+def suggest_capabilities(text, top_k=None):
+    """Return the names of the capabilities that best fit a case description."""
+    return [name for name, _ in get_index().rank(text, top_k)]
@@ -0,0 +1,335 @@
+"""Timing spans, metrics and an optional sampling profiler.
+
+span() times a block of code and nests inside whatever span is current,
+across threads too when the context is copied, as the scheduler and
+router do. Every span feeds a latency histogram by name, which the
+metrics endpoint serves in Prometheus text format alongside token, cache
+and time-to-first-token counters. With TRACE_DIR set, each finished trace
+is also appended to a JSON lines file in the OpenTelemetry (OTLP JSON)
+layout, so it can be loaded into any OTLP-compatible viewer.
+"""
+import bisect
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import config
+
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span = contextvars.ContextVar("caseforge_span", default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count, as Prometheus histograms expect."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "done")
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        # Set once the root span has finished and the trace was written
+        self.done = False
+
+
+class Span:
+    """One timed operation. Attributes set on it go to the trace file."""
+
+    __slots__ = ("name", "span_id", "parent", "trace", "attributes", "start", "start_ns", "end_ns", "error")
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.trace = parent.trace if parent is not None else _Trace()
+        self.attributes = attributes
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.start = time.perf_counter()
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+
+class _NoSpan:
+    """Stands in for a span when telemetry is off."""
+
+    def set(self, key, value):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Telemetry:
+    """Process-wide span histograms, counters and trace export."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = Counter()
+        self._trace_lock = threading.Lock()
+
+    def observe(self, metric, value, **labels):
+        """Add a value to the histogram metric{labels}."""
+        if not config.TELEMETRY_ENABLED:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def count(self, metric, amount=1, **labels):
+        """Add amount to the counter metric{labels}."""
+        if not config.TELEMETRY_ENABLED:
+            return
+        with self._lock:
+            self._counters[(metric, tuple(sorted(labels.items())))] += amount
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block as a span named name, nested in the current span."""
+        if not config.TELEMETRY_ENABLED:
+            yield _NO_SPAN
+            return
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        except BaseException as e:
+            # Control flow such as Streamlit's rerun, rather than a failure
+            span.set("exit", type(e).__name__)
+            self.count("caseforge_span_exits_total", span=name, exit=type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span):
+        span.end_ns = time.time_ns()
+        seconds = time.perf_counter() - span.start
+        self.observe("caseforge_span_duration_seconds", seconds, span=span.name)
+        if span.error:
+            self.count("caseforge_span_errors_total", span=span.name)
+        if not config.TRACE_DIR:
+            return
+        trace = span.trace
+        with self._trace_lock:
+            trace.spans.append(span)
+            # A span can outlive its root, e.g. a background title request
+            late = trace.done
+            if span.parent is None:
+                trace.done = True
+        if span.parent is None or late:
+            self.export(trace)
+
+    def export(self, trace):
+        """Append a finished trace to this process's trace file."""
+        with self._trace_lock:
+            spans, trace.spans = trace.spans, []
+        if not spans:
+            return
+        record = {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": "caseforge"}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}}
+            ]},
+            "scopeSpans": [{"scope": {"name": "caseforge"}, "spans": [span.to_otlp() for span in spans]}]
+        }]}
+        os.makedirs(config.TRACE_DIR, exist_ok=True)
+        path = os.path.join(config.TRACE_DIR, f"traces-{os.getpid()}.jsonl")
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._trace_lock:
+            with open(path, "a", encoding="utf-8") as trace_file:
+                trace_file.write(line)
+
+    def prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.total, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+        seen = set()
+        for (metric, labels), value in sorted(counters.items()):
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{self._labels(labels)} {value}")
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{metric}_bucket{self._labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{metric}_sum{self._labels(labels)} {total}")
+            lines.append(f"{metric}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{_label(value)}"' for key, value in labels) + "}"
+
+
+class SamplingProfiler:
+    """Sample every thread's stack at an interval while running.
+
+    Stacks are counted in the folded format flame graph tools read, one
+    "outer;inner;innermost count" line per distinct stack.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self._stop = None
+        self.samples = 0
+
+    @property
+    def running(self):
+        return self._stop is not None
+
+    def start(self, interval=None):
+        with self._lock:
+            if self._stop is not None:
+                return
+            self._stop = threading.Event()
+        interval = config.PROFILER_INTERVAL if interval is None else interval
+        threading.Thread(
+            target=self._run, args=(self._stop, interval), name="sampling-profiler", daemon=True
+        ).start()
+
+    def stop(self):
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+                self._stop = None
+
+    def _run(self, stop, interval):
+        own = threading.get_ident()
+        while not stop.wait(interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(names)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    def folded(self):
+        """Return the samples so far as folded stacks, most frequent first."""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+
+telemetry = Telemetry()
+span = telemetry.span
+profiler = SamplingProfiler()
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /profile (folded stacks) once per process."""
+    global _metrics_server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/metrics":
+                body = telemetry.prometheus()
+                content_type = "text/plain; version=0.0.4"
+            elif path == "/profile":
+                body = profiler.folded()
+                content_type = "text/plain"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, config.METRICS_PORT if port is None else port), MetricsHandler)
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+        return _metrics_server
@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import Future
+from difflib import SequenceMatcher
+
+import config
+from .rate_limit import RateLimited
+from .scheduler import scheduler
+
+
+def similarity(a, b):
+    """Return a 0-1 word-level similarity between two descriptions."""
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a.split(), b.split(), autojunk=False)
+    # The quick ratios are cheap upper bounds, so most real rewrites are
+    # rejected before the full comparison runs.
+    if matcher.real_quick_ratio() < config.TITLE_REFRESH_SIMILARITY:
+        return matcher.real_quick_ratio()
+    if matcher.quick_ratio() < config.TITLE_REFRESH_SIMILARITY:
+        return matcher.quick_ratio()
+    return matcher.ratio()
+
+
+class TitleRefresher:
+    """Keep a case title in step with an edited description without blocking.
+
+    Titles are regenerated in the background, only when the description has
+    changed meaningfully since the current title was made, and no more than
+    once per debounce interval. Small edits keep the existing title.
+    """
+
+    def __init__(self, generate, debounce=None, threshold=None):
+        self.generate = generate
+        self.debounce = config.TITLE_REFRESH_DEBOUNCE if debounce is None else debounce
+        self.threshold = config.TITLE_REFRESH_SIMILARITY if threshold is None else threshold
+        self.title = None
+        self.source = None
+        self._future = None
+        self._future_source = None
+        self._deferred = None
+        self._last_dispatch = float("-inf")
+
+    def _is_close(self, text, source):
+        return source is not None and similarity(text, source) >= self.threshold
+
+    def _dispatch(self, text):
+        self._future = scheduler.submit(("title", text), self.generate, text)
+        self._future_source = text
+        self._deferred = None
+        self._last_dispatch = time.monotonic()
+        return self._future
+
+    def request(self, text):
+        """Note an edited description, refreshing the title if it has drifted."""
+        self.poll()
+        if not text or self._is_close(text, self._future_source or self.source):
+            self._deferred = None
+            return
+        if time.monotonic() - self._last_dispatch < self.debounce:
+            self._deferred = text
+            return
+        self._dispatch(text)
+
+    def poll(self):
+        """Collect a finished refresh, dispatch a deferred one, and return the title."""
+        if self._future is not None and self._future.done():
+            error = self._future.exception()
+            if error is None:
+                self.title = self._future.result()
+                self.source = self._future_source
+            elif isinstance(error, RateLimited) and self._deferred is None:
+                # Shed while the provider was busy; try again after the debounce.
+                self._deferred = self._future_source
+            self._future = None
+            self._future_source = None
+        if (
+            self._deferred is not None
+            and self._future is None
+            and time.monotonic() - self._last_dispatch >= self.debounce
+        ):
+            self._dispatch(self._deferred)
+        return self.title
+
+    @property
+    def pending(self):
+        return self._future is not None or self._deferred is not None
+
+    def title_future(self, text):
+        """Return a future for a title matching text, reusing any close enough title."""
+        self.poll()
+        if self._future is not None and self._is_close(text, self._future_source):
+            return self._future
+        if self.title is not None and self._is_close(text, self.source):
+            future = Future()
+            future.set_result(self.title)
+            return future
+        return self._dispatch(text)
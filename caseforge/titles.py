@@ -0,0 +1,306 @@
+"""Local title extraction, so most titles need no network request.
+
+A title is assembled from the clinical terms found in the description,
+the patient (age, sex, frailty) and the setting (telephone, home visit,
+on call and so on). If no clinical term is found, the most distinctive
+words by TF-IDF are used instead. Their weights come from the worked
+examples and prompts in config, which show what ordinary case review
+wording looks like. Each title comes with a confidence, and the caller
+asks the LLM instead when the confidence is too low.
+"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+import config
+
+
+# One term per line: the title form first, then any other wordings that
+# mean the same thing. Lines from "# themes" on are broader topics, which
+# only lead the title when no specific condition is mentioned.
+CLINICAL_TERMS = """
+Abdominal Pain | abdo pain | tummy pain | stomach ache
+Acute Kidney Injury | aki
+Alcohol Misuse | alcohol dependence | alcohol excess | alcoholism
+Anaemia | anemia
+Anaphylaxis
+Angina
+Anxiety | panic attacks | panic attack
+Appendicitis
+Asthma
+Atrial Fibrillation | af
+Back Pain | low back pain | lower back pain
+Breast Lump
+Bronchiolitis
+Cancer | malignancy | tumour | tumor
+Cellulitis
+Chest Infection | lrti | lower respiratory tract infection
+Chest Pain | chest tightness
+Chronic Kidney Disease | ckd
+Chronic Pain
+Collapse | syncope | faint | fainting
+Constipation
+COPD | chronic obstructive pulmonary disease | copd exacerbation
+Cough
+Croup
+Deep Vein Thrombosis | dvt
+Dehydration
+Delirium | acute confusion
+Dementia | cognitive impairment | memory loss
+Depression | low mood
+Diabetes | type 2 diabetes | type 1 diabetes | diabetic
+Diabetic Ketoacidosis | dka
+Diarrhoea | diarrhea
+Dizziness | vertigo
+Domestic Abuse | domestic violence
+Drug Overdose | overdose
+Dyspnoea | shortness of breath | breathlessness
+Eating Disorder | anorexia | bulimia
+Eczema
+Epilepsy | seizure | seizures
+Falls | fall | fallen
+Fever | pyrexia | febrile
+Fracture | broken bone
+Gastroenteritis | vomiting and diarrhoea
+Gout
+Haematuria | blood in urine
+Haemorrhoids | piles | hemorrhoids
+Headache | migraine
+Head Injury
+Heart Failure | cardiac failure
+Hearing Impairment | hard of hearing | hearing loss | deaf | deafness
+Hypertension | high blood pressure
+Hypoglycaemia | hypo
+Hypothyroidism | underactive thyroid
+Jaundice
+Learning Disability | learning disabilities
+Meningitis
+Menopause
+Miscarriage
+Myocardial Infarction | heart attack | stemi | nstemi
+Neck Pain
+Palpitations
+Pneumonia
+Polypharmacy
+Postnatal Depression
+Pregnancy | pregnant | antenatal
+Psychosis | acute psychosis | hallucinations
+Pulmonary Embolism
+Rash
+Rectal Bleeding | pr bleeding | bleeding per rectum
+Renal Colic | kidney stones | kidney stone
+Sciatica
+Self-Harm | self harm | deliberate self harm
+Sepsis | septic
+Sore Throat | tonsillitis | pharyngitis
+Stroke | cva | tia | transient ischaemic attack
+Substance Misuse | drug misuse | substance abuse
+Suicidal Ideation | suicidal thoughts | suicidal
+Urinary Tract Infection | uti | urine infection | cystitis
+Visual Loss | vision loss | blurred vision
+Weight Loss
+Wheeze
+# themes
+Abdominal Examination | examined his abdomen | examined her abdomen
+Antibiotic Prescribing | antibiotics
+Bereavement | bereaved
+Breaking Bad News | bad news
+Complaint | complained
+Consent
+End of Life Care | end of life | palliative care | palliative
+General Psychiatry | psychiatry | psychiatric
+Medication Review
+Mental Health
+Prescribing Error | prescribing error | medication error
+Safeguarding | child protection | safeguarding concern
+Significant Event | significant event analysis
+"""
+
+SETTINGS = (
+    (("text", "relay"), "by Text Relay"),
+    (("text", "telephone"), "by Text Relay"),
+    (("video",), "by Video"),
+    (("telephone",), "by Telephone"),
+    (("phone",), "by Telephone"),
+    (("home", "visit"), "on Home Visit"),
+    (("care", "home"), "in Care Home"),
+    (("out", "of", "hours"), "Out of Hours"),
+    (("on", "call"), "On Call"),
+    (("a", "e"), "in A&E"),
+    (("emergency", "department"), "in A&E")
+)
+
+ELDERLY = {"elderly", "frail", "older"}
+MALE = {"man": "Man", "gentleman": "Man", "male": "Man", "boy": "Boy"}
+FEMALE = {"woman": "Woman", "lady": "Woman", "female": "Woman", "girl": "Girl"}
+CHILDREN = {"baby": "Infant", "infant": "Infant", "toddler": "Toddler", "child": "Child"}
+
+AGE_PATTERN = re.compile(
+    r"\b(\d{1,3})[- ]?(?:year|yr)s?[- ]?old\s+(?:\w+\s+)?(man|woman|male|female|boy|girl|gentleman|lady)\b"
+)
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers herself him himself his how i if in into is it
+its itself just me more most my myself no nor not now of off on once only or other our ours
+out over own same she should so some such than that the their theirs them then there these
+they this those through to too under until up very was we were what when where which while
+who whom why will with would you your yours patient patients doctor gp case review saw seen
+noticed felt think thought made make went came told asked said day today week weekend
+""".split())
+
+WORD = re.compile(r"[a-z0-9]+")
+
+# Title length limit in words, as asked of the LLM
+MAX_TITLE_WORDS = 6
+THEME_WEIGHT = 0.5
+
+
+def tokenize(text):
+    """Return the lower-cased words of text."""
+    return WORD.findall(text.lower())
+
+
+@lru_cache(maxsize=1)
+def _lexicon():
+    """Map each wording, as a tuple of words, to (title form, weight).
+
+    Also returns the length in words of the longest wording.
+    """
+    lexicon = {}
+    weight = 1.0
+    for line in CLINICAL_TERMS.strip().splitlines():
+        if line.startswith("#"):
+            weight = THEME_WEIGHT
+            continue
+        names = [name.strip() for name in line.split("|")]
+        for name in names:
+            lexicon[tuple(tokenize(name))] = (names[0], weight)
+    return lexicon, max(len(key) for key in lexicon)
+
+
+@lru_cache(maxsize=1)
+def _idf():
+    """Inverse document frequency of words in ordinary case review text."""
+    background = " ".join([
+        config.SYSTEM_PROMPT, config.MAIN_PROMPT, config.capability_content,
+        config.EXAMPLE_1_RESPONSE, config.EXAMPLE_2_RESPONSE
+    ])
+    documents = [set(tokenize(sentence)) for sentence in re.split(r"[.!?\n]+", background)]
+    documents = [document for document in documents if document]
+    counts = Counter(word for document in documents for word in document)
+    idf = {word: math.log((1 + len(documents)) / (1 + count)) + 1 for word, count in counts.items()}
+    # Words never seen in the background are as distinctive as can be
+    unseen = math.log(1 + len(documents)) + 1
+    return idf, unseen
+
+
+def clinical_terms(words):
+    """Return the clinical terms found in words, best first, with their scores."""
+    lexicon, longest = _lexicon()
+    scores = {}
+    first_seen = {}
+    i = 0
+    while i < len(words):
+        for n in range(min(longest, len(words) - i), 0, -1):
+            entry = lexicon.get(tuple(words[i:i + n]))
+            if entry is None and n == 1 and words[i].endswith("s"):
+                entry = lexicon.get((words[i][:-1],))
+            if entry is not None:
+                name, weight = entry
+                scores[name] = scores.get(name, 0.0) + weight
+                first_seen.setdefault(name, i)
+                i += n
+                break
+        else:
+            i += 1
+    return sorted(scores.items(), key=lambda item: (-item[1], first_seen[item[0]]))
+
+
+def patient_descriptor(text, words):
+    """Describe the patient, e.g. "54-Year-Old Man" or "Elderly Woman"."""
+    match = AGE_PATTERN.search(text.lower())
+    if match:
+        sex = MALE.get(match.group(2)) or FEMALE.get(match.group(2))
+        return f"{match.group(1)}-Year-Old {sex}"
+    word_set = set(words)
+    for word, name in CHILDREN.items():
+        if word in word_set:
+            return name
+    sex = next((MALE[word] for word in words if word in MALE), None)
+    sex = sex or next((FEMALE[word] for word in words if word in FEMALE), None)
+    if word_set & ELDERLY:
+        return f"Elderly {sex or 'Patient'}"
+    return sex
+
+
+def setting(words):
+    """Return how or where the patient was seen, e.g. "by Telephone"."""
+    joined = " " + " ".join(words) + " "
+    for phrase, name in SETTINGS:
+        if " " + " ".join(phrase) + " " in joined:
+            return name
+    return None
+
+
+def keywords(words, count=3):
+    """Return the most distinctive words by TF-IDF against ordinary review wording."""
+    idf, unseen = _idf()
+    frequencies = Counter(
+        word for word in words if word not in STOPWORDS and len(word) > 2 and not word.isdigit()
+    )
+    ranked = sorted(frequencies, key=lambda word: -frequencies[word] * idf.get(word, unseen))
+    return ranked[:count]
+
+
+def _fits(parts):
+    return sum(len(part.split()) for part in parts) <= MAX_TITLE_WORDS
+
+
+@lru_cache(maxsize=256)
+def extract_title(text):
+    """Return (title, confidence between 0 and 1) extracted from a case description."""
+    words = tokenize(text or "")
+    if not words:
+        return None, 0.0
+    terms = clinical_terms(words)
+    patient = patient_descriptor(text, words)
+    place = setting(words)
+
+    # Conditions are "in" a patient; broader themes are "for" one
+    connector = "in"
+    if terms:
+        main = terms[0][0]
+        confidence = 0.6
+        if _lexicon()[0][tuple(tokenize(main))][1] < 1:
+            confidence = 0.4
+            connector = "for"
+    else:
+        top = keywords(words)
+        if not top:
+            return None, 0.0
+        main = " ".join(word.capitalize() for word in top)
+        confidence = 0.1
+    parts = [main]
+    if patient and _fits(parts + [f"{connector} {patient}"]):
+        parts.append(f"{connector} {patient}")
+        confidence += 0.2
+    if place and _fits(parts + [place]):
+        parts.append(place)
+        confidence += 0.1
+    if len(terms) > 1 and _fits(parts + [f"With {terms[1][0]}"]):
+        parts.append(f"With {terms[1][0]}")
+        confidence += 0.1
+    return " ".join(parts), round(min(confidence, 1.0), 2)
+
+
+# Local title engines by name, as selected by config.TITLE_ENGINE. Each
+# takes a description and returns (title, confidence).
+ENGINES = {"local": extract_title}
+
+
+def register_engine(name, engine):
+    """Make another title engine available to config.TITLE_ENGINE."""
+    ENGINES[name] = engine
@@ -0,0 +1,75 @@
+import threading
+
+from .telemetry import telemetry
+
+
+class TokenUsage:
+    """Process-wide counters of prompt tokens and how many came from provider caches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.cache_write_tokens = 0
+        self.completion_tokens = 0
+
+    def record_openai(self, usage):
+        """Record the usage block of an OpenAI chat completion, as an SDK object or a raw stream dict."""
+        if usage is None:
+            return
+        if isinstance(usage, dict):
+            prompt = usage.get("prompt_tokens") or 0
+            completion = usage.get("completion_tokens") or 0
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        else:
+            prompt = usage.prompt_tokens or 0
+            completion = usage.completion_tokens or 0
+            cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt
+            self.cached_prompt_tokens += cached
+            self.completion_tokens += completion
+        self._count("openai", prompt, cached, 0, completion)
+
+    def record_anthropic(self, usage):
+        """Record the usage block of an Anthropic message."""
+        if usage is None:
+            return
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        with self._lock:
+            self.requests += 1
+            # Anthropic reports uncached input separately from cache reads and writes.
+            self.prompt_tokens += (usage.input_tokens or 0) + cache_read + cache_write
+            self.cached_prompt_tokens += cache_read
+            self.cache_write_tokens += cache_write
+            self.completion_tokens += usage.output_tokens or 0
+        self._count(
+            "anthropic", (usage.input_tokens or 0) + cache_read + cache_write,
+            cache_read, cache_write, usage.output_tokens or 0
+        )
+
+    def _count(self, provider, prompt, cached, cache_write, completion):
+        for kind, amount in (
+            ("prompt", prompt), ("cached_prompt", cached), ("cache_write", cache_write), ("completion", completion)
+        ):
+            if amount:
+                telemetry.count("caseforge_llm_tokens_total", amount, provider=provider, type=kind)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+                "cache_write_tokens": self.cache_write_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_prompt_ratio": (
+                    self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+                )
+            }
+
+
+token_usage = TokenUsage()
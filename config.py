@@ -254,3 +254,208 @@ I will continue to improve my time management skills during busy working periods
 Learning needs identified from this event:
 I am aware that I need to continue to improve my skills in seeing patients in remote of nonclinical environments, for example on home visits. There are parallels with seeing patients with medical problems OOH in a psychiatric hospital with doing home visits, as psychiatric 5 hospitals are not set up for medical emergencies, and is it very limited in terms of what medical problems can be dealt with. 
 """
+
+# Shared LLM client settings
+LLM_MAX_CONNECTIONS = 50
+LLM_MAX_KEEPALIVE_CONNECTIONS = 20
+LLM_KEEPALIVE_EXPIRY = 60.0
+LLM_CONNECT_TIMEOUT = 5.0
+LLM_TIMEOUT = 120.0
+LLM_MAX_RETRIES = 3
+# Override the provider endpoints, e.g. to point at a proxy or a local stub
+OPENAI_BASE_URL = None
+ANTHROPIC_BASE_URL = None
+
+# Response cache settings
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_PATH = ".cache/responses.sqlite3"
+RESPONSE_CACHE_MEMORY_ENTRIES = 256
+RESPONSE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Title refresh settings
+TITLE_REFRESH_SIMILARITY = 0.85
+TITLE_REFRESH_DEBOUNCE = 2.0
+
+# Conversation context settings
+# gpt-4 has an 8k context window and improvements reserve up to 4000 tokens
+# (OUTPUT_MAX_TOKENS) for the reply, so the prompt itself has to stay within the remainder.
+# A continuation of a cut-off reply also carries the reply so far, so its
+# max_tokens is cut to what is left of the window (MODEL_CONTEXT_TOKENS).
+CONTEXT_TOKEN_BUDGET = 4000
+CONTEXT_MAX_IMPROVEMENTS = 10
+
+# LLM provider: "openai", "anthropic", or "router" to route each call
+# across every provider that has an API key
+LLM_PROVIDER = "router"
+# Anthropic models used in place of the OpenAI model names in requests
+ANTHROPIC_MODELS = {
+    "gpt-4o-mini": "claude-3-5-haiku-20241022",
+    "gpt-4": "claude-3-5-sonnet-20241022"
+}
+
+# Router settings
+# (provider, model) routes for each kind of call, in order of preference
+LLM_ROUTES = {
+    "review": [("openai", "gpt-4o-mini"), ("anthropic", "claude-3-5-haiku-20241022")],
+    "title": [("openai", "gpt-4o-mini"), ("anthropic", "claude-3-5-haiku-20241022")],
+    "improve": [("openai", "gpt-4"), ("anthropic", "claude-3-5-sonnet-20241022")]
+}
+# Seconds of history behind each route's latency and error rate
+ROUTER_WINDOW = 300.0
+ROUTER_MIN_SAMPLES = 10
+# Routes failing more often than this are tried last
+ROUTER_ERROR_THRESHOLD = 0.5
+# Start the next route when a streamed call has sent no text within its
+# route's p95 time to first text. Calls that are not streamed are timed to
+# the whole reply, so they wait for their p95 and at least
+# ROUTER_HEDGE_BLOCKING_MIN seconds. Routes with fewer than
+# ROUTER_MIN_SAMPLES answers are never hedged
+ROUTER_HEDGING = True
+ROUTER_HEDGE_MIN = 1.0
+ROUTER_HEDGE_BLOCKING_MIN = 60.0
+ROUTER_MAX_RETRIES = 1
+ROUTER_MAX_WORKERS = 32
+
+# Batch generation settings
+BATCH_CONCURRENCY = 4
+BATCH_MAX_ATTEMPTS = 6
+BATCH_BACKOFF_BASE = 2.0
+BATCH_BACKOFF_MAX = 60.0
+
+# Rate limit settings
+# Keep these a little below the account's limits with the provider, which
+# also count requests made by any other process using the same key.
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_RPM = 500
+RATE_LIMIT_TPM = 200000
+# Reviews give up after waiting this many seconds for capacity
+RATE_LIMIT_MAX_WAIT = 60.0
+# Titles are skipped once this many requests are queued, or after this wait
+RATE_LIMIT_TITLE_SHED_DEPTH = 8
+RATE_LIMIT_TITLE_MAX_WAIT = 10.0
+
+# Title settings
+# "local" extracts titles from the description without a network request;
+# "llm" always asks the model
+TITLE_ENGINE = "local"
+# Local titles less confident than this are generated by the LLM instead,
+# unless TITLE_LLM_FALLBACK is off
+TITLE_MIN_CONFIDENCE = 0.5
+TITLE_LLM_FALLBACK = True
+
+# Capability suggestion settings
+SUGGEST_TOP_K = 3
+# Suggestions scoring below this cosine similarity are not shown
+SUGGEST_MIN_SCORE = 0.05
+# Everyday case wording for each capability, added to its description in
+# the suggestion index because case descriptions rarely use curriculum terms
+CAPABILITY_HINTS = {
+    "Fitness to practise": "complaint error mistake stress burnout unwell sick leave own health probity",
+    "Maintaining an ethical approach": "consent capacity confidentiality dignity respect beliefs religion culture equality diversity ethical dilemma",
+    "Communication and consultation skills": "telephone phone video interpreter language barrier hearing deaf relay explained listened ideas concerns expectations breaking bad news angry upset",
+    "Data gathering and interpretation": "history records notes bloods results investigations tests observations collateral scan xray ecg",
+    "Clinical examination and procedural skills": "examined examination chaperone abdomen auscultated palpated procedure injection suture catheter",
+    "Making a decision/diagnosis": "diagnosis differential diagnosed suspected hypothesis red flags decision",
+    "Clinical management": "prescribed prescription antibiotics treatment plan referred referral admitted follow up safety netting medication emergency",
+    "Managing medical complexity": "multimorbidity comorbidities polypharmacy uncertainty risk frail elderly long term conditions",
+    "Working with colleagues and in teams": "team colleague colleagues nurse nurses registrar consultant handover meeting mdt multidisciplinary pharmacist receptionist",
+    "Maintaining performance, learning and teaching": "teaching taught learning audit guideline guidelines evidence reading training tutorial reflection",
+    "Organisation, management and leadership": "busy workload prioritised prioritise rota time management organised incident leadership sites on call",
+    "Practising holistically, promoting health and safeguarding": "safeguarding social family carer lifestyle smoking alcohol diet exercise wellbeing vulnerable abuse",
+    "Community orientation": "community local services resources housing voluntary charity population access deprivation"
+}
+
+# Section improvement settings
+# Improvements that name a section are sent with only that section's text
+SECTION_EDIT_ENABLED = True
+# A section's reply may be this many times its current length, plus headroom
+SECTION_EDIT_GROWTH = 2
+SECTION_EDIT_HEADROOM = 200
+
+# Review store settings
+# Cases, review versions and improvements are kept here across restarts
+REVIEW_STORE_ENABLED = True
+REVIEW_STORE_PATH = ".cache/reviews.sqlite3"
+# Earlier cases listed per page in the sidebar
+REVIEW_STORE_PAGE_SIZE = 10
+
+# Structured output settings
+# "structured" asks for reviews as JSON with a field per section; "text"
+# asks for plain text and finds the sections by their headings. Text is
+# the default because its first words show sooner: a structured review
+# shows nothing until its first field's key has streamed in
+REVIEW_OUTPUT = "text"
+# Follow-up requests for sections missing from a structured review
+STRUCTURED_REPAIR_ATTEMPTS = 1
+
+# Telemetry settings
+# Timing spans and counters for LLM calls, parsing, titles and app reruns
+TELEMETRY_ENABLED = True
+# Port on 127.0.0.1 serving /metrics in Prometheus text format, or None
+METRICS_PORT = 9464
+# Directory for OpenTelemetry JSON trace files, or None for no traces
+TRACE_DIR = None
+# Seconds between stack samples while the sampling profiler is on
+PROFILER_INTERVAL = 0.01
+
+# Background job settings
+# Generations run as jobs that carry on across reruns and refreshes
+JOB_WORKERS = 8
+# Seconds a finished job is kept, so a repeated submission reuses its result
+JOB_RETENTION = 600.0
+# Seconds between progress checks while the page follows a job
+JOB_POLL_INTERVAL = 0.1
+
+# Single-flight settings
+# Identical requests in flight at the same time share one upstream call
+SINGLE_FLIGHT_ENABLED = True
+
+# Async LLM settings
+# Run LLM calls as coroutines on one shared event loop with the async
+# SDK clients, instead of holding a thread for each request in flight
+LLM_ASYNC_ENABLED = True
+LLM_ASYNC_MAX_CONNECTIONS = 500
+LLM_ASYNC_MAX_KEEPALIVE_CONNECTIONS = 100
+# Seconds between checks while an async request waits for rate limit capacity
+RATE_LIMIT_ASYNC_POLL = 0.05
+
+# Output budget settings
+# Words each kind of section should aim for; the prompt asks for these and
+# a review's max_tokens is worked out from them instead of a flat 4000
+OUTPUT_SECTION_WORDS = {"brief_description": 100, "capability": 120, "reflection": 150, "learning_needs": 80}
+# The brief description's target grows with the case description, up to a maximum
+OUTPUT_BRIEF_WORDS_PER_CASE_WORD = 0.5
+OUTPUT_BRIEF_WORDS_MAX = 300
+# Reply tokens per target word, with room for sections that run long
+OUTPUT_TOKENS_PER_WORD = 2.0
+# Reply tokens per section for its heading, or its JSON key and quotes
+OUTPUT_SECTION_OVERHEAD = 20
+# A rewrite of the whole review may be this many times its current length, plus headroom
+OUTPUT_REWRITE_GROWTH = 1.5
+OUTPUT_REWRITE_HEADROOM = 300
+# A reply cut off at max_tokens is asked for again with this many times the
+# budget, up to OUTPUT_RETRY_ATTEMPTS times; replies that end on their own never are
+OUTPUT_RETRY_GROWTH = 2
+OUTPUT_RETRY_ATTEMPTS = 2
+OUTPUT_MAX_TOKENS = 4000
+# Context window in tokens of each model named in requests. A follow-up's
+# max_tokens is cut to what its prompt leaves of it, less a margin for the
+# local token count differing from the provider's; with none left the
+# reply is kept as it is
+MODEL_CONTEXT_TOKENS = {"gpt-4": 8192, "gpt-4o": 128000, "gpt-4o-mini": 128000}
+MODEL_CONTEXT_DEFAULT = 128000
+OUTPUT_CONTEXT_MARGIN = 64
+
+# Session store settings
+# Where the review, sections and conversation of each session are kept
+# between script runs: "memory" (this process only), "sqlite" (a file
+# shared by the app processes on one host) or "redis" (any server speaking
+# the Redis protocol, shared by app nodes behind a load balancer)
+SESSION_STORE = "memory"
+SESSION_STORE_PATH = ".cache/sessions.sqlite3"
+SESSION_REDIS_URL = "redis://127.0.0.1:6379/0"
+# Seconds a session is kept after its last change
+SESSION_TTL = 7 * 24 * 60 * 60
+# Fields with at least this many bytes of JSON are stored compressed
+SESSION_COMPRESS_MIN_BYTES = 512
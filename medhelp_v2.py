@@ -1,320 +1,408 @@
 import streamlit as st
 from st_copy_to_clipboard import st_copy_to_clipboard
-import anthropic
-import openai
-import re
+import sqlite3
+import time
+import uuid
 import config
+from caseforge import clients, event_loop, generation
+from caseforge.conversation import ConversationContext
+from caseforge.catalog import get_catalog
+from caseforge.jobs import DONE, job_key, jobs
+from caseforge.rate_limit import RateLimited, current_session, rate_limiter
+from caseforge.response_cache import get_response_cache
+from caseforge.review_store import get_review_store
+from caseforge.router import get_router
+from caseforge.scheduler import scheduler
+from caseforge.single_flight import single_flight
+from caseforge.section_edit import detect_target_sections
+from caseforge.section_parser import format_sections, parse_sections, section_labels
+from caseforge.session_store import RedisError, SessionSync, get_session_store
+from caseforge.streaming import StreamingSectionParser
+from caseforge.suggest import suggest_capabilities
+from caseforge.telemetry import profiler, span, start_metrics_server, telemetry
+from caseforge.title_refresh import TitleRefresher
+from caseforge.token_usage import token_usage
 
 
-st.set_page_config(
-        page_title="GP Portfolio Case Review Generator",
-        page_icon="🏥",
-        layout="wide"
-    )
+# Session state kept in the session store, so the session can carry on
+# after a restart or on another app node; everything else is per process
+SESSION_FIELDS = (
+    "is_improve_mode", "review_content", "sections", "selected_caps", "capabilities_select",
+    "case_title", "case_description", "case_id", "history_offset", "conversation"
+)
+SESSION_CODECS = {"conversation": (ConversationContext.to_state, ConversationContext.from_state)}
 
 
 def init_anthropic_client():
-    return anthropic.Anthropic(api_key=st.secrets["ANTHROPIC_API_KEY"])
+    """Return the shared Anthropic client for the configured API key."""
+    return clients.get_anthropic_client(st.secrets["ANTHROPIC_API_KEY"])
 
 def init_openai_client():
-    """Initialize OpenAI client with API key from secrets."""
-    client = openai.OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-    return client
-
-def parse_capabilities(content):
-    """Parse capabilities from config content."""
-    capabilities = {}
-    current_capability = None
-    current_points = []
-    
-    lines = [line.rstrip() for line in content.split('\n') if line.strip()]
-    
-    for line in lines:
-        if not line.startswith('-'):
-            if current_capability and current_points:
-                capabilities[current_capability] = current_points
-            current_capability = line
-            current_points = []
-        else:
-            current_points.append(line)
-    
-    if current_capability and current_points:
-        capabilities[current_capability] = current_points
-    
-    return capabilities
-
-def format_capabilities(selected_capabilities):
-    """Format selected capabilities into text format."""
-    formatted_text = ""
-    for cap in selected_capabilities:
-        formatted_text += f"Capability: {cap}\n"
-        formatted_text += "Justification [describe how your actions and approach link to the capability]:\n\n"
-    return formatted_text
+    """Return the shared OpenAI client for the configured API key."""
+    return clients.get_openai_client(st.secrets["OPENAI_API_KEY"])
 
+def init_llm_client():
+    """Return the shared client for the provider selected in config."""
+    if config.LLM_PROVIDER == "router":
+        return get_router(st.secrets.get("OPENAI_API_KEY"), st.secrets.get("ANTHROPIC_API_KEY"))
+    if config.LLM_PROVIDER == "anthropic":
+        return init_anthropic_client()
+    return init_openai_client()
 
 def extract_sections(text, selected_capabilities):
     """Extract the different sections from the generated text."""
     try:
-        sections = {
-            "brief_description": "",
-            "capabilities": {},
-            "reflection": "",
-            "learning_needs": ""
-        }
-        
-        # Extract brief description
-        summary_pattern = r"Brief Description:\s*(.*?)(?=\n\n|$)"
-        summary_match = re.search(summary_pattern, text, re.DOTALL)
-        if summary_match:
-            sections["brief_description"] = summary_match.group(1).strip()
-        
-        # Extract capabilities - handle both formats
-        for cap_name in selected_capabilities:
-            # Try multiple patterns to match different formats
-            patterns = [
-                # Pattern 1: Full format with "Capability:" prefix and "Justification:"
-                f"Capability: {re.escape(cap_name)}.*?Justification.*?:(.*?)(?=Capability:|Reflection:|Learning needs|$)",
-                # Pattern 2: Just capability name with colon
-                f"{re.escape(cap_name)}:(.*?)(?=\n\n[A-Za-z]|Reflection:|Learning needs|$)",
-                # Pattern 3: Just capability name without colon
-                f"{re.escape(cap_name)}\n(.*?)(?=\n\n[A-Za-z]|Reflection:|Learning needs|$)"
-            ]
-            
-            content = None
-            for pattern in patterns:
-                match = re.search(pattern, text, re.DOTALL)
-                if match:
-                    content = match.group(1).strip()
-                    break
-            
-            if content:
-                sections["capabilities"][cap_name] = content
-            else:
-                st.warning(f"Could not find content for capability: {cap_name}")
-                sections["capabilities"][cap_name] = ""
-        
-        # Extract reflection (handle with or without question mark)
-        reflection_patterns = [
-            r"Reflection: What will I maintain, improve or stop\?(.*?)(?=Learning needs|$)",
-            r"Reflection: What will I maintain, improve or stop(.*?)(?=Learning needs|$)",
-            r"Reflection:(.*?)(?=Learning needs|$)"
-        ]
-        
-        for pattern in reflection_patterns:
-            reflection_match = re.search(pattern, text, re.DOTALL)
-            if reflection_match:
-                sections["reflection"] = reflection_match.group(1).strip()
-                break
-        
-        # Extract learning needs
-        learning_pattern = r"Learning needs identified from this event:(.*?)(?=$)"
-        learning_match = re.search(learning_pattern, text, re.DOTALL)
-        if learning_match:
-            sections["learning_needs"] = learning_match.group(1).strip()
-        
+        with span("parse.sections", capabilities=len(selected_capabilities)):
+            sections, missing = parse_sections(text, selected_capabilities)
+        for cap_name in missing:
+            st.warning(f"Could not find content for capability: {cap_name}")
         return sections
     except Exception as e:
         st.error(f"Error extracting sections: {str(e)}")
         return None
+
+def review_sections(review, selected_capabilities):
+    """Return the sections of a generated review, parsing its text only if they did not come with it."""
+    sections = getattr(review, "sections", None)
+    if sections is None:
+        return extract_sections(review, selected_capabilities)
+    for cap_name in selected_capabilities:
+        if not sections["capabilities"].get(cap_name):
+            st.warning(f"Could not find content for capability: {cap_name}")
+    return sections
     
 
-def improve_case_with_ai(original_case, improvement_prompt, session_state):
-    """Improve the case review while maintaining structure and conversation context."""
+def improve_case_with_ai(original_case, improvement_prompt, session_state, stream_to=None, targets=None):
+    """Improve the case review while maintaining structure and conversation context.
+    
+    With targets, only those sections are sent for improvement and the
+    results are spliced into session_state.sections; stream_to is then
+    called as stream_to(key, text). Otherwise the whole review is rewritten.
+    """
     try:
-        client = init_openai_client()
-        messages = [
-            {"role": "system", "content": config.SYSTEM_PROMPT},
-            {"role": "user", "content": config.EXAMPLE_1},
-            {"role": "assistant", "content": config.EXAMPLE_1_RESPONSE},
-            {"role": "user", "content": config.EXAMPLE_2},
-            {"role": "assistant", "content": config.EXAMPLE_2_RESPONSE}
-        ]
-        
-        if hasattr(session_state, 'llm_conversation_history') and session_state.llm_conversation_history:
-            initial_generation = next(
-                (msg for msg in session_state.llm_conversation_history 
-                 if "Generate a structured case review" in msg.get("content", "")), 
-                None
+        if targets:
+            improvement_request = {"role": "user", "content": f"Improve the case: {improvement_prompt}"}
+            new_sections = generation.improve_sections(
+                init_llm_client(),
+                session_state.sections,
+                targets,
+                improvement_prompt,
+                session_state.selected_caps,
+                stream_to=stream_to
+            )
+            improved_content = format_sections(new_sections, session_state.selected_caps)
+        else:
+            improvement_request, improved_content = generation.improve_case_review(
+                init_llm_client(),
+                session_state.conversation,
+                improvement_prompt,
+                stream_to=stream_to
             )
-            if initial_generation:
-                messages.extend([
-                    initial_generation,
-                    session_state.llm_conversation_history[
-                        session_state.llm_conversation_history.index(initial_generation) + 1
-                    ]
-                ])
-            
-            recent_improvements = [
-                msg for msg in session_state.llm_conversation_history[-4:]
-                if "Improve the case" in msg.get("content", "")
-            ]
-            for improve_msg in recent_improvements:
-                msg_index = session_state.llm_conversation_history.index(improve_msg)
-                messages.extend([improve_msg, session_state.llm_conversation_history[msg_index + 1]])
-        
-        formatted_capabilities = format_capabilities(session_state.selected_caps)
-        
-        # Get improved version
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
-            max_tokens=4000,
-            temperature=0.7
-        )
-        
-        if response.choices and len(response.choices) > 0:
-            improved_content = response.choices[0].message.content
-            improved_content = improved_content.replace('*', '').replace('#', '')
             
             # Extract sections from improved content
             new_sections = extract_sections(improved_content, session_state.selected_caps)
+        
+        if new_sections:
+            retitle = not targets or "brief_description" in targets
             
-            if new_sections:
-                # Update session state
-                session_state.review_content = improved_content
-                session_state.sections = new_sections
-                
-                # Update title based on improved content
-                brief_description = new_sections.get("brief_description", "")
-                if brief_description:
-                    session_state.case_title = generate_title(brief_description)
-                
-                # Store the improvement interaction
-                session_state.interaction_history.append({
-                    "original": original_case,
-                    "prompt": improvement_prompt,
-                    "improved": improved_content
-                })
-                
-                session_state.llm_conversation_history.extend([
-                    {"role": "user", "content": f"Improve the case: {improvement_prompt}"},
-                    {"role": "assistant", "content": improved_content}
-                ])
-                
-                return improved_content
-            else:
-                raise Exception("Failed to extract sections from improved content")
+            # Update session state
+            session_state.review_content = improved_content
+            session_state.sections = new_sections
+            
+            # Update title based on improved content
+            brief_description = new_sections.get("brief_description", "")
+            if brief_description and retitle:
+                try:
+                    session_state.case_title = scheduler.submit(
+                        ("title", brief_description), generate_title, brief_description
+                    ).result()
+                except RateLimited:
+                    # Keep the current title rather than wait on a busy provider
+                    pass
+            
+            # Store the improvement interaction
+            save_review(session_state, improved_content, new_sections, improvement_prompt=improvement_prompt)
+            
+            session_state.conversation.add_improvement(
+                improvement_request, improved_content, note=improvement_prompt
+            )
+            
+            return improved_content
         else:
-            raise Exception("No content in OpenAI response")
+            raise Exception("Failed to extract sections from improved content")
             
     except Exception as e:
         raise Exception(f"Error improving case: {str(e)}")
 
 
+def save_review(session_state, review, sections, improvement_prompt=None):
+    """Record a review version in the review store, starting the case on its first version."""
+    if not config.REVIEW_STORE_ENABLED:
+        return
+    store = get_review_store()
+    if session_state.case_id is None:
+        session_state.case_id = store.create_case(
+            session_state.session_id, session_state.case_description, session_state.selected_caps
+        )
+    store.add_review(session_state.case_id, review, sections, improvement_prompt=improvement_prompt)
+    store.set_title(session_state.case_id, session_state.case_title)
+
+
+def load_case(case_id):
+    """Reopen a stored case at its latest review, if it belongs to this session."""
+    case = get_review_store().load_case(case_id)
+    if case is None or case["session"] != st.session_state.session_id or not case["review"]:
+        return
+    sections = case["sections"] or parse_sections(case["review"], case["capabilities"])[0]
+    st.session_state.case_id = case_id
+    st.session_state.case_description = case["case_description"]
+    st.session_state.case_title = case["title"]
+    st.session_state.selected_caps = case["capabilities"]
+    st.session_state.capabilities_select = list(case["capabilities"])
+    st.session_state.review_content = case["review"]
+    st.session_state.sections = sections
+    st.session_state.is_improve_mode = True
+    st.session_state.conversation = ConversationContext()
+    st.session_state.conversation.set_initial(
+        generation.build_review_messages(case["case_description"], case["capabilities"])[-1],
+        case["review"]
+    )
+    st.session_state.title_refresher = TitleRefresher(generate_title)
+
+
+def show_history_page(delta):
+    st.session_state.history_offset = max(st.session_state.history_offset + delta, 0)
+
+
+def previous_cases():
+    """List one page of this session's stored cases in the sidebar, each with a button to reopen it."""
+    store = get_review_store()
+    session_id = st.session_state.session_id
+    page_size = config.REVIEW_STORE_PAGE_SIZE
+    total = store.count_cases(session=session_id)
+    if not total:
+        st.caption("No saved cases yet")
+        return
+    offset = min(st.session_state.history_offset, (total - 1) // page_size * page_size)
+    for case in store.list_cases(page_size, offset, session=session_id):
+        label = case["title"] or generation.DEFAULT_TITLE
+        saved = time.strftime("%d %b %Y %H:%M", time.localtime(case["updated"]))
+        st.button(
+            f"{label} ({saved})",
+            help="; ".join(case["capabilities"]),
+            on_click=load_case,
+            args=(case["id"],),
+            key=f"load_case_{case['id']}",
+            disabled=case["id"] == st.session_state.case_id
+        )
+    st.caption(f"{offset + 1}-{min(offset + page_size, total)} of {total}")
+    newer, older = st.columns(2)
+    newer.button("Newer", on_click=show_history_page, args=(-page_size,), disabled=offset == 0, key="history_newer")
+    older.button(
+        "Older", on_click=show_history_page, args=(page_size,), disabled=offset + page_size >= total, key="history_older"
+    )
+
+
+def open_session():
+    """Pick up the session named in the page URL from the session store, or start a new one."""
+    session_id = st.query_params.get("session") or uuid.uuid4().hex
+    sync = SessionSync(get_session_store(), session_id, SESSION_FIELDS, SESSION_CODECS)
+    try:
+        with span("session.restore"):
+            sync.restore(st.session_state)
+    except (OSError, sqlite3.Error, RedisError):
+        # The session starts empty rather than the page failing
+        telemetry.count("caseforge_session_store_errors_total", operation="restore")
+    st.session_state.session_id = session_id
+    st.session_state.session_sync = sync
+    st.query_params["session"] = session_id
+
+
+def save_session():
+    """Write the session fields this script run changed to the session store."""
+    sync = st.session_state.get("session_sync")
+    if sync is None:
+        return
+    try:
+        with span("session.save"):
+            sync.save(st.session_state)
+    except (OSError, sqlite3.Error, RedisError):
+        # Saved with the next run that reaches the store
+        telemetry.count("caseforge_session_store_errors_total", operation="save")
+
+
+def toggle_profiler():
+    """Start or stop the sampling profiler to match the Diagnostics toggle."""
+    if st.session_state.profiler_on:
+        profiler.reset()
+        profiler.start()
+    else:
+        profiler.stop()
+
+
+def use_capabilities(capabilities):
+    """Select the given capabilities in the capabilities multiselect."""
+    st.session_state.capabilities_select = list(capabilities)
 
-# Update session state initialization
-if 'initialized' not in st.session_state:
-    st.session_state.initialized = True
-    st.session_state.review_content = None
-    st.session_state.sections = None
-    st.session_state.selected_caps = []
-    st.session_state.capabilities_select = []
-    st.session_state.case_title = None
-    st.session_state.case_description = ""
-    st.session_state.previous_reviews = []
-    st.session_state.interaction_history = []
-    st.session_state.llm_conversation_history = []  # Add this line
+
+def live_section_preview(selected_capabilities):
+    """Render placeholders for each section and return a callback that fills them as text streams in."""
+    parser = StreamingSectionParser(selected_capabilities)
+    stats = {"started": time.perf_counter(), "first_text": None, "updates": 0}
+    
+    placeholders = {}
+    for key, label in section_labels(selected_capabilities):
+        st.subheader(label)
+        placeholders[key] = st.empty()
+    
+    def on_text(text):
+        for key in parser.feed(text):
+            content = parser.section_text(key)
+            if not content:
+                continue
+            if stats["first_text"] is None:
+                stats["first_text"] = time.perf_counter() - stats["started"]
+            stats["updates"] += 1
+            # Plain elements rather than widgets, so the many intermediate
+            # renders leave nothing behind in session state.
+            placeholders[key].code(content, language=None, wrap_lines=True)
+    
+    return on_text, stats
+
+
+def live_edit_preview(selected_capabilities, targets):
+    """Render placeholders for the target sections and return a callback that fills them as text streams in."""
+    stats = {"started": time.perf_counter(), "first_text": None, "updates": 0}
+    texts = {key: "" for key in targets}
+    
+    placeholders = {}
+    for key, label in section_labels(selected_capabilities):
+        if key in texts:
+            st.subheader(label)
+            placeholders[key] = st.empty()
+    
+    def on_text(key, text):
+        texts[key] += text
+        if stats["first_text"] is None:
+            stats["first_text"] = time.perf_counter() - stats["started"]
+        stats["updates"] += 1
+        placeholders[key].code(texts[key], language=None, wrap_lines=True)
+    
+    return on_text, stats
 
 
 def generate_title(case_description):
     """Generate a brief title from the case description."""
     try:
-        client = init_openai_client()
-        messages = [
-            {
-                "role": "system",
-                "content": "You are a medical assistant that generates brief (4-6 words) clinical case titles. Make them professional and medical in nature."
-            },
-            {
-                "role": "user",
-                "content": f"Generate a brief clinical case title from this description:\n{case_description}"
-            }
-        ]
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=50,
-            temperature=0.7
-        )
-        
-        if response.choices and len(response.choices) > 0:
-            return response.choices[0].message.content.strip().replace('"',"")
-        else:
-            return "Case Review"
-            
+        return generation.generate_title(init_llm_client(), case_description)
+    except RateLimited:
+        # Let the caller retry later instead of settling for the default title
+        raise
     except Exception as e:
-        return "Case Review"
+        return generation.DEFAULT_TITLE
+
+def start_generation(case_description, selected_capabilities):
+    """Start generating a review in the background, or join the same one already under way.
+    
+    The job id goes in the page URL too, so a refreshed page can find it.
+    """
+    job = jobs.submit(
+        job_key("review", case_description, selected_capabilities),
+        "review",
+        generation.generate_case_review_async,
+        init_llm_client(),
+        case_description,
+        list(selected_capabilities),
+        meta={"case_description": case_description, "capabilities": list(selected_capabilities)}
+    )
+    st.session_state.generation_job = job.id
+    st.query_params["job"] = job.id
+    return job
 
-def generate_case_review(case_description, selected_capabilities):
-    """Generate initial case review using selected AI model."""
-    formatted_capabilities = format_capabilities(selected_capabilities)
+
+def finish_generation():
+    st.session_state.generation_job = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
+
+
+def follow_generation(job):
+    """Show a generation job's progress until it ends, then take its review.
+    
+    A rerun part way through only stops this script run; the job carries
+    on and the next run follows it from the start of its text.
+    """
+    case_description = job.meta["case_description"]
+    selected_capabilities = job.meta["capabilities"]
+    with st.spinner("Generating case review..."):
+        # The title only depends on the description, so fetch it
+        # alongside the review rather than before it.
+        title_future = st.session_state.title_refresher.title_future(case_description)
+        status = st.empty()
+        on_text, stream_stats = live_section_preview(selected_capabilities)
+        offset = 0
+        shown = None
+        done = job.done
+        while not done:
+            text, done = job.wait(offset, timeout=config.JOB_POLL_INTERVAL)
+            if text:
+                on_text(text)
+                offset += len(text)
+            # Touching the page now and then lets a rerun stop this loop
+            elapsed = int(time.time() - job.created)
+            if elapsed != shown:
+                shown = elapsed
+                status.caption(f"Generating for {elapsed} s")
+        text, _ = job.wait(offset, timeout=0)
+        if text:
+            on_text(text)
+        status.empty()
     
+    finish_generation()
+    if job.status != DONE:
+        st.error(f"Error generating review: {str(job.error)}")
+        return
+    st.session_state.time_to_first_text = stream_stats["first_text"]
     try:
-        client = init_openai_client()
-        messages = [
-            {
-                "role": "system",
-                "content": config.SYSTEM_PROMPT
-            },
-            {
-                "role": "user",
-                "content": config.EXAMPLE_1
-            },
-            {
-                "role": "assistant",
-                "content": config.EXAMPLE_1_RESPONSE
-            },
-            {
-                "role": "user",
-                "content": config.EXAMPLE_2
-            },
-            {
-                "role": "assistant",
-                "content": config.EXAMPLE_2_RESPONSE
-            },
-            {
-                "role": "user",
-                "content": f"""Generate a structured case review with the following:
-            {config.MAIN_PROMPT.format(
-                formatted_capabilities=formatted_capabilities,
-                case_description=case_description
-            )}"""
-            }
-        ]
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=4000,
-            temperature=0.7
-        )
-        
-        if response.choices and len(response.choices) > 0:
-            content = response.choices[0].message.content
-            content = content.replace('*', '').replace('#', '')
-            
-            # Store the initial generation in conversation history
-            if 'llm_conversation_history' not in st.session_state:
-                st.session_state.llm_conversation_history = []
-                
-            st.session_state.llm_conversation_history.extend([
-                messages[-1],  # The generation request
-                {
-                    "role": "assistant",
-                    "content": content
-                }
-            ])
-            
-            return content
-        else:
-            raise Exception("No content in OpenAI response")
-            
-    except Exception as e:
-        raise Exception(f"Error generating review: {str(e)}")
+        st.session_state.case_title = title_future.result()
+    except RateLimited:
+        # The refresher retries the title once the queue clears
+        st.session_state.case_title = generation.DEFAULT_TITLE
+    
+    request, review = job.result
+    st.session_state.conversation = ConversationContext()
+    st.session_state.conversation.set_initial(request, review)
+    st.session_state.case_description = case_description
+    st.session_state.review_content = review
+    st.session_state.sections = review_sections(review, selected_capabilities)
+    st.session_state.selected_caps = list(selected_capabilities)
+    st.session_state.is_improve_mode = True
+    
+    if not st.session_state.sections:
+        st.error("Failed to parse the generated review. Please try again.")
+        return
+    
+    save_review(st.session_state, review, st.session_state.sections)
+    st.rerun()
     
 
 def main():
+    st.set_page_config(
+        page_title="GP Portfolio Case Review Generator",
+        page_icon="🏥",
+        layout="wide"
+    )
+    
+    if config.METRICS_PORT:
+        try:
+            start_metrics_server()
+        except OSError:
+            # Another app process already serves metrics on this port
+            pass
+    # Start the LLM event loop, and the tokenizer load with it, long before
+    # the first request needs them
+    event_loop.get_loop()
+    
     # Initialize session state variables
     if 'initialized' not in st.session_state:
         st.session_state.initialized = True
@@ -325,17 +413,55 @@ def main():
         st.session_state.capabilities_select = []
         st.session_state.case_title = None
         st.session_state.case_description = ""
-        st.session_state.previous_reviews = []
-        st.session_state.interaction_history = []
-        st.session_state.llm_conversation_history = []
+        st.session_state.case_id = None
+        st.session_state.conversation = ConversationContext()
     
     # Ensure is_improve_mode exists in session state
     if 'is_improve_mode' not in st.session_state:
         st.session_state.is_improve_mode = False
     
+    if 'conversation' not in st.session_state:
+        st.session_state.conversation = ConversationContext()
+    
+    if 'case_id' not in st.session_state:
+        st.session_state.case_id = None
+    
+    if 'history_offset' not in st.session_state:
+        st.session_state.history_offset = 0
+    
+    # Restore a session that another process served, found by the id in the URL
+    if 'session_sync' not in st.session_state:
+        open_session()
+    
+    # A generation started before a refresh is found again from the page URL
+    if 'generation_job' not in st.session_state:
+        st.session_state.generation_job = None
+        job = jobs.get(st.query_params.get("job"))
+        if job is not None:
+            st.session_state.generation_job = job.id
+            st.session_state.case_description = job.meta["case_description"]
+            st.session_state.capabilities_select = list(job.meta["capabilities"])
+    
+    if 'title_refresher' not in st.session_state:
+        st.session_state.title_refresher = TitleRefresher(generate_title)
+    
+    # Queue this session's LLM requests separately from other sessions'
+    current_session.set(st.session_state.session_id)
+    
+    # Pick up any title that finished refreshing in the background, including
+    # one that was deferred while the provider was busy
+    refreshed_title = st.session_state.title_refresher.poll()
+    if refreshed_title and (
+        not st.session_state.is_improve_mode
+        or st.session_state.case_title == generation.DEFAULT_TITLE
+    ):
+        st.session_state.case_title = refreshed_title
+        if st.session_state.case_id is not None:
+            get_review_store().set_title(st.session_state.case_id, refreshed_title)
+    
     st.title("GP Portfolio Case Review Generator 🏥")
     
-    capabilities = parse_capabilities(config.capability_content)
+    capabilities = get_catalog()
     
     col1, col2 = st.columns([2, 1], gap="large")
     
@@ -358,12 +484,8 @@ def main():
                 )
                 if new_description != st.session_state.case_description:
                     st.session_state.case_description = new_description
-                    # Update the title when description changes
-                    try:
-                        st.session_state.case_title = generate_title(new_description)
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error updating title: {str(e)}")
+                    # Refresh the title in the background once the edit is significant
+                    st.session_state.title_refresher.request(new_description)
         else:
             st.subheader("Improve with AI")
             improvement_prompt = st.text_area(
@@ -372,17 +494,33 @@ def main():
                 height=100,
                 key="improvement_prompt"
             )
+            section_keys = dict((label, key) for key, label in section_labels(st.session_state.selected_caps))
+            chosen_sections = st.multiselect(
+                "Sections to improve",
+                options=list(section_keys),
+                help="Leave empty to pick the sections from your request, or rewrite the whole review if it names none",
+                key="improvement_sections"
+            )
             
             if st.button("Improve Case"):
                 with st.spinner("Improving case description..."):
                     try:
+                        targets = [section_keys[label] for label in chosen_sections]
+                        if not targets and config.SECTION_EDIT_ENABLED:
+                            targets = detect_target_sections(improvement_prompt, st.session_state.selected_caps)
+                        if targets:
+                            on_text, stream_stats = live_edit_preview(st.session_state.selected_caps, targets)
+                        else:
+                            on_text, stream_stats = live_section_preview(st.session_state.selected_caps)
                         improved_case = improve_case_with_ai(
                             st.session_state.case_description,
                             improvement_prompt,
-                            st.session_state
+                            st.session_state,
+                            stream_to=on_text,
+                            targets=targets
                         )
+                        st.session_state.time_to_first_text = stream_stats["first_text"]
                         if improved_case:
-                            st.session_state.case_title = generate_title(st.session_state.sections["brief_description"])
                             st.success("Case improved successfully!")
                             st.rerun()
                     except Exception as e:
@@ -404,33 +542,21 @@ def main():
                 elif not st.session_state.case_description:
                     st.error("Please enter a case description")
                 else:
-                    with st.spinner("Generating case review..."):
-                        try:
-                            st.session_state.case_title = generate_title(st.session_state.case_description)
-                            review = generate_case_review(
-                                st.session_state.case_description,
-                                st.session_state.capabilities_select
-                            )
-                            
-                            if review:
-                                st.session_state.previous_reviews.append({
-                                    "case_description": st.session_state.case_description,
-                                    "capabilities": st.session_state.capabilities_select.copy(),
-                                    "review": review
-                                })
-                                
-                                st.session_state.review_content = review
-                                st.session_state.sections = extract_sections(review, st.session_state.capabilities_select)
-                                st.session_state.selected_caps = st.session_state.capabilities_select.copy()
-                                st.session_state.is_improve_mode = True
-                                
-                                if not st.session_state.sections:
-                                    st.error("Failed to parse the generated review. Please try again.")
-                                    return
-                                
-                                st.rerun()
-                        except Exception as e:
-                            st.error(f"Error generating review: {str(e)}")
+                    try:
+                        start_generation(
+                            st.session_state.case_description,
+                            st.session_state.capabilities_select
+                        )
+                    except Exception as e:
+                        st.error(f"Error generating review: {str(e)}")
+            
+            # Follow a generation started by this or an earlier run of the page
+            job = jobs.get(st.session_state.generation_job)
+            if job is not None:
+                follow_generation(job)
+            elif st.session_state.generation_job is not None:
+                # Finished and expired while nobody was watching
+                finish_generation()
         
         # New Case button (only shown in improve mode)
         if st.session_state.is_improve_mode:
@@ -442,17 +568,29 @@ def main():
                 st.session_state.capabilities_select = []
                 st.session_state.case_title = None
                 st.session_state.case_description = ""
-                st.session_state.previous_reviews = []
-                st.session_state.interaction_history = []
-                st.session_state.llm_conversation_history = []
+                st.session_state.case_id = None
+                st.session_state.conversation = ConversationContext()
                 st.session_state.is_improve_mode = False
+                st.session_state.title_refresher = TitleRefresher(generate_title)
                 st.rerun()
 
     # Sidebar column (col2)
     with col2:
+        # Ranked locally as the description changes, so this costs no LLM call
+        if st.session_state.case_description and not st.session_state.is_improve_mode:
+            suggested = suggest_capabilities(st.session_state.case_description)
+            if suggested and suggested != st.session_state.get('capabilities_select'):
+                st.caption("Suggested for this case: " + "; ".join(suggested))
+                st.button(
+                    "Use suggested capabilities",
+                    on_click=use_capabilities,
+                    args=(suggested,),
+                    key="use_suggested"
+                )
+        
         selected_capabilities = st.multiselect(
             "Choose up to 3 capabilities",
-            options=list(capabilities.keys()),
+            options=capabilities.names,
             max_selections=3,
             help="Select 1-3 capabilities that this case demonstrates",
             key="capabilities_select"
@@ -522,7 +660,53 @@ def main():
     4. Edit the generated sections as needed
     5. Copy individual sections as needed
     """)
+    
+    if config.REVIEW_STORE_ENABLED:
+        with st.sidebar.expander("Previous cases"):
+            previous_cases()
+    
+    with st.sidebar.expander("Diagnostics"):
+        st.caption("LLM connections")
+        st.json(clients.connection_stats())
+        st.caption("Token usage")
+        st.json(token_usage.snapshot())
+        st.caption("Response cache")
+        st.json(get_response_cache().stats())
+        st.caption("Rate limiter")
+        st.json(rate_limiter.stats())
+        st.caption("Background jobs")
+        st.json(jobs.stats())
+        st.caption("Coalesced requests")
+        st.json(single_flight.stats())
+        st.caption("Event loop")
+        st.json(event_loop.stats())
+        st.caption("Session store")
+        st.json(get_session_store().stats())
+        if config.REVIEW_STORE_ENABLED:
+            st.caption("Review store")
+            st.json(get_review_store().stats())
+        if config.LLM_PROVIDER == "router":
+            st.caption("Provider routes")
+            st.json(init_llm_client().snapshot())
+        if config.METRICS_PORT:
+            st.caption(f"Metrics: http://127.0.0.1:{config.METRICS_PORT}/metrics")
+        st.toggle(
+            "Sampling profiler",
+            value=profiler.running,
+            on_change=toggle_profiler,
+            key="profiler_on",
+            help="Samples every thread's stack while on; the result is in folded format for flame graph tools"
+        )
+        if profiler.samples:
+            st.caption(f"{profiler.samples} samples")
+            st.download_button("Download profile", profiler.folded(), file_name="profile.folded", key="profile_download")
 
 if __name__ == "__main__":
-    main()
+    # Each Streamlit rerun is one trace; st.rerun() shows as an exit of this span
+    with span("app.run"):
+        try:
+            main()
+        finally:
+            # Also after st.rerun(), which leaves main() by raising
+            save_session()
     